@@ -14,6 +14,7 @@ from taskwarrior_syncall.app_utils import (
     list_named_combinations,
     name_to_resolution_strategy_type,
     report_toplevel_exception,
+    update_cached_combination,
 )
 from taskwarrior_syncall.cli import (
     opt_asana_task_gid,
@@ -22,19 +23,27 @@ from taskwarrior_syncall.cli import (
     opt_asana_workspace_name,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
     opt_gcal_calendar,
     opt_gkeep_note,
     opt_gkeep_passwd_pass_path,
     opt_gkeep_user_pass_path,
     opt_google_oauth_port,
     opt_google_secret_override,
+    opt_horizon,
+    opt_interval,
     opt_list_asana_workspaces,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_notion_page_id,
     opt_notion_token_pass_path,
     opt_resolution_strategy,
+    opt_tw_cache_export,
+    opt_tw_lazy_tasks,
     opt_tw_project,
+    opt_tw_read_data_files,
     opt_tw_tags,
+    opt_tw_use_change_journal,
 )
 from taskwarrior_syncall.sync_side import ItemType, SyncSide
 from taskwarrior_syncall.taskwarrior_side import TaskWarriorSide
@@ -62,30 +71,49 @@ __all__ = [
     "opt_asana_workspace_name",
     "opt_combination",
     "opt_custom_combination_savename",
+    "opt_daemon",
     "opt_gcal_calendar",
     "opt_gkeep_note",
     "opt_gkeep_passwd_pass_path",
     "opt_gkeep_user_pass_path",
+    "opt_horizon",
     "opt_google_oauth_port",
     "opt_google_secret_override",
+    "opt_interval",
     "opt_list_asana_workspaces",
     "opt_list_combinations",
+    "opt_max_parallel_writes",
     "opt_notion_page_id",
     "opt_notion_token_pass_path",
     "opt_resolution_strategy",
+    "opt_tw_cache_export",
+    "opt_tw_lazy_tasks",
     "opt_tw_project",
+    "opt_tw_read_data_files",
     "opt_tw_tags",
+    "opt_tw_use_change_journal",
     "report_toplevel_exception",
+    "update_cached_combination",
 ]
 
 # Asana ----------------------------------------------------------------------------------------
 try:
     from taskwarrior_syncall.asana.asana_side import AsanaSide
     from taskwarrior_syncall.asana.utils import list_asana_workspaces
-    from taskwarrior_syncall.tw_asana_utils import convert_asana_to_tw, convert_tw_to_asana
+    from taskwarrior_syncall.tw_asana_utils import (
+        convert_asana_to_tw,
+        convert_tw_to_asana,
+        make_tw_asana_aggregator,
+    )
 
     __all__.extend(
-        ["AsanaSide", "convert_asana_to_tw", "convert_tw_to_asana", "list_asana_workspaces"]
+        [
+            "AsanaSide",
+            "convert_asana_to_tw",
+            "convert_tw_to_asana",
+            "list_asana_workspaces",
+            "make_tw_asana_aggregator",
+        ]
     )
 except ImportError:
     pass
@@ -94,24 +122,36 @@ except ImportError:
 try:
     from taskwarrior_syncall.notion_side import NotionSide
     from taskwarrior_syncall.notion_todo_db_side import NotionDBSide
-    from taskwarrior_syncall.tw_notion_utils import convert_notion_to_tw, convert_tw_to_notion
+    from taskwarrior_syncall.tw_notion_utils import (
+        convert_notion_to_tw,
+        convert_tw_to_notion,
+        make_tw_notion_aggregator,
+    )
     from taskwarrior_syncall.tw_notion_db_utils import convert_custom_tw_to_notion_db, convert_notion_db_to_custom_tw
 
     __all__.extend(["NotionSide", "NotionDBSide", "Notion", "convert_notion_to_tw", "convert_tw_to_notion",
-                    "convert_custom_tw_to_notion_db", "convert_notion_db_to_custom_tw"])
+                    "convert_custom_tw_to_notion_db", "convert_notion_db_to_custom_tw",
+                    "make_tw_notion_aggregator"])
 except ImportError:
     pass
 
 # Gcal ----------------------------------------------------------------------------------------
 try:
     from taskwarrior_syncall.google.gcal_side import GCalSide
-    from taskwarrior_syncall.tw_gcal_utils import convert_gcal_to_tw, convert_tw_to_gcal
+    from taskwarrior_syncall.tw_gcal_utils import (
+        cached_gcal_calendar_id,
+        convert_gcal_to_tw,
+        convert_tw_to_gcal,
+        make_tw_gcal_aggregator,
+    )
 except ImportError:
     __all__.extend(
         [
             "GCalSide",
+            "cached_gcal_calendar_id",
             "convert_gcal_to_tw",
             "convert_tw_to_gcal",
+            "make_tw_gcal_aggregator",
         ]
     )
 
@@ -1,11 +1,28 @@
 from __future__ import annotations
 
+import copy
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from functools import partial
-from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from bidict import bidict  # type: ignore
-from bubop import PrefsManager, logger, pickle_dump, pickle_load
+from bubop import PrefsManager, logger
+from bubop.time import assume_local_tz_if_none
 from item_synchronizer import Synchronizer
 from item_synchronizer.helpers import SideChanges
 from item_synchronizer.resolution_strategy import AlwaysSecondRS, ResolutionStrategy
@@ -13,7 +30,12 @@ from item_synchronizer.types import ID, ConverterFn, Item
 
 from taskwarrior_syncall.app_utils import app_name
 from taskwarrior_syncall.side_helper import SideHelper
+from taskwarrior_syncall.snapshot_store import SnapshotStore
 from taskwarrior_syncall.sync_side import SyncSide
+from taskwarrior_syncall.sync_state import JournalEntry, SyncState
+from taskwarrior_syncall.write_executor import WriteExecutor, WriteKind, WriteOp
+
+_T = TypeVar("_T")
 
 
 class Aggregator:
@@ -33,16 +55,28 @@ class Aggregator:
         resolution_strategy: ResolutionStrategy = AlwaysSecondRS(),
         config_fname: Optional[str] = None,
         ignore_keys: Tuple[Sequence[str], Sequence[str]] = tuple(),
+        concurrent: bool = True,
+        max_parallel_writes: int = 1,
+        horizon: Optional[datetime.timedelta] = None,
     ):
+        """
+        :param concurrent: Start, fetch the items of, and finish the two sides concurrently,
+                           unless one of them is not thread-safe.
+        :param max_parallel_writes: Maximum number of concurrent writes to each side. Sides
+                                    that are not thread-safe are written one item at a time.
+        :param horizon: Only list the items that are still active or that finished within this
+                        period before each run - see SyncSide.set_horizon. Items that finished
+                        earlier are left as they are on both sides.
+        """
         # Preferences manager
         # Sample config path: ~/.config/taskwarrior_syncall/taskwarrior_gcal_sync.yaml
         #                     ~/.config/taskwarrior_syncall/taskwarrior_notion_sync.yaml
         #
         # The stem of the filename can be overridden by the user if they provide `config_fname`.
         #
-        # Serdes dirs are shared across multiple different syncrhonizers
-        # Sample serdes dirs: ~/.config/taskwarrior_syncall/serdes/gcal/
-        #                     ~/.config/taskwarrior_syncall/serdes/tw/
+        # Serdes stores are shared across multiple different syncrhonizers
+        # Sample serdes stores: ~/.config/taskwarrior_syncall/serdes/gcal.sqlite3
+        #                       ~/.config/taskwarrior_syncall/serdes/tw.sqlite3
         if config_fname is None:
             config_fname = f"{side_B.name}_{side_A.name}_sync".lower()
         else:
@@ -55,6 +89,20 @@ class Aggregator:
 
         self._side_A: SyncSide = side_A
         self._side_B: SyncSide = side_B
+        self._concurrent = concurrent and side_A.is_thread_safe and side_B.is_thread_safe
+
+        # Items of each side, as returned by its latest get_all_items call
+        self._listed_items: Dict[str, Dict[ID, Item]] = {}
+        self._num_syncs = 0
+
+        # Items that finished before the start of the horizon are not listed by the sides
+        self._horizon = horizon
+        self._horizon_start: Optional[datetime.datetime] = None
+
+        # Writes to each side are recorded during the synchronization and executed at the end
+        # of it, concurrently - see _execute_writes
+        self._write_executor = WriteExecutor(max_parallel_writes=max_parallel_writes)
+        self._pending_writes: Dict[str, List[WriteOp]] = {}
 
         # Initialize helpers - one for each side ----------------------------------------------
         self._helper_A = SideHelper.from_side(self._side_A)
@@ -67,23 +115,28 @@ class Aggregator:
             self._helper_A.ignore_keys = ignore_keys[0]
             self._helper_B.ignore_keys = ignore_keys[1]
 
-        # serdes directories for storing cached versions of items for each side ---------------
+        # serdes stores for storing cached versions of items for each side -------------------
+        # Earlier versions used one pickle file per item, under serdes/<side>/. Migrate these
+        # to the store of the side on first use.
         self.serdes_dirs = self.prefs_manager.config_directory / "serdes"
-        serdes_A = self.serdes_dirs / self._side_A.name.lower()
-        serdes_B = self.serdes_dirs / self._side_B.name.lower()
-        serdes_A.mkdir(exist_ok=True, parents=True)
-        serdes_B.mkdir(exist_ok=True)
+        self.serdes_dirs.mkdir(exist_ok=True, parents=True)
+        for helper in (self._helper_A, self._helper_B):
+            side_name = str(helper).lower()
+            store = SnapshotStore(self.serdes_dirs / f"{side_name}.sqlite3")
+            store.migrate_from_pickle_dir(self.serdes_dirs / side_name)
+            self.config[f"{helper}_serdes"] = store
 
-        self.config[f"{self._helper_A}_serdes"] = serdes_A
-        self.config[f"{self._helper_B}_serdes"] = serdes_B
+        # State of this particular combination, next to its configuration file ----------------
+        # e.g., the fingerprints of the cached items
+        self._state = SyncState(self.prefs_manager.config_file.with_suffix(".sqlite3"))
 
         # Correspondences between the two sides -----------------------------------------------
-        # For finding the matches between IDs of the two sides
-        # e.g., for Taskwarrior <-> Gcal: tw_gcal_ids
-        correspondences_prefs_key = f"{self._side_B.name}_{self._side_A.name}_ids"
-        if correspondences_prefs_key not in self.prefs_manager:
-            self.prefs_manager[correspondences_prefs_key] = bidict()
-        self._B_to_A_map: bidict = self.prefs_manager[correspondences_prefs_key]
+        # For finding the matches between IDs of the two sides. Kept in memory for lookups in
+        # both directions and persisted in the state of the combination, writing only the ones
+        # that changed - see _save_correspondences
+        self._migrate_correspondences_from_prefs()
+        self._B_to_A_map: bidict = bidict(self._state.load_correspondences())
+        self._saved_B_to_A_map: Dict[ID, ID] = dict(self._B_to_A_map)
 
         # resolution strategy to resolve conflicts
         self._resolution_strategy = resolution_strategy
@@ -124,40 +177,73 @@ class Aggregator:
     def __exit__(self, *_):
         self.finish()
 
-    def detect_changes(self, helper: SideHelper, items: Dict[ID, Item]) -> SideChanges:
+    def detect_changes(
+        self, helper: SideHelper, items: Dict[ID, Item], changed_ids: Optional[Set[ID]] = None
+    ) -> SideChanges:
         """
         Given a fresh list of items from the SyncSide, determine which of them are new,
         modified, or have been deleted since the last run.
+
+        :param changed_ids: If the list is limited to the items that changed since the last
+                            run, the IDs of these items - including the deleted ones
         """
-        serdes_dir, _ = self._get_serdes_dirs(helper)
+        store, _ = self._get_snapshot_stores(helper)
         logger.info(f"Detecting changes from {helper}...")
         item_ids = set(items.keys())
+        registered_ids = set(self._get_ids_map(helper=helper))
+
         # New items exist in the sync side but don't yet exist in my IDs correspndences.
-        new = {
-            item_id for item_id in item_ids if item_id not in self._get_ids_map(helper=helper)
-        }
+        new = item_ids - registered_ids
         # Deleted items do not exist in the sync side but still yet exist in my IDs
         # correspndences.
+        if changed_ids is not None:
+            registered_ids &= changed_ids
+        deleted = registered_ids - item_ids
+
+        # Items beyond the horizon are missing from the list as well - these are frozen
+        frozen = self._finished_before_horizon(helper, deleted)
+        if frozen:
+            logger.info(f"{len(frozen)} {helper} items finished before the horizon, skipping.")
+            deleted -= frozen
+
+        # Potentially modified items are all the items that exist in the sync side and in my
+        # IDs correspondences
         #
-        # Exclude the already new ones determined in the earlier step
-        deleted = {
-            registered_id
-            for registered_id in self._get_ids_map(helper=helper)
-            if registered_id not in item_ids.difference(new)
-        }
+        # For these items, compare their fingerprint with the fingerprint of their cached
+        # version. Only if these differ, load the cached version and check whether they are
+        # the same or not to actually determine the ones that are changed.
+        side, _ = self._get_side_instances(helper)
+        ignore_keys = self._get_ignore_keys(helper)
+        fingerprints = self._state.load_fingerprints(helper.name)
+        potentially_modified_ids = item_ids & registered_ids
+        candidate_ids = [
+            item_id
+            for item_id in potentially_modified_ids
+            if fingerprints.get(item_id) is None
+            or side.fingerprint(items[item_id], ignore_keys=ignore_keys)
+            != fingerprints[item_id]
+        ]
 
-        # Potentially modified items are all the items that exist in the sync side minus the
-        # ones already determined as deleted or enw
-        #
-        # For these items, load the cached version and check whether they are the same or not
-        # to actually determine the ones that are changed.
         modified = set()
-        potentially_modified_ids = item_ids.difference(new.union(deleted))
-        for item_id in potentially_modified_ids:
+        unmodified_cached_items = {}
+        cached_items = store.load(candidate_ids)
+        for item_id in candidate_ids:
             item = items[item_id]
-            cached_item = pickle_load(serdes_dir / item_id)
-            if self._item_has_update(prev_item=cached_item, new_item=item, helper=helper):
+            cached_item = cached_items.get(item_id)
+            if cached_item is None:
+                logger.warning(
+                    f"No cached version of {helper} item {item_id}, assuming modified"
+                )
+                modified.add(item_id)
+            elif self._item_has_update(prev_item=cached_item, new_item=item, helper=helper):
                 modified.add(item_id)
+            else:
+                unmodified_cached_items[item_id] = cached_item
+
+        # fingerprints were missing or out of date - e.g., first run with fingerprints
+        self._state.upsert_fingerprints(
+            helper.name, self._fingerprints_of(helper, unmodified_cached_items)
+        )
 
         side_changes = SideChanges(new=new, modified=modified, deleted=deleted)
         logger.debug(f"\n\n{side_changes}")
@@ -166,113 +252,570 @@ class Aggregator:
 
     def sync(self):
         """Entrypoint method."""
-        items_A = {
-            str(item[self._helper_A.id_key]): item for item in self._side_A.get_all_items()
-        }
-        items_B = {
-            str(item[self._helper_B.id_key]): item for item in self._side_B.get_all_items()
+        # sides are long-lived - e.g., sync_periodically - drop the caches of the previous run
+        if self._num_syncs:
+            self._run_on_both_sides(lambda side: side.invalidate_cache())
+        self._num_syncs += 1
+
+        # the previous run was interrupted while writing to the sides
+        if self._recover_from_journal():
+            self._run_on_both_sides(lambda side: side.invalidate_cache())
+
+        if self._horizon is not None:
+            self._horizon_start = datetime.datetime.now(datetime.timezone.utc) - self._horizon
+        for side in (self._side_A, self._side_B):
+            side.set_horizon(self._horizon_start)
+
+        since = {
+            helper.name: self._state.load_change_position(helper.name)
+            for helper in (self._helper_A, self._helper_B)
         }
+        listing_A, listing_B = self._run_on_both_sides(
+            lambda side: self._list_items(side, since=since[side.name])
+        )
+        items_A, changed_ids_A, position_A = listing_A
+        items_B, changed_ids_B, position_B = listing_B
+        self._listed_items[str(self._helper_A)] = items_A
+        self._listed_items[str(self._helper_B)] = items_B
 
         # find what's changed in each side
-        changes_A = self.detect_changes(self._helper_A, items_A)
-        changes_B = self.detect_changes(self._helper_B, items_B)
-
-        # pickle items that are new or updated
-        side_A_serdes_dir, side_B_serdes_dir = self._get_serdes_dirs(self._helper_A)
-        side_A, side_B = self._get_side_instances(self._helper_A)
-        for item_id in changes_B.new.union(changes_B.modified):
-            item = side_B.get_item(item_id)
-            if item is None:
-                raise RuntimeError(f"Failed to retrieve serialized version of Item {item_id}")
-            pickle_dump(item, side_B_serdes_dir / item_id)
-        for item_id in changes_A.new.union(changes_A.modified):
-            item = side_A.get_item(item_id)
-            if item is None:
-                raise RuntimeError(f"Failed to retrieve serialized version of Item {item_id}")
-            pickle_dump(item, side_A_serdes_dir / item_id)
-
-        # remove deleted pickled items
-        self._remove_serdes_files(helper=self._helper_B, ids=changes_B.deleted)
-        self._remove_serdes_files(helper=self._helper_A, ids=changes_A.deleted)
+        changes_A = self.detect_changes(self._helper_A, items_A, changed_ids_A)
+        changes_B = self.detect_changes(self._helper_B, items_B, changed_ids_B)
+
+        # cache items that are new or updated
+        for helper, changes in ((self._helper_B, changes_B), (self._helper_A, changes_A)):
+            snapshots = {}
+            for item_id in changes.new.union(changes.modified):
+                item = self._get_item(item_id, helper=helper)
+                if item is None:
+                    raise RuntimeError(
+                        f"Failed to retrieve serialized version of Item {item_id}"
+                    )
+                snapshots[item_id] = item
+            self._cache_items(helper, snapshots)
+
+            # remove deleted cached items
+            self._uncache_items(helper, changes.deleted)
 
         # synchronize
+        self._pending_writes = {str(self._helper_A): [], str(self._helper_B): []}
         self._synchronizer.sync(changes_A=changes_A, changes_B=changes_B)
+        failed_sides = self._execute_writes()
+        self._save_correspondences()
+        self._state.clear_journal()
+
+        # keep the previous position of sides with changes that failed to synchronize, so that
+        # these are listed again in the next run
+        for helper, position in ((self._helper_A, position_A), (self._helper_B, position_B)):
+            if helper.name in failed_sides:
+                logger.warning(
+                    f"Some changes of {helper} failed to synchronize, they will be retried in"
+                    " the next run."
+                )
+                continue
+
+            self._state.save_change_position(helper.name, position)
+
+    def sync_periodically(self, interval: float, stop: Optional[threading.Event] = None):
+        """Synchronize every `interval` seconds, until interrupted or until `stop` is set.
+
+        The sides are only started once. A failed synchronization is logged and retried in the
+        next cycle. While idle, refresh the credentials of the two sides.
+        """
+        if stop is None:
+            stop = threading.Event()
+
+        while not stop.is_set():
+            next_sync = time.monotonic() + interval
+            try:
+                self.sync()
+            except Exception:
+                logger.opt(exception=True).error(
+                    f"Synchronization failed, retrying in {interval} seconds..."
+                )
+
+            self.flush()
+            self.refresh_credentials()
+            stop.wait(max(next_sync - time.monotonic(), 0))
+
+    def flush(self):
+        """Persist the correspondences and the configuration, e.g., in case a long-running
+        process is killed.
+        """
+        self._save_correspondences()
+        self.prefs_manager.flush_config(self.prefs_manager.config_file)
+
+    def refresh_credentials(self):
+        """Refresh the credentials of both sides if they are about to expire."""
+        try:
+            self._run_on_both_sides(lambda side: side.refresh_credentials())
+        except Exception:
+            logger.opt(exception=True).error("Failed to refresh credentials.")
 
     def start(self):
         """Initialization actions."""
-        self._side_A.start()
-        self._side_B.start()
+        self._run_on_both_sides(lambda side: side.start())
 
     def finish(self):
         """Finalization actions."""
-        self._side_A.finish()
-        self._side_B.finish()
+        self._run_on_both_sides(lambda side: side.finish())
+
+        for helper in (self._helper_A, self._helper_B):
+            store, _ = self._get_snapshot_stores(helper)
+            store.close()
+        self._save_correspondences()
+        self._state.close()
 
     # InserterFn = Callable[[Item], ID]
     def inserter_to(self, item: Item, helper: SideHelper) -> ID:
         """Inserter.
 
         Other side already has the item, and I'm also inserting it at this side.
+
+        The insertion is only recorded at this point. Return a placeholder ID for the
+        correspondences, it's replaced by the actual ID once the item is inserted.
         """
-        item_side, _ = self._get_side_instances(helper)
-        serdes_dir, _ = self._get_serdes_dirs(helper)
         logger.info(
             f"[{helper.other}] Inserting item [{self._summary_of(item, helper):10}] at"
             f" {helper}..."
         )
 
-        item_created = item_side.add_item(item)
-        item_created_id = str(item_created[helper.id_key])
-
-        # Cache both sides with pickle - f=id_
-        logger.debug(f'Pickling newly created {helper} item -> "{item_created_id}"')
-        pickle_dump(item_created, serdes_dir / item_created_id)
+        pending_writes = self._pending_writes[str(helper)]
+        placeholder_id = f"<pending {helper} insertion #{len(pending_writes)}>"
+        pending_writes.append(
+            WriteOp(kind=WriteKind.INSERT, item_id=placeholder_id, item=item)
+        )
 
-        return item_created_id
+        return placeholder_id
 
     def updater_to(self, item_id: ID, item: Item, helper: SideHelper):
         """Updater."""
-        side, _ = self._get_side_instances(helper)
-        serdes_dir, _ = self._get_serdes_dirs(helper)
         logger.info(
             f"[{helper.other}] Updating item [{self._summary_of(item, helper):10}] at"
             f" {helper}..."
         )
 
-        side.update_item(item_id, **item)
-        pickle_dump(item, serdes_dir / item_id)
+        self._pending_writes[str(helper)].append(
+            WriteOp(kind=WriteKind.UPDATE, item_id=item_id, item=item)
+        )
 
     def deleter_to(self, item_id: ID, helper: SideHelper):
         """Deleter."""
         logger.info(f"[{helper}] Synchronising deleted item, id -> {item_id}...")
+        self._pending_writes[str(helper)].append(
+            WriteOp(
+                kind=WriteKind.DELETE,
+                item_id=item_id,
+                other_id=self._get_ids_map(helper)[item_id],
+            )
+        )
+
+    def _execute_writes(self) -> Set[str]:
+        """Execute the writes recorded during the synchronization.
+
+        The writes run concurrently, but their results are applied here, one at a time - keep
+        the correspondences and cached items consistent regardless of the order of completion.
+        The results are only applied once the writes of their side are committed, see
+        SyncSide.commit_writes, so that writes that are never sent to the side aren't recorded
+        as synchronized.
+
+        All the writes are journaled before executing them and each one is marked as done
+        once applied - see _recover_from_journal.
+
+        :returns: The names of the sides whose changes failed to be written to the other side
+        """
+        self._journal_writes()
+        helpers = {id(self._side_A): self._helper_A, id(self._side_B): self._helper_B}
+        writes = [
+            (side, self._pending_writes[str(helpers[id(side)])])
+            for side in (self._side_A, self._side_B)
+        ]
+
+        failed_sides: Set[str] = set()
+        try:
+            results = list(self._write_executor.run(writes))
+            commit_errors = self._commit_writes(side for side, ops in writes if ops)
+            for side, op, item_created, exc in results:
+                helper = helpers[id(side)]
+                exc = exc or commit_errors.get(id(side))
+                if exc is None:
+                    self._apply_write(helper, op, item_created)
+                else:
+                    other = helper.other
+                    assert other is not None
+                    failed_sides.add(other.name)
+                    source_id = self._get_ids_map(helper).get(op.item_id)
+                    if op.kind is not WriteKind.DELETE and source_id is not None:
+                        # the item of the other side was cached as synchronized - uncache it
+                        # so that it's detected as changed again in the next run
+                        self._uncache_items(other, (source_id,))
+
+                    self._revert_write(helper, op)
+                    if op.seq is not None:
+                        self._state.discard_write(op.seq)
+                    desc = f"{helper} {op.kind.value} - {op.item_id}"
+                    logger.error(f"[{desc}] Operation failed.")
+                    logger.opt(exception=exc).debug(f"[{desc}] Operation failed.")
+        finally:
+            # drop the placeholders of any insertions that didn't complete
+            for helper in (self._helper_A, self._helper_B):
+                ids_map = self._get_ids_map(helper)
+                for op in self._pending_writes[str(helper)]:
+                    if op.kind is WriteKind.INSERT:
+                        ids_map.pop(op.item_id, None)
+
+            self._pending_writes = {}
+
+        return failed_sides
+
+    def _commit_writes(self, sides: Iterable[SyncSide]) -> Dict[int, Exception]:
+        """Commit the writes of each of the given sides.
+
+        :returns: The error of each side that failed to commit its writes, keyed by the id() of
+                  the side
+        """
+        errors: Dict[int, Exception] = {}
+        for side in sides:
+            try:
+                side.commit_writes()
+            except Exception as exc:
+                logger.opt(exception=exc).error(f"[{side}] Failed to commit writes.")
+                errors[id(side)] = exc
+
+        return errors
+
+    def _journal_writes(self):
+        """Record the pending writes of both sides in the journal, in a single transaction."""
+        entries: List[JournalEntry] = []
+        ops: List[WriteOp] = []
+        for helper in (self._helper_A, self._helper_B):
+            ids_map = self._get_ids_map(helper)
+            for op in self._pending_writes[str(helper)]:
+                entries.append(
+                    JournalEntry(
+                        seq=-1,
+                        side=helper.name,
+                        kind=op.kind.value,
+                        item_id=op.item_id,
+                        other_id=(
+                            op.other_id
+                            if op.kind is WriteKind.DELETE
+                            else ids_map.get(op.item_id)
+                        ),
+                        item=op.item,
+                    )
+                )
+                ops.append(op)
+
+        for op, seq in zip(ops, self._state.journal_writes(entries)):
+            op.seq = seq
+
+    def _apply_write(self, helper: SideHelper, op: WriteOp, item_created: Optional[Item]):
+        """Update the correspondences and cached items after a successful write."""
+        if op.kind is WriteKind.INSERT:
+            assert item_created is not None
+            item_created_id = str(item_created[helper.id_key])
+            if op.seq is not None:
+                self._state.complete_write(op.seq, result_id=item_created_id)
+            ids_map = self._get_ids_map(helper)
+            ids_map[item_created_id] = ids_map.pop(op.item_id)
+
+            # Cache the newly created item
+            logger.debug(f'Caching newly created {helper} item -> "{item_created_id}"')
+            self._cache_items(helper, {item_created_id: item_created})
+        else:
+            if op.seq is not None:
+                self._state.complete_write(op.seq)
+            if op.kind is WriteKind.UPDATE:
+                assert op.item is not None
+                self._cache_items(helper, {op.item_id: op.item})
+            else:
+                self._uncache_items(helper, (op.item_id,))
+
+    def _revert_write(self, helper: SideHelper, op: WriteOp):
+        """Restore the correspondences after a failed write."""
+        if op.kind is WriteKind.INSERT:
+            self._get_ids_map(helper).pop(op.item_id, None)
+        elif op.kind is WriteKind.DELETE:
+            self._get_ids_map(helper)[op.item_id] = op.other_id
+
+    def _recover_from_journal(self) -> bool:
+        """Recover from a run that was interrupted while writing to the sides.
+
+        For each journaled write of that run:
+
+        - If it's done, register its effects, i.e., the correspondences and cached items,
+          which may not have been persisted.
+        - Otherwise its outcome is unknown. Replay updates and deletions, both of them are
+          idempotent. Look for the items that were being inserted among the unregistered items
+          of the side, so that they are not inserted again in the upcoming run.
+
+        :returns: Whether there was anything to recover
+        """
+        entries = self._state.load_journal()
+        if not entries:
+            return False
+
+        logger.warning(f"Recovering {len(entries)} writes of an interrupted run...")
+        helpers = {helper.name: helper for helper in (self._helper_A, self._helper_B)}
+        unregistered_items: Dict[str, Dict[ID, Item]] = {}
+        # done entries first, so that their items are not matched to pending insertions
+        for entry in sorted(entries, key=lambda entry: not entry.done):
+            helper = helpers.get(entry.side)
+            if helper is None:
+                logger.warning(f"Skipping journaled write of unknown side {entry.side}")
+                continue
+
+            try:
+                self._recover_write(helper, entry, unregistered_items)
+            except Exception:
+                logger.opt(exception=True).error(
+                    f"[{helper}] Failed to recover {entry.kind} - {entry.item_id}, skipping"
+                    " it."
+                )
+
+        # the replayed writes - keep the journal if they can't be committed
+        self._run_on_both_sides(lambda side: side.commit_writes())
+        self._save_correspondences()
+        self._state.clear_journal()
+        return True
+
+    def _recover_write(
+        self,
+        helper: SideHelper,
+        entry: JournalEntry,
+        unregistered_items: Dict[str, Dict[ID, Item]],
+    ):
         side, _ = self._get_side_instances(helper)
-        side.delete_single_item(item_id)
+        ids_map = self._get_ids_map(helper)
+        kind = WriteKind(entry.kind)
+        if kind is WriteKind.INSERT:
+            if entry.done:
+                item_id = entry.result_id
+            else:
+                item_id = self._find_inserted_item(helper, entry, unregistered_items)
+            if item_id is None or entry.other_id is None:
+                return
+
+            logger.info(f"[{helper}] Registering inserted item {item_id}")
+            ids_map.forceput(item_id, entry.other_id)
+            unregistered_items.get(str(helper), {}).pop(item_id, None)
+            item = side.get_item(item_id)
+            if item is not None:
+                self._cache_items(helper, {item_id: item})
+        elif kind is WriteKind.UPDATE:
+            if entry.done or entry.item is None or side.get_item(entry.item_id) is None:
+                return
+
+            logger.info(f"[{helper}] Replaying update of item {entry.item_id}")
+            side.update_item(entry.item_id, **entry.item)
+            self._cache_items(helper, {entry.item_id: entry.item})
+        else:
+            if not entry.done and side.get_item(entry.item_id) is not None:
+                logger.info(f"[{helper}] Replaying deletion of item {entry.item_id}")
+                side.delete_single_item(entry.item_id)
+            ids_map.pop(entry.item_id, None)
+            self._uncache_items(helper, (entry.item_id,))
+
+    def _find_inserted_item(
+        self,
+        helper: SideHelper,
+        entry: JournalEntry,
+        unregistered_items: Dict[str, Dict[ID, Item]],
+    ) -> Optional[ID]:
+        """Find the item of an insertion of unknown outcome among the unregistered items of the
+        side - None if it wasn't inserted.
+        """
+        side, _ = self._get_side_instances(helper)
+        if str(helper) not in unregistered_items:
+            ids_map = self._get_ids_map(helper)
+            items = ((str(item[helper.id_key]), item) for item in side.get_all_items())
+            unregistered_items[str(helper)] = {
+                item_id: item for item_id, item in items if item_id not in ids_map
+            }
+
+        ignore_keys = self._get_ignore_keys(helper)
+        for item_id, item in unregistered_items[str(helper)].items():
+            if side.items_are_identical(
+                copy.deepcopy(item), copy.deepcopy(entry.item), ignore_keys=ignore_keys
+            ):
+                return item_id
+
+        return None
+
+    def _list_items(
+        self, side: SyncSide, since: Optional[str]
+    ) -> Tuple[Dict[ID, Item], Optional[Set[ID]], Optional[str]]:
+        """List the items of the given side - only the changed ones, if the side keeps a
+        journal of its changes and the position of the previous run is known.
+
+        :returns: The listed items, the IDs of the changed items if the listing is limited to
+                  these, and the position of the change journal of the side as of the listing
+        """
+        helper = self._helper_A if side is self._side_A else self._helper_B
+        changed_items = None
+        if since is not None:
+            changed_items = side.get_changed_items(since)
 
-        self._remove_serdes_files(helper=helper, ids=(item_id,))
+        if changed_items is None:
+            items = {str(item[helper.id_key]): item for item in side.get_all_items()}
+            return items, None, side.change_journal_position()
+
+        logger.info(f"{len(changed_items)} {helper} items changed since the previous run.")
+        items = {str(id_): item for id_, item in changed_items.items() if item is not None}
+        return items, {str(id_) for id_ in changed_items}, side.change_journal_position()
 
     def item_getter_for(self, item_id: ID, helper: SideHelper) -> Item:
         """Item Getter."""
         logger.debug(f"Fetching {helper} item for id -> {item_id}")
+        return self._get_item(item_id, helper=helper)
+
+    def _get_item(self, item_id: ID, helper: SideHelper) -> Optional[Item]:
+        """Get an item of the given side.
+
+        Reuse the item returned by the latest listing of the side, unless the side reports that
+        its listings are incomplete - fetch it via get_item in that case.
+        """
+        side, _ = self._get_side_instances(helper)
+        if side.listing_is_complete:
+            item = self._listed_items.get(str(helper), {}).get(item_id)
+            if item is not None:
+                return item
+
+        return side.get_item(item_id)
+
+    def _finished_before_horizon(self, helper: SideHelper, ids: Iterable[ID]) -> Set[ID]:
+        """IDs of the given items whose cached versions finished before the horizon."""
+        ids = list(ids)
+        if self._horizon_start is None or not ids:
+            return set()
+
+        store, _ = self._get_snapshot_stores(helper)
         side, _ = self._get_side_instances(helper)
-        item = side.get_item(item_id)
-        return item
+        frozen = set()
+        for item_id, item in store.load(ids).items():
+            finished_at = side.finished_at(item)
+            if finished_at is None:
+                continue
+            if assume_local_tz_if_none(finished_at) < self._horizon_start:
+                frozen.add(item_id)
+
+        return frozen
 
     def _item_has_update(self, prev_item: Item, new_item: Item, helper: SideHelper) -> bool:
         """Determine whether the item has been updated."""
         side, _ = self._get_side_instances(helper)
 
+        # items_are_identical may modify the items in place - compare copies, so that the
+        # items that are to be cached are not altered.
         return not side.items_are_identical(
-            prev_item, new_item, ignore_keys=[helper.id_key, *helper.ignore_keys]
+            copy.copy(prev_item),
+            copy.copy(new_item),
+            ignore_keys=self._get_ignore_keys(helper),
         )
 
+    def _get_ignore_keys(self, helper: SideHelper) -> List[str]:
+        """Keys to ignore when comparing items of the given side."""
+        return [helper.id_key, *helper.ignore_keys]
+
+    def _fingerprints_of(self, helper: SideHelper, items: Mapping[ID, Item]) -> Dict[ID, str]:
+        side, _ = self._get_side_instances(helper)
+        ignore_keys = self._get_ignore_keys(helper)
+        fingerprints = {
+            item_id: side.fingerprint(item, ignore_keys=ignore_keys)
+            for item_id, item in items.items()
+        }
+        return {
+            item_id: fingerprint
+            for item_id, fingerprint in fingerprints.items()
+            if fingerprint is not None
+        }
+
+    def _cache_items(self, helper: SideHelper, items: Mapping[ID, Item]):
+        """Store the given items, along with their fingerprints, as the latest cached ones."""
+        store, _ = self._get_snapshot_stores(helper)
+        store.upsert(items)
+        self._state.upsert_fingerprints(helper.name, self._fingerprints_of(helper, items))
+
+    def _uncache_items(self, helper: SideHelper, ids: Iterable[ID]):
+        """Remove the cached versions of the given items, along with their fingerprints."""
+        ids = list(ids)
+        store, _ = self._get_snapshot_stores(helper)
+        store.delete(ids)
+        self._state.delete_fingerprints(helper.name, ids)
+
+    def _run_on_both_sides(self, fn: Callable[[SyncSide], _T]) -> Tuple[_T, _T]:
+        """Call the given function on both sides and return the results.
+
+        The two calls run concurrently if both sides allow it. In either case, both calls run
+        to completion before an error from either of them is raised.
+        """
+        sides = (self._side_A, self._side_B)
+        if not self._concurrent:
+            return fn(self._side_A), fn(self._side_B)
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="syncall") as executor:
+            futures = [executor.submit(fn, side) for side in sides]
+            wait(futures)
+
+        errors = [(side, future.exception()) for side, future in zip(sides, futures)]
+        errors = [(side, exc) for side, exc in errors if exc is not None]
+        if errors:
+            for side, exc in errors[1:]:
+                logger.opt(exception=exc).error(f"[{side}] Operation failed.")
+            raise errors[0][1]
+
+        return futures[0].result(), futures[1].result()
+
+    def _save_correspondences(self):
+        """Persist the correspondences that changed since the previous call."""
+        saved = self._saved_B_to_A_map
+        upserts = {
+            id_B: id_A for id_B, id_A in self._B_to_A_map.items() if saved.get(id_B) != id_A
+        }
+        deleted = saved.keys() - self._B_to_A_map.keys()
+        if not upserts and not deleted:
+            return
+
+        logger.debug(
+            f"Saving correspondences: {len(upserts)} added/changed, {len(deleted)} deleted"
+        )
+        self._state.update_correspondences(upserts, deleted)
+        self._saved_B_to_A_map = dict(self._B_to_A_map)
+
+    def _migrate_correspondences_from_prefs(self):
+        """Move the correspondences out of the YAML configuration of the combination.
+
+        Earlier versions kept them there, e.g., for Taskwarrior <-> Gcal under tw_gcal_ids,
+        parsing and rewriting all of them on every run.
+        """
+        prefs_key = f"{self._side_B.name}_{self._side_A.name}_ids"
+        if prefs_key not in self.prefs_manager:
+            return
+
+        correspondences = self.prefs_manager[prefs_key]
+        if not isinstance(correspondences, Mapping):
+            return
+
+        logger.info(
+            f"Migrating {len(correspondences)} correspondences from"
+            f" {self.prefs_manager.config_file} to {self._state}..."
+        )
+        self._state.update_correspondences(
+            {str(id_B): str(id_A) for id_B, id_A in correspondences.items()}
+        )
+        # the state is committed, it's safe to drop them from the configuration now
+        self.prefs_manager[prefs_key] = f"Moved to {self._state.path.name}"
+        self.prefs_manager.flush_config(self.prefs_manager.config_file)
+
     def _get_ids_map(self, helper: SideHelper):
         return self._B_to_A_map if helper is self._helper_B else self._B_to_A_map.inverse
 
-    def _get_serdes_dirs(self, helper: SideHelper) -> Tuple[Path, Path]:
-        serdes_dir = self.config[f"{helper}_serdes"]
-        other_serdes_dir = self.config[f"{helper.other}_serdes"]
+    def _get_snapshot_stores(self, helper: SideHelper) -> Tuple[SnapshotStore, SnapshotStore]:
+        store = self.config[f"{helper}_serdes"]
+        other_store = self.config[f"{helper.other}_serdes"]
 
-        return serdes_dir, other_serdes_dir
+        return store, other_store
 
     def _get_side_instances(self, helper: SideHelper) -> Tuple[SyncSide, SyncSide]:
         side = self._side_B if helper is self._helper_B else self._side_A
@@ -280,22 +823,6 @@ class Aggregator:
 
         return side, other_side
 
-    def _remove_serdes_files(self, helper: SideHelper, *, ids: Iterable[ID]):
-        serdes_dir, _ = self._get_serdes_dirs(helper)
-
-        def full_path(id_: ID) -> Path:
-            return serdes_dir / str(id_)
-
-        for id_ in ids:
-            p = full_path(id_)
-            try:
-                p.unlink()
-            except FileNotFoundError:
-                logger.warning(f"File doesn't exist, this may indicate an error -> {p}")
-                logger.opt(exception=True).debug(
-                    f"File doesn't exist, this may indicate an error -> {p}"
-                )
-
     def _summary_of(self, item: Item, helper: SideHelper, short=True) -> str:
         """Get the summary of the given item."""
         ret = item[helper.summary_key]
@@ -6,10 +6,12 @@ Use these functions only in top-level executables. In case of errors they may di
 
 import logging
 import os
+import re
 import subprocess
 import sys
+import threading
 from collections.abc import Iterable
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Mapping, NoReturn, Optional, Sequence, Type, cast
 from urllib.parse import quote
@@ -36,6 +38,9 @@ name_to_resolution_strategy_type: Mapping[str, Type[ResolutionStrategy]] = {
     "AlwaysSecondRS": AlwaysSecondRS,
 }
 
+# Serializes the updates of cached combinations, e.g., by the combinations of a scheduler
+_combinations_lock = threading.Lock()
+
 
 def get_resolution_strategy(
     resolution_strategy_name: str, side_A_type: Type[SyncSide], side_B_type: Type[SyncSide]
@@ -60,6 +65,35 @@ def get_resolution_strategy(
     return instance
 
 
+_DURATION_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_duration(duration: str) -> timedelta:
+    """
+    Parse a duration given as a number of minutes, hours, days or weeks.
+
+    Usage::
+
+    >>> parse_duration("30d")
+    datetime.timedelta(days=30)
+    >>> parse_duration(" 2w ")
+    datetime.timedelta(days=14)
+    >>> parse_duration("12h")
+    datetime.timedelta(seconds=43200)
+    >>> parse_duration("30")
+    Traceback (most recent call last):
+    ValueError: ...
+    """
+    match = re.fullmatch(r"(\d+)([mhdw])", duration.strip())
+    if match is None:
+        raise ValueError(
+            f"Invalid duration: {duration}, expected a number followed by one of"
+            f" {', '.join(_DURATION_UNITS)}, e.g., 30d"
+        )
+
+    return timedelta(**{_DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
+
 def app_name():
     """
     Return the name of the application which defines the config, cache, and share directories
@@ -190,6 +224,17 @@ def cache_or_reuse_cached_combination(
     return config_name
 
 
+def update_cached_combination(config_fname: str, combination: str, **entries):
+    """Add or overwrite the given entries in the configuration of a cached combination.
+
+    Useful for caching values that are expensive to compute, e.g., IDs that have to be looked
+    up via the API of a service.
+    """
+    with _combinations_lock:
+        with PrefsManager(app_name=app_name(), config_fname=config_fname) as prefs_manager:
+            prefs_manager[combination] = {**prefs_manager[combination], **entries}
+
+
 def report_toplevel_exception(is_verbose: bool):
     s = (
         "Application failed; Below you can find the error message and stack trace. If you"
@@ -1,3 +1,4 @@
+import datetime
 from typing import Optional, Sequence
 
 import asana
@@ -10,6 +11,10 @@ from taskwarrior_syncall.types import AsanaGID, AsanaRawTask
 # The API doesn't allow page sizes larger than 100.
 GET_TASKS_PAGE_SIZE = 100
 
+# Fields to request in GET /tasks API call - all the fields of an AsanaTask, so that the listed
+# tasks don't have to be fetched one by one.
+GET_TASKS_FIELDS = sorted(AsanaTask._key_names)
+
 
 class AsanaSide(SyncSide):
     """
@@ -33,13 +38,21 @@ class AsanaSide(SyncSide):
         results = []
 
         if self._task_gid is None:
+            params = {}
+            if self._horizon_start is not None:
+                # incomplete tasks and tasks completed after the horizon
+                params["completed_since"] = self._horizon_start.isoformat()
+
             tasks = self._client.tasks.find_all(
-                assignee="me", workspace=self._workspace_gid, page_size=GET_TASKS_PAGE_SIZE
+                assignee="me",
+                workspace=self._workspace_gid,
+                page_size=GET_TASKS_PAGE_SIZE,
+                fields=GET_TASKS_FIELDS,
+                **params,
             )
 
             for task in tasks:
-                detailed_task = self.get_item(task["gid"])
-                results.append(detailed_task)
+                results.append(AsanaTask.from_raw_task(task))
         else:
             task = self.get_item(self._task_gid)
             if task is not None:
@@ -137,6 +150,11 @@ class AsanaSide(SyncSide):
         """Key in the dictionary of the item (task) that refers to its modification date."""
         return "modified_at"
 
+    @classmethod
+    def finished_at(cls, item: AsanaTask) -> Optional[datetime.datetime]:
+        """When the given item (task) was completed, None if it's incomplete."""
+        return item["completed_at"] if item["completed"] else None
+
     @classmethod
     def items_are_identical(
         cls, item1: AsanaTask, item2: AsanaTask, ignore_keys: Sequence[str] = []
@@ -160,3 +178,14 @@ class AsanaSide(SyncSide):
             compare_keys.remove("due_at")
 
         return SyncSide._items_are_identical(item1, item2, compare_keys)
+
+    @classmethod
+    def fingerprint(cls, item: AsanaTask, ignore_keys: Sequence[str] = []) -> str:
+        """Compute a digest of the fields of the item (task) that are compared.
+
+        Both 'due_at' and 'due_on' are always part of the digest, since which one is compared
+        depends on the other item (task) as well.
+        """
+        return SyncSide._fingerprint(
+            item, [key for key in AsanaTask._key_names if key not in ignore_keys]
+        )
@@ -5,7 +5,7 @@ extra dependency.
 """
 import click
 
-from taskwarrior_syncall.app_utils import name_to_resolution_strategy_type
+from taskwarrior_syncall.app_utils import name_to_resolution_strategy_type, parse_duration
 from taskwarrior_syncall.constants import COMBINATION_FLAGS
 
 
@@ -67,6 +67,56 @@ def opt_list_combinations(name_A: str, name_B: str):
     )
 
 
+def opt_daemon():
+    return click.option(
+        "--daemon",
+        "daemon",
+        is_flag=True,
+        help="Keep running and synchronize periodically - see --interval",
+    )
+
+
+def opt_interval():
+    return click.option(
+        "--interval",
+        "interval",
+        default=300,
+        type=click.IntRange(min=1),
+        help="Seconds between consecutive synchronizations in daemon mode",
+    )
+
+
+def opt_max_parallel_writes():
+    return click.option(
+        "--max-parallel-writes",
+        "max_parallel_writes",
+        default=1,
+        type=click.IntRange(min=1),
+        help="Maximum number of items to add/update/delete concurrently at each side",
+    )
+
+
+def opt_horizon():
+    def parse(ctx, param, value):
+        if value is None:
+            return None
+
+        try:
+            return parse_duration(value)
+        except ValueError as err:
+            raise click.BadParameter(str(err))
+
+    return click.option(
+        "--horizon",
+        "horizon",
+        callback=parse,
+        help=(
+            "Only synchronize the items that are still active or that were completed/ended"
+            " within this period, e.g., 30d - leave the older ones as they are"
+        ),
+    )
+
+
 def opt_tw_tags():
     return click.option(
         "-t",
@@ -88,6 +138,54 @@ def opt_tw_project():
     )
 
 
+def opt_tw_cache_export():
+    return click.option(
+        "--tw-cache-export",
+        "tw_cache_export",
+        is_flag=True,
+        help=(
+            "Reuse the latest full Taskwarrior export of other runs, e.g., of other tw_*_sync"
+            " scripts, while the Taskwarrior database is unchanged"
+        ),
+    )
+
+
+def opt_tw_read_data_files():
+    return click.option(
+        "--tw-read-data-files",
+        "tw_read_data_files",
+        is_flag=True,
+        help=(
+            "Read the Taskwarrior tasks directly off the data files of the database, instead"
+            " of running `task export`"
+        ),
+    )
+
+
+def opt_tw_lazy_tasks():
+    return click.option(
+        "--tw-lazy-tasks",
+        "tw_lazy_tasks",
+        is_flag=True,
+        help=(
+            "Convert the fields of the Taskwarrior tasks on first access, instead of"
+            " converting all of them on export"
+        ),
+    )
+
+
+def opt_tw_use_change_journal():
+    return click.option(
+        "--tw-use-change-journal",
+        "tw_use_change_journal",
+        is_flag=True,
+        help=(
+            "Only fetch the Taskwarrior tasks that the hooks of tw_install_hooks journaled as"
+            " changed since the previous run - saved in the combination"
+        ),
+    )
+
+
 def opt_resolution_strategy():
     return click.option(
         "-r",
@@ -1,2 +1,9 @@
 ISSUES_URL = "https://github.com/bergercookie/taskwarrior-syncall/issues"
 COMBINATION_FLAGS = ["-b", "--combination"]
+# Seconds to wait for the SQLite databases of the sides and combinations to be unlocked, e.g.,
+# when the combinations of a scheduler write the same snapshot store concurrently
+SQLITE_BUSY_TIMEOUT = 60.0
+
+# SQLite limits the number of host parameters in a single statement (999 in older versions).
+# Stay well below that when building "IN (...)" queries.
+SQLITE_MAX_QUERY_PARAMS = 500
@@ -1,23 +1,77 @@
 import datetime
+import json
 import os
+import time
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Sequence, Union, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
 import dateutil
 import pkg_resources
 import pytz
 from bubop import format_datetime_tz, logger
 from googleapiclient import discovery
-from googleapiclient.http import HttpError
+from googleapiclient.http import HttpError, HttpRequest
 from item_synchronizer.types import ID
 
-from taskwarrior_syncall.google.google_side import GoogleSide
+from taskwarrior_syncall.google.google_side import GoogleSide, rate_limited_request_builder
+from taskwarrior_syncall.rate_limiter import RateLimiter
 from taskwarrior_syncall.sync_side import SyncSide
 
 DEFAULT_CLIENT_SECRET = pkg_resources.resource_filename(
     "taskwarrior_syncall", os.path.join("res", "gcal_client_secret.json")
 )
 
+# Maximum number of events per page of events.list - the maximum that the API allows
+LIST_PAGE_SIZE = 2500
+
+# Keys of the listed events - the ones that the converters, the comparison of the events and
+# the resolution strategies read, along with the ones that the side itself needs
+LISTED_EVENT_KEYS = (
+    "description",
+    "end",
+    "etag",
+    "id",
+    "start",
+    "status",
+    "summary",
+    "updated",
+)
+
+# Partial response of events.list, limited to the above keys
+LIST_FIELDS = f"items({','.join(LISTED_EVENT_KEYS)}),nextPageToken,nextSyncToken"
+
+# Maximum number of calls to send in a single batch request. The API accepts up to 1000 but
+# recommends against batches of more than 50 calls.
+BATCH_MAX_CALLS = 50
+
+# Attempts of the calls of a batch request that fail due to rate limits and delay before the
+# first retry, doubled after every attempt
+BATCH_MAX_ATTEMPTS = 5
+BATCH_RETRY_DELAY = 1.0
+
+
+def _is_rate_limited(err: Exception) -> bool:
+    """Whether the given error is due to exceeding the rate limits of the API."""
+    if not isinstance(err, HttpError):
+        return False
+
+    status = err.resp.status
+    return status == 429 or (
+        status == 403 and b"ratelimitexceeded" in (err.content or b"").lower()
+    )
+
 
 class GCalSide(GoogleSide):
     """GCalSide interacts with the Google Calendar API.
@@ -40,13 +94,34 @@ class GCalSide(GoogleSide):
     _date_keys = ["end", "start", "updated"]
     _date_format = "%Y-%m-%d"
 
+    # The HTTP client of the service (httplib2) is not thread-safe
+    is_thread_safe = False
+
+    # Writes are sent in batch requests
+    max_add_batch_size = BATCH_MAX_CALLS
+    max_update_batch_size = BATCH_MAX_CALLS
+    max_delete_batch_size = BATCH_MAX_CALLS
+
     def __init__(
         self,
         *,
         calendar_summary="TaskWarrior Reminders",
         client_secret,
+        rate_limiter: Optional[RateLimiter] = None,
+        calendar_id: Optional[str] = None,
+        save_calendar_id: Optional[Callable[[str], None]] = None,
         **kargs,
     ):
+        """
+        :param rate_limiter: Budget of requests to Google Calendar, e.g., shared with other
+                             sides
+        :param calendar_id: Previously resolved ID of the calendar with the given summary, e.g.,
+                            cached in the configuration of the combination. Used without looking
+                            up the calendars of the account - resolved again if the calendar is
+                            not found
+        :param save_calendar_id: Called with the ID of the calendar whenever it's resolved, e.g.,
+                                 for caching it
+        """
         if client_secret is None:
             client_secret = DEFAULT_CLIENT_SECRET
 
@@ -60,13 +135,43 @@ class GCalSide(GoogleSide):
         )
 
         self._calendar_summary = calendar_summary
-        self._calendar_id = None
+        self._calendar_id = calendar_id
+        self._save_calendar_id = save_calendar_id
+        self._rate_limiter = rate_limiter
         self._items_cache: Dict[str, dict] = {}
 
+        # For listing only the events that changed after the latest listing - see
+        # get_changed_items
+        self._sync_token: Optional[str] = None
+
     def start(self):
         logger.debug("Connecting to Google Calendar...")
         creds = self._get_credentials()
-        self._service = discovery.build("calendar", "v3", credentials=creds)
+        build_kargs = {}
+        if self._rate_limiter is not None:
+            build_kargs["requestBuilder"] = rate_limited_request_builder(self._rate_limiter)
+
+        # Build from the discovery document that ships with googleapiclient, instead of
+        # fetching it - already the default of google-api-python-client 2.x, explicit so that
+        # it doesn't depend on the version
+        self._service = discovery.build(
+            "calendar",
+            "v3",
+            credentials=creds,
+            static_discovery=True,
+            cache_discovery=False,
+            **build_kargs,
+        )
+
+        if self._calendar_id is None:
+            self._resolve_cal_id()
+        else:
+            logger.debug(f"Using the cached ID of the calendar: {self._calendar_id}")
+
+        logger.debug("Connected to Google Calendar.")
+
+    def _resolve_cal_id(self):
+        """Find the ID of the calendar based on its summary - create the calendar if missing."""
         self._calendar_id = self._fetch_cal_id()
 
         # Create calendar if not there --------------------------------------------------------
@@ -79,7 +184,21 @@ class GCalSide(GoogleSide):
             logger.info(f"Created calendar, id: {new_cal_id}")
             self._calendar_id = new_cal_id
 
-        logger.debug("Connected to Google Calendar.")
+        if self._save_calendar_id is not None:
+            self._save_calendar_id(self._calendar_id)
+
+    def _revalidate_cal_id(self, err: HttpError) -> bool:
+        """Resolve the ID of the calendar again, if the given error is due to it not being found.
+
+        :returns: Whether the ID of the calendar changed
+        """
+        if err.resp.status != 404:
+            return False
+
+        calendar_id = self._calendar_id
+        logger.warning(f"Calendar {calendar_id} not found, looking up its ID again...")
+        self._resolve_cal_id()
+        return self._calendar_id != calendar_id
 
     def _fetch_cal_id(self) -> Optional[str]:
         """Return the id of the Calendar based on the given Summary.
@@ -108,32 +227,116 @@ class GCalSide(GoogleSide):
         logger.warning(f"Clearing all events from calendar {self._calendar_id}")
         self._service.calendars().clear(calendarId=self._calendar_id).execute()
 
+    def invalidate_cache(self):
+        self._items_cache.clear()
+
     def get_all_items(self, **kargs):
         """Get all the events for the calendar that we use.
 
         :param kargs: Extra options for the call
         """
-        # Get the ID of the calendar of interest
+        list_kargs = {}
+        if self._horizon_start is not None:
+            # skip the events that ended before the horizon
+            list_kargs["timeMin"] = self._horizon_start.isoformat()
+        try:
+            events, sync_token = self._list_events(**list_kargs)
+        except HttpError as err:
+            if not self._revalidate_cal_id(err):
+                raise
+
+            events, sync_token = self._list_events(**list_kargs)
+
+        # sync tokens can't be used along with timeMin
+        self._sync_token = sync_token if self._horizon_start is None else None
+
+        events = [e for e in events if e["status"] != "cancelled"]
+
+        # cache them
+        for e in events:
+            self._items_cache[e["id"]] = e
+
+        return events
+
+    def change_journal_position(self) -> Optional[str]:
+        """Sync token of the latest listing, along with the calendar it refers to.
+
+        Only persisted once the listed events are synchronized - otherwise the next run lists
+        them again via the previous token.
+        """
+        if self._sync_token is None:
+            return None
+
+        return json.dumps({"calendar_id": self._calendar_id, "sync_token": self._sync_token})
+
+    def get_changed_items(self, since: str) -> Optional[Dict[str, Optional[dict]]]:
+        """List the events that changed after the listing of the given sync token.
+
+        Falls back to listing all the events if the token expired, belongs to another calendar
+        or if there's a horizon.
+        """
+        try:
+            position = json.loads(since)
+            calendar_id, sync_token = position["calendar_id"], position["sync_token"]
+        except (ValueError, TypeError, KeyError):
+            logger.warning(f"Ignoring invalid Google Calendar sync position: {since}")
+            return None
+
+        if self._horizon_start is not None or calendar_id != self._calendar_id:
+            return None
+
+        try:
+            events, self._sync_token = self._list_events(syncToken=sync_token)
+        except HttpError as err:
+            # the position refers to another calendar now
+            if self._revalidate_cal_id(err):
+                return None
+
+            if err.resp.status != 410:
+                raise
+
+            logger.info("Google Calendar sync token expired, listing all the events.")
+            self._sync_token = None
+            return None
+
+        changed: Dict[str, Optional[dict]] = {}
+        for e in events:
+            if e["status"] == "cancelled":
+                changed[e["id"]] = None
+                self._items_cache.pop(e["id"], None)
+            else:
+                changed[e["id"]] = self._items_cache[e["id"]] = e
+
+        return changed
+
+    def _list_events(self, **kargs) -> Tuple[List[dict], Optional[str]]:
+        """List the events of the calendar, including the cancelled ones.
+
+        :returns: The events and the sync token for listing the ones that change after them
+        """
         events = []
-        request = self._service.events().list(calendarId=self._calendar_id)
+        request = self._service.events().list(
+            calendarId=self._calendar_id,
+            maxResults=LIST_PAGE_SIZE,
+            fields=LIST_FIELDS,
+            **kargs,
+        )
 
         # Loop until all pages have been processed.
-        while request is not None:
+        while True:
             # Get the next page.
             response = request.execute()
             # Accessing the response like a dict object with an 'items' key
             # returns a list of item objects (events).
-            events.extend([e for e in response.get("items", []) if e["status"] != "cancelled"])
+            events.extend(response.get("items", []))
 
             # Get the next request object by passing the previous request
             # object to the list_next method.
-            request = self._service.events().list_next(request, response)
-
-        # cache them
-        for e in events:
-            self._items_cache[e["id"]] = e
-
-        return events
+            next_request = self._service.events().list_next(request, response)
+            if next_request is None:
+                # only the last page has a sync token
+                return events, response.get("nextSyncToken")
+            request = next_request
 
     def get_item(self, item_id: str, use_cached: bool = True) -> Optional[dict]:
         item = self._items_cache.get(item_id)
@@ -161,14 +364,9 @@ class GCalSide(GoogleSide):
             return ret
 
     def update_item(self, item_id, **changes):
-        # Check if item is there
-        event = (
-            self._service.events().get(calendarId=self._calendar_id, eventId=item_id).execute()
-        )
-        event.update(changes)
-        self._service.events().update(
-            calendarId=self._calendar_id, eventId=event["id"], body=event
-        ).execute()
+        err = self.update_items({item_id: changes})[item_id]
+        if err is not None:
+            raise err
 
     def add_item(self, item) -> dict:
         event = (
@@ -181,6 +379,165 @@ class GCalSide(GoogleSide):
     def delete_single_item(self, item_id) -> None:
         self._service.events().delete(calendarId=self._calendar_id, eventId=item_id).execute()
 
+    def add_items(self, items: Sequence[dict]) -> List[Union[dict, Exception]]:
+        """Add the given events via batch requests."""
+        events = self._service.events()
+        results = self._execute_batch(
+            {
+                str(i): events.insert(calendarId=self._calendar_id, body=item)
+                for i, item in enumerate(items)
+            }
+        )
+        return [results[str(i)] for i in range(len(items))]
+
+    def update_items(self, changes: Mapping[str, dict]) -> Dict[str, Optional[Exception]]:
+        """Patch the given events via batch requests.
+
+        The patches only apply to the version of the events of the latest listing, if cached -
+        events modified since are fetched again, merged with the changes and updated instead.
+        """
+        events = self._service.events()
+        patches = {}
+        for item_id, item_changes in changes.items():
+            patches[item_id] = events.patch(
+                calendarId=self._calendar_id,
+                eventId=item_id,
+                body=self._patch_body(item_changes),
+            )
+            etag = self._items_cache.get(item_id, {}).get("etag")
+            if etag is not None:
+                patches[item_id].headers["If-Match"] = etag
+
+        results: Dict[str, Optional[Exception]] = {}
+        modified = {}
+        for item_id, response in self._execute_batch(patches).items():
+            if isinstance(response, HttpError) and response.resp.status == 412:
+                modified[item_id] = changes[item_id]
+            else:
+                results[item_id] = self._cache_response(item_id, response)
+
+        if modified:
+            logger.debug(f"{len(modified)} events were modified since listed, merging...")
+            results.update(self._get_merge_update(modified))
+
+        return results
+
+    @staticmethod
+    def _patch_body(item_changes: Mapping[str, Any]) -> dict:
+        """Body of the PATCH request of the given changes.
+
+        PATCH requests merge nested objects - clear whichever of date/dateTime the start/end
+        of the changes doesn't set, e.g., when an all-day event gets a time.
+        """
+        body = dict(item_changes)
+        for key in ("start", "end"):
+            if isinstance(body.get(key), Mapping):
+                body[key] = {"date": None, "dateTime": None, **body[key]}
+
+        return body
+
+    def _get_merge_update(self, changes: Mapping[str, dict]) -> Dict[str, Optional[Exception]]:
+        """Update the given events with their latest versions, merged with the given changes."""
+        events = self._service.events()
+        latest = self._execute_batch(
+            {
+                item_id: events.get(calendarId=self._calendar_id, eventId=item_id)
+                for item_id in changes
+            }
+        )
+
+        results: Dict[str, Optional[Exception]] = {}
+        requests = {}
+        for item_id, event in latest.items():
+            if isinstance(event, Exception):
+                results[item_id] = event
+                continue
+
+            event.update(changes[item_id])
+            requests[item_id] = events.update(
+                calendarId=self._calendar_id, eventId=item_id, body=event
+            )
+
+        for item_id, response in self._execute_batch(requests).items():
+            results[item_id] = self._cache_response(item_id, response)
+
+        return results
+
+    def _cache_response(
+        self, item_id: str, response: Union[dict, Exception]
+    ) -> Optional[Exception]:
+        """Cache the updated event of the given response - return the error otherwise."""
+        if isinstance(response, Exception):
+            return response
+
+        # keep the ETag of the latest version for the next updates
+        self._items_cache[item_id] = response
+        return None
+
+    def delete_items(self, item_ids: Sequence[str]) -> Dict[str, Optional[Exception]]:
+        """Delete the given events via batch requests."""
+        events = self._service.events()
+        responses = self._execute_batch(
+            {
+                item_id: events.delete(calendarId=self._calendar_id, eventId=item_id)
+                for item_id in item_ids
+            }
+        )
+        return {
+            item_id: response if isinstance(response, Exception) else None
+            for item_id, response in responses.items()
+        }
+
+    def _execute_batch(
+        self, requests: Mapping[str, HttpRequest]
+    ) -> Dict[str, Union[dict, Exception]]:
+        """Execute the given requests via batch requests of up to BATCH_MAX_CALLS calls.
+
+        Calls that fail due to rate limits are retried, with an exponential backoff.
+
+        :param requests: The requests to execute, by ID
+        :returns: The response of each request or the exception it failed with, by ID
+        """
+        results: Dict[str, Union[dict, Exception]] = {}
+
+        def callback(request_id: str, response: dict, exception: Optional[Exception]):
+            results[request_id] = response if exception is None else exception
+
+        pending = dict(requests)
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                delay = BATCH_RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning(
+                    f"{len(pending)} Google Calendar calls were rate limited, retrying in"
+                    f" {delay}s..."
+                )
+                time.sleep(delay)
+
+            ids = list(pending)
+            for i in range(0, len(ids), BATCH_MAX_CALLS):
+                batch = self._service.new_batch_http_request(callback=callback)
+                for request_id in ids[i : i + BATCH_MAX_CALLS]:
+                    # every call of the batch counts towards the quota
+                    if self._rate_limiter is not None:
+                        self._rate_limiter.acquire()
+                    batch.add(pending[request_id], request_id=request_id)
+
+                try:
+                    batch.execute()
+                except Exception as err:
+                    for request_id in ids[i : i + BATCH_MAX_CALLS]:
+                        results[request_id] = err
+
+            pending = {
+                request_id: request
+                for request_id, request in pending.items()
+                if _is_rate_limited(results[request_id])
+            }
+            if not pending:
+                break
+
+        return results
+
     @classmethod
     def id_key(cls) -> str:
         return cls.ID_KEY
@@ -193,6 +550,13 @@ class GCalSide(GoogleSide):
     def last_modification_key(cls) -> str:
         return cls.LAST_MODIFICATION_KEY
 
+    @classmethod
+    def finished_at(cls, item: dict) -> Optional[datetime.datetime]:
+        if "end" not in item:
+            return None
+
+        return cls.get_event_time(item, t="end")
+
     @staticmethod
     def get_date_key(d: dict) -> Union[Literal["date"], Literal["dateTime"]]:
         """Get key corresponding to the date field."""
@@ -286,3 +650,20 @@ class GCalSide(GoogleSide):
             item2,
             keys=[k for k in cls._identical_comparison_keys if k not in ignore_keys],
         )
+
+    @classmethod
+    def fingerprint(cls, item, ignore_keys: Sequence[str] = []) -> str:
+        keys = [k for k in cls._identical_comparison_keys if k not in ignore_keys]
+        item_ = {}
+        for key in keys:
+            if key not in item:
+                continue
+
+            item_[key] = item[key]
+            if key in cls._date_keys:
+                try:
+                    item_[key] = cls.parse_datetime(item[key])
+                except RuntimeError:
+                    pass
+
+        return SyncSide._fingerprint(item_, keys)
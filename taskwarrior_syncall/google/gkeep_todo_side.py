@@ -21,6 +21,9 @@ class GKeepTodoSide(SyncSide):
     ID_KEY = "id"
     SUMMARY_KEY = "plaintext"
 
+    # gkeepapi mutates a single, unsynchronized Keep model - including the note in use
+    is_thread_safe = False
+
     def __init__(
         self,
         note_title: str,
@@ -153,6 +156,16 @@ class GKeepTodoSide(SyncSide):
         logger.info("Flushing data to remote Google Keep...")
         self._keep.sync()
 
+    def invalidate_cache(self):
+        # fetch the latest version of the notes
+        logger.debug("Syncing with remote Google Keep...")
+        self._keep.sync()
+
+    def commit_writes(self):
+        # the writes only modify the local model of the notes until synced
+        logger.debug("Pushing changes to remote Google Keep...")
+        self._keep.sync()
+
     def _get_label_by_name(self, label: str) -> Optional[Label]:
         for la in self._keep.labels():
             if la.name == label:
@@ -229,3 +242,9 @@ class GKeepTodoSide(SyncSide):
         ignore_keys_ = ["last_edited_time"]
         ignore_keys_.extend(ignore_keys)
         return item1.compare(item2, ignore_keys=ignore_keys_)
+
+    @classmethod
+    def fingerprint(cls, item: GKeepTodoItem, ignore_keys: Sequence[str] = []) -> str:
+        return SyncSide._fingerprint(
+            item, [key for key in item._key_names if key not in ignore_keys]
+        )
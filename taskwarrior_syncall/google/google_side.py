@@ -1,13 +1,39 @@
+import datetime
 import pickle
+import threading
 from pathlib import Path
-from typing import Sequence
+from typing import Dict, Optional, Sequence, Type
 
 from bubop import logger
+from google.auth.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.http import HttpRequest
 
+from taskwarrior_syncall.rate_limiter import RateLimiter
 from taskwarrior_syncall.sync_side import SyncSide
 
+# Refresh credentials that expire within this period, while idle
+CREDENTIALS_REFRESH_MARGIN = datetime.timedelta(minutes=10)
+
+# Credentials of each account, i.e., credentials cache, shared by all the sides of the process
+_credentials_lock = threading.Lock()
+_credentials_of: Dict[Path, Credentials] = {}
+
+
+def rate_limited_request_builder(rate_limiter: RateLimiter) -> Type[HttpRequest]:
+    """HttpRequest class that waits for the given rate limiter before every request.
+
+    Pass it as the ``requestBuilder`` of a service created via ``discovery.build``.
+    """
+
+    class RateLimitedHttpRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            rate_limiter.acquire()
+            return super().execute(http=http, num_retries=num_retries)
+
+    return RateLimitedHttpRequest
+
 
 class GoogleSide(SyncSide):
     """Abstract parent for integrations that consume Google services."""
@@ -29,6 +55,7 @@ class GoogleSide(SyncSide):
 
         # If you modify this, delete your previously saved credentials
         self._service = None
+        self._credentials: Optional[Credentials] = None
 
     def _get_credentials(self):
         """Gets valid user credentials from storage.
@@ -36,9 +63,21 @@ class GoogleSide(SyncSide):
         If nothing has been stored, or if the stored credentials are invalid,
         the OAuth2 flow is completed to obtain the new credentials.
 
+        Credentials are shared between all the sides of the same account in this process.
+
         :return: Credentials, the obtained credentials.
         """
+        with _credentials_lock:
+            creds = _credentials_of.get(self._credentials_cache)
+            if creds is None or not creds.valid:
+                creds = self._load_credentials()
+                _credentials_of[self._credentials_cache] = creds
+
+        self._credentials = creds
+        return creds
 
+    def _load_credentials(self):
+        """Load the cached credentials - run the OAuth2 flow if these are missing/invalid."""
         creds = None
         credentials_cache = self._credentials_cache
         if credentials_cache.is_file():
@@ -67,3 +106,21 @@ class GoogleSide(SyncSide):
             logger.info("Using already cached credentials...")
 
         return creds
+
+    def refresh_credentials(self):
+        with _credentials_lock:
+            creds = self._credentials
+            if creds is None or not getattr(creds, "refresh_token", None):
+                return
+
+            # expiry is a naive datetime in UTC
+            if (
+                creds.expiry is not None
+                and creds.expiry - datetime.datetime.utcnow() > CREDENTIALS_REFRESH_MARGIN
+            ):
+                return
+
+            logger.debug(f"Refreshing {self} credentials...")
+            creds.refresh(Request())
+            with self._credentials_cache.open("wb") as f:
+                pickle.dump(creds, f)
@@ -1,4 +1,5 @@
-from typing import Dict, Optional, Sequence, cast
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union, cast
 
 from bubop import logger
 from notion_client import Client
@@ -7,6 +8,9 @@ from taskwarrior_syncall.notion_todo_block import NotionTodoBlock
 from taskwarrior_syncall.sync_side import SyncSide
 from taskwarrior_syncall.types import NotionID, NotionPageContents, NotionTodoBlockItem
 
+# Maximum number of blocks that a single blocks.children.append(...) call accepts
+APPEND_CHILDREN_MAX_BLOCKS = 100
+
 
 class NotionSide(SyncSide):
     """
@@ -15,6 +19,8 @@ class NotionSide(SyncSide):
 
     _date_keys = "last_modified_date"
 
+    max_add_batch_size = APPEND_CHILDREN_MAX_BLOCKS
+
     def __init__(self, client: Client, page_id: NotionID):
         self._client = client
         self._page_id = page_id
@@ -40,6 +46,10 @@ class NotionSide(SyncSide):
         logger.info(f"Initializing {self.fullname}...")
         self._page_contents = self._client.blocks.children.list(block_id=self._page_id)
 
+    def invalidate_cache(self):
+        self._page_contents = self._client.blocks.children.list(block_id=self._page_id)
+        self._is_cached = False
+
     def _get_todo_blocks(self) -> Dict[NotionID, NotionTodoBlock]:
         all_todos = self.find_todos(page_contents=self._page_contents)
         # make sure that all IDs are valid and not None
@@ -107,6 +117,44 @@ class NotionSide(SyncSide):
 
         return todo_blocks[0]
 
+    def add_items(
+        self, items: Sequence[NotionTodoBlock]
+    ) -> List[Union[NotionTodoBlock, Exception]]:
+        """Add multiple new items (blocks) to the page, with a single request."""
+        page_contents: NotionPageContents = self._client.blocks.children.append(
+            block_id=self._page_id, children=[item.serialize() for item in items]
+        )
+        todo_blocks = self.find_todos(page_contents=page_contents)
+        if len(todo_blocks) == len(items):
+            return list(todo_blocks)
+
+        # the returned blocks are created regardless - match them to the items by their
+        # contents, only the items without a match failed
+        logger.warning(
+            f"Expected to get back {len(items)} TODO items, blocks.children.append(...)"
+            f" returned {len(todo_blocks)} items. Matching them by their contents"
+        )
+        blocks_of_contents: Dict[Tuple[str, bool], Deque[NotionTodoBlock]] = {}
+        for block in todo_blocks:
+            blocks_of_contents.setdefault((block.plaintext, block.is_checked), deque()).append(
+                block
+            )
+
+        results: List[Union[NotionTodoBlock, Exception]] = []
+        for item in items:
+            blocks = blocks_of_contents.get((item.plaintext, item.is_checked))
+            if blocks:
+                results.append(blocks.popleft())
+            else:
+                results.append(
+                    RuntimeError(
+                        "blocks.children.append(...) didn't return a TODO item for"
+                        f" {item.plaintext}"
+                    )
+                )
+
+        return results
+
     def add_todo_block(self, title: str, checked: bool = False) -> NotionTodoBlock:
         """Create a new TODO block with the given title."""
         new_block = {
@@ -130,6 +178,12 @@ class NotionSide(SyncSide):
         ignore_keys_.extend(ignore_keys)
         return item1.compare(item2, ignore_keys=ignore_keys_)
 
+    @classmethod
+    def fingerprint(cls, item: NotionTodoBlock, ignore_keys: Sequence[str] = []) -> str:
+        return SyncSide._fingerprint(
+            item, [key for key in item._key_names if key not in ignore_keys]
+        )
+
     @staticmethod
     def find_todos(page_contents: NotionPageContents) -> Sequence[NotionTodoBlock]:
         assert page_contents["object"] == "list"
@@ -54,6 +54,9 @@ class NotionDBSide(SyncSide):
         return {cast(NotionID, record.id): NotionTodoRecord.from_record(record)
                 for record in records}
 
+    def invalidate_cache(self):
+        self._is_cached = False
+
     def get_all_items(self, **kargs) -> Sequence[NotionTodoRecord]:
         self._all_todo_records = self._get_todo_records()
         self._is_cached = True
@@ -105,3 +108,9 @@ class NotionDBSide(SyncSide):
         ignore_keys_ = ["last_edited_time"]
         ignore_keys_.extend(ignore_keys)
         return item1.compare(item2, ignore_keys=ignore_keys_)
+
+    @classmethod
+    def fingerprint(cls, item: NotionTodoRecord, ignore_keys: Sequence[str] = []) -> str:
+        return SyncSide._fingerprint(
+            item, [key for key in item._key_names if key not in ignore_keys]
+        )
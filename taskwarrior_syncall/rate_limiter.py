@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """Thread-safe token bucket, allowing up to `rate` acquisitions per second on average.
+
+    Share a single instance between all the clients that talk to the same backend, so that
+    their requests add up to a single budget.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        :param rate: Average number of acquisitions per second
+        :param burst: Maximum number of acquisitions that can happen back to back after a period
+                      of inactivity. Defaults to the acquisitions of a single second.
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+
+        self._rate = rate
+        self._capacity = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def acquire(self):
+        """Block until a request can be made within the budget."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (now - self._last_refill) * self._rate
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait_for = (1 - self._tokens) / self._rate
+
+            time.sleep(wait_for)
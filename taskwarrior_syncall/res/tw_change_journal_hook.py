@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Taskwarrior on-add/on-modify hook of taskwarrior_syncall.
+
+Appends the UUID and the modification time of every added or modified task to the change
+journal of the database, so that the synchronizations only have to fetch the changed tasks.
+
+Install it with tw_install_hooks. It runs on every change, so it only uses the standard
+library.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Tuple
+
+JOURNAL_FNAME = "syncall_changes.journal"
+
+# The first line of a journal identifies it, so that a recreated journal is not mistaken for
+# the continuation of a deleted one
+HEADER_PREFIX = "# journal "
+
+# Once the journal grows beyond this size, its older half is dropped. Synchronizations whose
+# position is among the dropped entries detect the gap and fetch all the tasks once.
+JOURNAL_MAX_BYTES = 1 << 20
+
+
+def _last_line(f) -> Tuple[bytes, int]:
+    """Return the last complete line of the given journal and the offset right after it."""
+    end = f.seek(0, os.SEEK_END)
+    start = end
+    data = b""
+    while start > 0 and data.count(b"\n") < 2:
+        start = max(start - 4096, 0)
+        f.seek(start)
+        data = f.read(end - start)
+
+    # the last write may have been interrupted, leaving a partial line at the end
+    complete_end = data.rfind(b"\n") + 1
+    last_line = data[:complete_end].rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    return last_line, start + complete_end
+
+
+def _open_locked(journal: Path):
+    """Open the journal for appending, once no other hook is writing to it."""
+    while True:
+        f = journal.open("a+b")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.stat(journal).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+
+        # replaced by a compaction, or removed, while waiting for the lock
+        f.close()
+
+
+def _compact(journal: Path, f):
+    """Drop the older half of the entries of the journal, keeping its header.
+
+    The rest are written to a new file that atomically replaces the journal, so that readers
+    never see a partially written journal.
+    """
+    f.seek(0)
+    header = f.readline()
+    entries = f.read()
+    keep_from = entries.find(b"\n", len(entries) // 2) + 1
+    compacted = journal.with_name(f"{journal.name}.compacted")
+    compacted.write_bytes(header + entries[keep_from:])
+    os.replace(compacted, journal)
+
+
+def append_to_journal(journal: Path, task_uuid: str, modified: str):
+    with _open_locked(journal) as f:
+        last_line, end = _last_line(f)
+        # drop the partial line of an interrupted write - its change was rejected
+        f.truncate(end)
+
+        lines = []
+        if end == 0:
+            lines.append(f"{HEADER_PREFIX}{uuid.uuid4()}")
+            seq = 1
+        elif last_line.startswith(HEADER_PREFIX.encode()):
+            seq = 1
+        else:
+            seq = int(last_line.split(b" ", 1)[0]) + 1
+
+        lines.append(f"{seq} {task_uuid} {modified}")
+        f.write(("\n".join(lines) + "\n").encode())
+        f.flush()
+
+        if f.tell() > JOURNAL_MAX_BYTES:
+            _compact(journal, f)
+
+
+def main() -> int:
+    lines = sys.stdin.read().splitlines()
+    # on-add receives the added task, on-modify the original and the modified task
+    task_line = lines[-1]
+    # hand the task back to Taskwarrior unchanged
+    print(task_line)
+
+    data_location = next(
+        (arg[len("data:") :] for arg in sys.argv[1:] if arg.startswith("data:")),
+        os.environ.get("TASKDATA", "~/.task"),
+    )
+    journal = Path(data_location).expanduser() / JOURNAL_FNAME
+    try:
+        task = json.loads(task_line)
+        append_to_journal(journal, task["uuid"], task.get("modified", ""))
+    except Exception as exc:
+        # never block the change - drop the journal instead, the synchronizations fall back to
+        # fetching all the tasks if it's missing
+        with contextlib.suppress(OSError):
+            journal.unlink()
+        print(f"taskwarrior_syncall: Failed to journal the change, removed {journal}: {exc}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
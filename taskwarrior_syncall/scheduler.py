@@ -0,0 +1,222 @@
+"""Synchronize multiple saved combinations in a single process."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, TypeVar
+
+from bubop import PrefsManager, logger
+
+from taskwarrior_syncall.aggregator import Aggregator
+from taskwarrior_syncall.app_utils import app_name
+from taskwarrior_syncall.rate_limiter import RateLimiter
+from taskwarrior_syncall.taskwarrior_side import TaskWarriorExport
+
+_T = TypeVar("_T")
+
+# Kinds of combinations that the scheduler can run - each one saved under <kind>_configs
+COMBINATION_KINDS = ("tw_gcal", "tw_notion", "tw_asana")
+
+# Requests per second to each backend, across all the combinations of the scheduler
+DEFAULT_REQUESTS_PER_SECOND: Mapping[str, float] = {
+    "asana": 2.5,
+    "gcal": 10.0,
+    "notion": 3.0,
+}
+
+
+@dataclass
+class Combination:
+    """A named combination, as saved by one of the tw_*_sync apps."""
+
+    kind: str
+    name: str
+    config: Mapping[str, Any]
+
+    def __str__(self):
+        return f"{self.kind}/{self.name}"
+
+
+def load_combinations(kinds: Sequence[str] = COMBINATION_KINDS) -> List[Combination]:
+    """Load all the named combinations of the given kinds."""
+    dummy_logger = logging.getLogger("dummy")
+    dummy_logger.setLevel(logging.CRITICAL + 1)
+
+    combinations = []
+    for kind in kinds:
+        with PrefsManager(
+            app_name=app_name(), config_fname=f"{kind}_configs", logger=dummy_logger
+        ) as prefs_manager:
+            combinations.extend(
+                Combination(kind=kind, name=name, config=dict(prefs_manager[name]))
+                for name in prefs_manager.keys()
+            )
+
+    return combinations
+
+
+class SharedResources:
+    """Resources shared by all the combinations of a scheduler.
+
+    - A single Taskwarrior export per taskrc, re-exported once per round
+    - A single API client per backend and account, e.g., per API token
+    - A single request budget per backend
+    """
+
+    def __init__(self, requests_per_second: Mapping[str, float] = DEFAULT_REQUESTS_PER_SECOND):
+        self._rate_limiters = {
+            backend: RateLimiter(rate) for backend, rate in requests_per_second.items()
+        }
+        self._tw_exports: Dict[Tuple[Path, bool], TaskWarriorExport] = {}
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def rate_limiter(self, backend: str) -> Optional[RateLimiter]:
+        """Request budget of the given backend, None if it's not limited."""
+        return self._rate_limiters.get(backend)
+
+    def tw_export(self, config_file: Path, lazy: bool = False) -> TaskWarriorExport:
+        """Export of the Taskwarrior database of the given taskrc - LazyTask objects if lazy."""
+        key = (config_file.expanduser().resolve(), lazy)
+        with self._lock:
+            if key not in self._tw_exports:
+                self._tw_exports[key] = TaskWarriorExport(config_file=config_file, lazy=lazy)
+
+            return self._tw_exports[key]
+
+    def client(self, backend: str, account: str, create: Callable[[], _T]) -> _T:
+        """API client of the given backend and account - create it on first use."""
+        key = (backend, account)
+        with self._lock:
+            if key not in self._clients:
+                logger.debug(f"Creating {backend} client for account {account[:4]}...")
+                self._clients[key] = create()
+
+            return self._clients[key]
+
+    def invalidate(self):
+        """Drop the data that is only valid for a single round, i.e., the TW exports."""
+        with self._lock:
+            for export in self._tw_exports.values():
+                export.invalidate()
+
+
+class Scheduler:
+    """Synchronize multiple combinations on a pool of workers.
+
+    The Aggregator of each combination is created and started once. Each round - see
+    :py:meth:`sync_all` - synchronizes all the combinations, up to ``max_workers`` of them at
+    a time. A combination that fails doesn't affect the rest.
+    """
+
+    def __init__(
+        self,
+        combinations: Sequence[Combination],
+        make_aggregator: Callable[[Combination, SharedResources], Aggregator],
+        resources: Optional[SharedResources] = None,
+        max_workers: int = 4,
+    ):
+        if max_workers < 1:
+            raise ValueError(f"Number of workers must be positive, got {max_workers}")
+
+        self._combinations = combinations
+        self._make_aggregator = make_aggregator
+        self._resources = resources if resources is not None else SharedResources()
+        self._max_workers = max_workers
+        self._aggregators: Dict[str, Aggregator] = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.finish()
+
+    @property
+    def aggregators(self) -> Mapping[str, Aggregator]:
+        """Aggregators of the combinations that were started successfully."""
+        return self._aggregators
+
+    def start(self):
+        """Create and start the Aggregator of each combination."""
+        aggregators = {}
+        for combination in self._combinations:
+            try:
+                aggregators[str(combination)] = self._make_aggregator(
+                    combination, self._resources
+                )
+            except Exception:
+                logger.opt(exception=True).error(
+                    f"[{combination}] Failed to initialize combination, skipping it."
+                )
+
+        self._aggregators = aggregators
+        started = self._run_on_all(lambda aggregator: aggregator.start(), desc="start")
+        for name, success in started.items():
+            if not success:
+                self._aggregators.pop(name)
+
+    def sync_all(self) -> Dict[str, bool]:
+        """Synchronize all the combinations once.
+
+        :returns: Whether the synchronization of each combination succeeded
+        """
+        self._resources.invalidate()
+        results = self._run_on_all(lambda aggregator: aggregator.sync(), desc="sync")
+        for aggregator in self._aggregators.values():
+            aggregator.flush()
+
+        failed = [name for name, success in results.items() if not success]
+        logger.info(
+            f"Synchronized {len(results) - len(failed)}/{len(results)} combinations."
+            + (f" Failed: {', '.join(failed)}" if failed else "")
+        )
+        return results
+
+    def sync_periodically(self, interval: float, stop: Optional[threading.Event] = None):
+        """Run a round every `interval` seconds, until interrupted or until `stop` is set.
+
+        While idle, refresh the credentials of all the combinations.
+        """
+        if stop is None:
+            stop = threading.Event()
+
+        while not stop.is_set():
+            next_round = time.monotonic() + interval
+            self.sync_all()
+            self._run_on_all(
+                lambda aggregator: aggregator.refresh_credentials(), desc="refresh credentials"
+            )
+            stop.wait(max(next_round - time.monotonic(), 0))
+
+    def finish(self):
+        """Finish all the started combinations."""
+        self._run_on_all(lambda aggregator: aggregator.finish(), desc="finish")
+
+    def _run_on_all(self, fn: Callable[[Aggregator], Any], desc: str) -> Dict[str, bool]:
+        """Call the given function on all the aggregators, on the pool of workers.
+
+        :returns: Whether the call succeeded, for each combination
+        """
+        if not self._aggregators:
+            return {}
+
+        def run(name: str, aggregator: Aggregator) -> bool:
+            try:
+                fn(aggregator)
+                return True
+            except Exception:
+                logger.opt(exception=True).error(f"[{name}] Failed to {desc}.")
+                return False
+
+        with ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="syncall-scheduler"
+        ) as executor:
+            futures = {
+                name: executor.submit(run, name, aggregator)
+                for name, aggregator in self._aggregators.items()
+            }
+
+        return {name: future.result() for name, future in futures.items()}
@@ -1,7 +1,8 @@
 """Console script for asana_taskwarrior."""
+import datetime
 import os
 import sys
-from typing import List
+from typing import List, Optional
 
 import asana
 import click
@@ -22,30 +23,36 @@ except ImportError:
 
 
 from taskwarrior_syncall import (
-    Aggregator,
     TaskWarriorSide,
     __version__,
     cache_or_reuse_cached_combination,
-    convert_asana_to_tw,
-    convert_tw_to_asana,
     fetch_app_configuration,
     fetch_from_pass_manager,
-    get_resolution_strategy,
     inform_about_combination_name_usage,
     list_asana_workspaces,
     list_named_combinations,
+    make_tw_asana_aggregator,
     opt_asana_task_gid,
     opt_asana_token_pass_path,
     opt_asana_workspace_gid,
     opt_asana_workspace_name,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
+    opt_horizon,
+    opt_interval,
     opt_list_asana_workspaces,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_resolution_strategy,
+    opt_tw_cache_export,
+    opt_tw_lazy_tasks,
     opt_tw_project,
+    opt_tw_read_data_files,
     opt_tw_tags,
+    opt_tw_use_change_journal,
     report_toplevel_exception,
+    update_cached_combination,
 )
 
 
@@ -62,11 +69,19 @@ from taskwarrior_syncall import (
 # taskwarrior options -------------------------------------------------------------------------
 @opt_tw_tags()
 @opt_tw_project()
+@opt_tw_cache_export()
+@opt_tw_read_data_files()
+@opt_tw_lazy_tasks()
+@opt_tw_use_change_journal()
 # misc options --------------------------------------------------------------------------------
 @opt_resolution_strategy()
 @opt_combination("TW", "Asana")
 @opt_list_combinations("TW", "Asana")
 @opt_custom_combination_savename("TW", "Asana")
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_daemon()
+@opt_interval()
 @click.option("-v", "--verbose", count=True)
 @click.version_option(__version__)
 def main(
@@ -82,6 +97,14 @@ def main(
     combination_name: str,
     custom_combination_savename: str,
     do_list_combinations: bool,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    tw_cache_export: bool,
+    tw_read_data_files: bool,
+    tw_lazy_tasks: bool,
+    tw_use_change_journal: bool,
 ):
     loguru_tqdm_sink(verbosity=verbose)
 
@@ -123,6 +146,9 @@ def main(
         asana_workspace_gid = app_config["asana_workspace_gid"]
         if "asana_task_gid" in app_config:
             asana_task_gid = app_config["asana_task_gid"]
+        tw_use_change_journal = tw_use_change_journal or app_config.get(
+            "tw_use_change_journal", False
+        )
 
     # initialize asana -----------------------------------------------------------------------
     client = asana.Client.access_token(token)
@@ -185,6 +211,14 @@ def main(
             custom_combination_savename=custom_combination_savename,
         )
 
+    # TW change journal, saved in the combination - see tw_install_hooks ----------------------
+    if tw_use_change_journal:
+        update_cached_combination(
+            config_fname="tw_asana_configs",
+            combination=combination_name,
+            tw_use_change_journal=True,
+        )
+
     # at least one of tw_tags, tw_project should be set ---------------------------------------
     if not do_list_asana_workspaces and not tw_tags and not tw_project:
         raise RuntimeError(
@@ -211,7 +245,14 @@ def main(
     )
 
     # initialize taskwarrior ------------------------------------------------------------------
-    tw_side = TaskWarriorSide(tags=tw_tags, project=tw_project)
+    tw_side = TaskWarriorSide(
+        tags=tw_tags,
+        project=tw_project,
+        cache_export=tw_cache_export,
+        read_data_files=tw_read_data_files,
+        lazy_tasks=tw_lazy_tasks,
+        use_change_journal=tw_use_change_journal,
+    )
 
     if do_list_asana_workspaces:
         list_asana_workspaces(client)
@@ -223,25 +264,18 @@ def main(
 
     # sync ------------------------------------------------------------------------------------
     try:
-        with Aggregator(
-            side_A=asana_side,
-            side_B=tw_side,
-            converter_A_to_B=convert_asana_to_tw,
-            converter_B_to_A=convert_tw_to_asana,
-            resolution_strategy=get_resolution_strategy(
-                resolution_strategy, side_A_type=type(asana_side), side_B_type=type(tw_side)
-            ),
+        with make_tw_asana_aggregator(
+            asana_side,
+            tw_side,
+            resolution_strategy=resolution_strategy,
             config_fname=combination_name,
-            ignore_keys=(
-                (
-                    "completed_at",
-                    "created_at",
-                    "modified_at",
-                ),
-                ("end", "entry", "modified", "urgency"),
-            ),
+            max_parallel_writes=max_parallel_writes,
+            horizon=horizon,
         ) as aggregator:
-            aggregator.sync()
+            if daemon:
+                aggregator.sync_periodically(interval=interval)
+            else:
+                aggregator.sync()
     except KeyboardInterrupt:
         logger.error("Exiting...")
         return 1
@@ -1,4 +1,5 @@
-from typing import List
+import datetime
+from typing import List, Optional
 
 import click
 from bubop import (
@@ -17,26 +18,33 @@ except ImportError:
     inform_about_app_extras(["google"])
 
 from taskwarrior_syncall import (
-    Aggregator,
     TaskWarriorSide,
     __version__,
     cache_or_reuse_cached_combination,
-    convert_gcal_to_tw,
-    convert_tw_to_gcal,
+    cached_gcal_calendar_id,
     fetch_app_configuration,
-    get_resolution_strategy,
     inform_about_combination_name_usage,
     list_named_combinations,
+    make_tw_gcal_aggregator,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
     opt_gcal_calendar,
     opt_google_oauth_port,
     opt_google_secret_override,
+    opt_horizon,
+    opt_interval,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_resolution_strategy,
+    opt_tw_cache_export,
+    opt_tw_lazy_tasks,
     opt_tw_project,
+    opt_tw_read_data_files,
     opt_tw_tags,
+    opt_tw_use_change_journal,
     report_toplevel_exception,
+    update_cached_combination,
 )
 
 
@@ -48,11 +56,19 @@ from taskwarrior_syncall import (
 # taskwarrior options -------------------------------------------------------------------------
 @opt_tw_tags()
 @opt_tw_project()
+@opt_tw_cache_export()
+@opt_tw_read_data_files()
+@opt_tw_lazy_tasks()
+@opt_tw_use_change_journal()
 # misc options --------------------------------------------------------------------------------
 @opt_list_combinations("TW", "Google Calendar")
 @opt_resolution_strategy()
 @opt_combination("TW", "Google Calendar")
 @opt_custom_combination_savename("TW", "Google Calendar")
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_daemon()
+@opt_interval()
 @click.option("-v", "--verbose", count=True)
 @click.version_option(__version__)
 def main(
@@ -66,6 +82,14 @@ def main(
     combination_name: str,
     custom_combination_savename: str,
     do_list_combinations: bool,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    tw_cache_export: bool,
+    tw_read_data_files: bool,
+    tw_lazy_tasks: bool,
+    tw_use_change_journal: bool,
 ):
     """Synchronize calendars from your Google Calendar with filters from Taskwarrior.
 
@@ -103,6 +127,9 @@ def main(
         tw_tags = app_config["tw_tags"]
         tw_project = app_config["tw_project"]
         gcal_calendar = app_config["gcal_calendar"]
+        tw_use_change_journal = tw_use_change_journal or app_config.get(
+            "tw_use_change_journal", False
+        )
 
     # combination manually specified ----------------------------------------------------------
     else:
@@ -116,6 +143,25 @@ def main(
             config_fname="tw_gcal_configs",
             custom_combination_savename=custom_combination_savename,
         )
+        app_config = fetch_app_configuration(
+            config_fname="tw_gcal_configs", combination=combination_name
+        )
+
+    # ID of the calendar, as looked up in a previous run --------------------------------------
+    gcal_calendar_id, save_gcal_calendar_id = cached_gcal_calendar_id(
+        app_config,
+        config_fname="tw_gcal_configs",
+        combination=combination_name,
+        gcal_calendar=gcal_calendar,
+    )
+
+    # TW change journal, saved in the combination - see tw_install_hooks ----------------------
+    if tw_use_change_journal:
+        update_cached_combination(
+            config_fname="tw_gcal_configs",
+            combination=combination_name,
+            tw_use_change_journal=True,
+        )
 
     # at least one of tw_tags, tw_project should be set ---------------------------------------
     if not tw_tags and not tw_project:
@@ -139,29 +185,37 @@ def main(
     )
 
     # initialize sides ------------------------------------------------------------------------
-    tw_side = TaskWarriorSide(tags=tw_tags, project=tw_project)
+    tw_side = TaskWarriorSide(
+        tags=tw_tags,
+        project=tw_project,
+        cache_export=tw_cache_export,
+        read_data_files=tw_read_data_files,
+        lazy_tasks=tw_lazy_tasks,
+        use_change_journal=tw_use_change_journal,
+    )
 
     gcal_side = GCalSide(
-        calendar_summary=gcal_calendar, oauth_port=oauth_port, client_secret=google_secret
+        calendar_summary=gcal_calendar,
+        oauth_port=oauth_port,
+        client_secret=google_secret,
+        calendar_id=gcal_calendar_id,
+        save_calendar_id=save_gcal_calendar_id,
     )
 
     # sync ------------------------------------------------------------------------------------
     try:
-        with Aggregator(
-            side_A=gcal_side,
-            side_B=tw_side,
-            converter_B_to_A=convert_tw_to_gcal,
-            converter_A_to_B=convert_gcal_to_tw,
-            resolution_strategy=get_resolution_strategy(
-                resolution_strategy, side_A_type=type(gcal_side), side_B_type=type(tw_side)
-            ),
+        with make_tw_gcal_aggregator(
+            gcal_side,
+            tw_side,
+            resolution_strategy=resolution_strategy,
             config_fname=combination_name,
-            ignore_keys=(
-                (),
-                ("due", "end", "entry", "modified", "urgency"),
-            ),
+            max_parallel_writes=max_parallel_writes,
+            horizon=horizon,
         ) as aggregator:
-            aggregator.sync()
+            if daemon:
+                aggregator.sync_periodically(interval=interval)
+            else:
+                aggregator.sync()
     except KeyboardInterrupt:
         logger.error("Exiting...")
         return 1
@@ -1,5 +1,6 @@
+import datetime
 import os
-from typing import Sequence
+from typing import Optional, Sequence
 
 import click
 from bubop import (
@@ -31,14 +32,23 @@ from taskwarrior_syncall import (
     list_named_combinations,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
     opt_gkeep_note,
     opt_gkeep_passwd_pass_path,
     opt_gkeep_user_pass_path,
+    opt_horizon,
+    opt_interval,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_resolution_strategy,
+    opt_tw_cache_export,
+    opt_tw_lazy_tasks,
     opt_tw_project,
+    opt_tw_read_data_files,
     opt_tw_tags,
+    opt_tw_use_change_journal,
     report_toplevel_exception,
+    update_cached_combination,
 )
 
 
@@ -50,11 +60,19 @@ from taskwarrior_syncall import (
 # taskwarrior options -------------------------------------------------------------------------
 @opt_tw_tags()
 @opt_tw_project()
+@opt_tw_cache_export()
+@opt_tw_read_data_files()
+@opt_tw_lazy_tasks()
+@opt_tw_use_change_journal()
 # misc options --------------------------------------------------------------------------------
 @opt_list_combinations("TW", "Google Keep")
 @opt_resolution_strategy()
 @opt_combination("TW", "Google Keep")
 @opt_custom_combination_savename("TW", "Google Keep")
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_daemon()
+@opt_interval()
 @click.option("-v", "--verbose", count=True)
 @click.version_option(__version__)
 def main(
@@ -68,6 +86,14 @@ def main(
     combination_name: str,
     custom_combination_savename: str,
     do_list_combinations: bool,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    tw_cache_export: bool,
+    tw_read_data_files: bool,
+    tw_lazy_tasks: bool,
+    tw_use_change_journal: bool,
 ):
     """Synchronize Notes from your Google Keep with filters from Taskwarrior.
 
@@ -111,6 +137,9 @@ def main(
         tw_tags = app_config["tw_tags"]
         tw_project = app_config["tw_project"]
         gkeep_note = app_config["gkeep_note"]
+        tw_use_change_journal = tw_use_change_journal or app_config.get(
+            "tw_use_change_journal", False
+        )
 
     # combination manually specified ----------------------------------------------------------
     else:
@@ -125,6 +154,14 @@ def main(
             custom_combination_savename=custom_combination_savename,
         )
 
+    # TW change journal, saved in the combination - see tw_install_hooks ----------------------
+    if tw_use_change_journal:
+        update_cached_combination(
+            config_fname="tw_gkeep_configs",
+            combination=combination_name,
+            tw_use_change_journal=True,
+        )
+
     # at least one of tw_tags, tw_project should be set ---------------------------------------
     if not tw_tags and not tw_project:
         raise RuntimeError(
@@ -171,7 +208,14 @@ def main(
     )
 
     # initialize taskwarrior ------------------------------------------------------------------
-    tw_side = TaskWarriorSide(tags=tw_tags, project=tw_project)
+    tw_side = TaskWarriorSide(
+        tags=tw_tags,
+        project=tw_project,
+        cache_export=tw_cache_export,
+        read_data_files=tw_read_data_files,
+        lazy_tasks=tw_lazy_tasks,
+        use_change_journal=tw_use_change_journal,
+    )
 
     # sync ------------------------------------------------------------------------------------
     try:
@@ -184,12 +228,17 @@ def main(
                 resolution_strategy, side_A_type=type(gkeep_side), side_B_type=type(tw_side)
             ),
             config_fname=combination_name,
+            max_parallel_writes=max_parallel_writes,
+            horizon=horizon,
             ignore_keys=(
                 (),
                 ("due", "end", "entry", "modified", "urgency"),
             ),
         ) as aggregator:
-            aggregator.sync()
+            if daemon:
+                aggregator.sync_periodically(interval=interval)
+            else:
+                aggregator.sync()
     except KeyboardInterrupt:
         logger.error("Exiting...")
         return 1
@@ -0,0 +1,52 @@
+"""Console script for installing the Taskwarrior hooks of taskwarrior_syncall."""
+import sys
+from pathlib import Path
+
+import click
+from bubop import logger, loguru_tqdm_sink
+from taskw.taskrc import TaskRc
+from taskw.warrior import TASKRC
+
+from taskwarrior_syncall import __version__
+from taskwarrior_syncall.taskwarrior_data import data_location
+from taskwarrior_syncall.taskwarrior_journal import install_hooks
+
+
+@click.command()
+@click.option(
+    "--tw-config-file",
+    "config_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=TASKRC,
+    help="Taskwarrior configuration file, for finding its hooks directory",
+)
+@click.option(
+    "--hooks-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Taskwarrior hooks directory - defaults to the one of the configuration file",
+)
+@click.option("-v", "--verbose", count=True)
+@click.version_option(__version__)
+def main(config_file: Path, hooks_dir: Path, verbose: int):
+    """Install the Taskwarrior hooks that journal the added and modified tasks.
+
+    With the hooks installed, synchronizations with the change journal enabled only fetch the
+    tasks that changed since their previous run.
+    """
+    loguru_tqdm_sink(verbosity=verbose)
+    if hooks_dir is None:
+        config = TaskRc(str(config_file))
+        hooks = config.get("hooks")
+        if isinstance(hooks, dict) and "location" in hooks:
+            hooks_dir = Path(hooks["location"]).expanduser()
+        else:
+            hooks_dir = data_location(config) / "hooks"
+
+    for path in install_hooks(hooks_dir):
+        logger.success(f"Installed {path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 """Console script for notion_taskwarrior."""
+import datetime
 from functools import partial
 import os
 import sys
-from typing import List
+from typing import List, Optional
 
 import click
 from bubop import (
@@ -36,9 +37,14 @@ from taskwarrior_syncall import (
     list_named_combinations,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
+    opt_horizon,
+    opt_interval,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_notion_token_pass_path,
     opt_resolution_strategy,
+    opt_tw_cache_export,
     report_toplevel_exception,
     convert_custom_tw_to_notion_db,
     convert_notion_db_to_custom_tw
@@ -58,6 +64,11 @@ from taskwarrior_syncall import (
 @opt_combination("TWCustom", "NotionDB")
 @opt_list_combinations("TWCustom", "NotionDB")
 @opt_custom_combination_savename("TWCustom", "NotionDB")
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_tw_cache_export()
+@opt_daemon()
+@opt_interval()
 @click.option("-v", "--verbose", count=True)
 @click.version_option(__version__)
 def main(
@@ -69,6 +80,11 @@ def main(
     combination_name: str,
     custom_combination_savename: str,
     do_list_combinations: bool,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    tw_cache_export: bool,
 ):
     """Synchronise filters of TW tasks with the to_do items of Notion pages
 
@@ -144,7 +160,7 @@ def main(
     assert token_v2
 
     # initialize taskwarrior ------------------------------------------------------------------
-    tw_side = TaskWarriorCustomSide(sync_value="notion")
+    tw_side = TaskWarriorCustomSide(sync_value="notion", cache_export=tw_cache_export)
 
     # initialize notion -----------------------------------------------------------------------
     client = connect(auth=token_v2)
@@ -170,12 +186,17 @@ def main(
                 resolution_strategy, side_A_type=type(notion_side), side_B_type=type(tw_side)
             ),
             config_fname=combination_name,
+            max_parallel_writes=max_parallel_writes,
+            horizon=horizon,
             ignore_keys=(
                 ("last_modified_date",),
                 ("end", "entry", "modified", "urgency"),
             ),
         ) as aggregator:
-            aggregator.sync()
+            if daemon:
+                aggregator.sync_periodically(interval=interval)
+            else:
+                aggregator.sync()
     except KeyboardInterrupt:
         logger.error("Exiting...")
         return 1
@@ -1,7 +1,8 @@
 """Console script for notion_taskwarrior."""
+import datetime
 import os
 import sys
-from typing import List
+from typing import List, Optional
 
 import click
 from bubop import (
@@ -24,27 +25,33 @@ except ImportError:
 from notion_client import Client  # type: ignore
 
 from taskwarrior_syncall import (
-    Aggregator,
     TaskWarriorSide,
     TaskWarriorCustomSide,
     __version__,
     cache_or_reuse_cached_combination,
-    convert_notion_to_tw,
-    convert_tw_to_notion,
     fetch_app_configuration,
     fetch_from_pass_manager,
-    get_resolution_strategy,
     inform_about_combination_name_usage,
     list_named_combinations,
+    make_tw_notion_aggregator,
     opt_combination,
     opt_custom_combination_savename,
+    opt_daemon,
+    opt_horizon,
+    opt_interval,
     opt_list_combinations,
+    opt_max_parallel_writes,
     opt_notion_page_id,
     opt_notion_token_pass_path,
     opt_resolution_strategy,
+    opt_tw_cache_export,
+    opt_tw_lazy_tasks,
     opt_tw_project,
+    opt_tw_read_data_files,
     opt_tw_tags,
+    opt_tw_use_change_journal,
     report_toplevel_exception,
+    update_cached_combination,
 )
 
 
@@ -56,11 +63,19 @@ from taskwarrior_syncall import (
 # taskwarrior options -------------------------------------------------------------------------
 @opt_tw_tags()
 @opt_tw_project()
+@opt_tw_cache_export()
+@opt_tw_read_data_files()
+@opt_tw_lazy_tasks()
+@opt_tw_use_change_journal()
 # misc options --------------------------------------------------------------------------------
 @opt_resolution_strategy()
 @opt_combination("TW", "Notion")
 @opt_list_combinations("TW", "Notion")
 @opt_custom_combination_savename("TW", "Notion")
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_daemon()
+@opt_interval()
 @click.option("-v", "--verbose", count=True)
 @click.version_option(__version__)
 def main(
@@ -73,6 +88,14 @@ def main(
     combination_name: str,
     custom_combination_savename: str,
     do_list_combinations: bool,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    tw_cache_export: bool,
+    tw_read_data_files: bool,
+    tw_lazy_tasks: bool,
+    tw_use_change_journal: bool,
 ):
     """Synchronise filters of TW tasks with the to_do items of Notion pages
 
@@ -110,6 +133,9 @@ def main(
         tw_tags = app_config["tw_tags"]
         tw_project = app_config["tw_project"]
         notion_page_id = app_config["notion_page_id"]
+        tw_use_change_journal = tw_use_change_journal or app_config.get(
+            "tw_use_change_journal", False
+        )
 
     # combination manually specified ----------------------------------------------------------
     else:
@@ -124,6 +150,14 @@ def main(
             custom_combination_savename=custom_combination_savename,
         )
 
+    # TW change journal, saved in the combination - see tw_install_hooks ----------------------
+    if tw_use_change_journal:
+        update_cached_combination(
+            config_fname="tw_notion_configs",
+            combination=combination_name,
+            tw_use_change_journal=True,
+        )
+
     # at least one of tw_tags, tw_project should be set ---------------------------------------
     if not tw_tags and not tw_project:
         raise RuntimeError(
@@ -155,7 +189,14 @@ def main(
     assert token_v2
 
     # initialize taskwarrior ------------------------------------------------------------------
-    tw_side = TaskWarriorSide(tags=tw_tags, project=tw_project)
+    tw_side = TaskWarriorSide(
+        tags=tw_tags,
+        project=tw_project,
+        cache_export=tw_cache_export,
+        read_data_files=tw_read_data_files,
+        lazy_tasks=tw_lazy_tasks,
+        use_change_journal=tw_use_change_journal,
+    )
 
     # initialize notion -----------------------------------------------------------------------
     # client is a bit too verbose by default.
@@ -167,21 +208,18 @@ def main(
 
     # sync ------------------------------------------------------------------------------------
     try:
-        with Aggregator(
-            side_A=notion_side,
-            side_B=tw_side,
-            converter_B_to_A=convert_tw_to_notion,
-            converter_A_to_B=convert_notion_to_tw,
-            resolution_strategy=get_resolution_strategy(
-                resolution_strategy, side_A_type=type(notion_side), side_B_type=type(tw_side)
-            ),
+        with make_tw_notion_aggregator(
+            notion_side,
+            tw_side,
+            resolution_strategy=resolution_strategy,
             config_fname=combination_name,
-            ignore_keys=(
-                ("last_modified_date",),
-                ("due", "end", "entry", "modified", "urgency"),
-            ),
+            max_parallel_writes=max_parallel_writes,
+            horizon=horizon,
         ) as aggregator:
-            aggregator.sync()
+            if daemon:
+                aggregator.sync_periodically(interval=interval)
+            else:
+                aggregator.sync()
     except KeyboardInterrupt:
         logger.error("Exiting...")
         return 1
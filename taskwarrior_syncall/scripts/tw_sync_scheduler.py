@@ -0,0 +1,338 @@
+"""Console script for synchronizing all the saved combinations at once."""
+import datetime
+import functools
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import click
+from bubop import log_to_syslog, logger, loguru_tqdm_sink
+from taskw.warrior import TASKRC
+
+from taskwarrior_syncall import (
+    Aggregator,
+    TaskWarriorSide,
+    __version__,
+    fetch_from_pass_manager,
+    opt_daemon,
+    opt_google_oauth_port,
+    opt_google_secret_override,
+    opt_horizon,
+    opt_interval,
+    opt_max_parallel_writes,
+    opt_resolution_strategy,
+    report_toplevel_exception,
+)
+from taskwarrior_syncall.rate_limiter import RateLimiter
+from taskwarrior_syncall.scheduler import (
+    COMBINATION_KINDS,
+    DEFAULT_REQUESTS_PER_SECOND,
+    Combination,
+    Scheduler,
+    SharedResources,
+    load_combinations,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _fetch_token(env_var: str, pass_path: Optional[str]) -> str:
+    """Fetch an API token - from the environment, unless a pass path is given."""
+    if pass_path is not None:
+        return fetch_from_pass_manager(pass_path)
+
+    token = os.environ.get(env_var)
+    if token is None:
+        raise RuntimeError(
+            f"Provide the API token either via the {env_var} environment variable or via a"
+            " path in the UNIX password manager."
+        )
+
+    return token
+
+
+def _tw_side(combination: Combination, resources: SharedResources) -> TaskWarriorSide:
+    config_file = Path(combination.config.get("tw_config_file", TASKRC))
+    lazy_tasks = combination.config.get("tw_lazy_tasks", False)
+    return TaskWarriorSide(
+        tags=combination.config["tw_tags"],
+        project=combination.config["tw_project"],
+        config_file=config_file,
+        export=resources.tw_export(config_file, lazy=lazy_tasks),
+        use_change_journal=combination.config.get("tw_use_change_journal", False),
+        cache_export=combination.config.get("tw_cache_export", False),
+        read_data_files=combination.config.get("tw_read_data_files", False),
+        lazy_tasks=lazy_tasks,
+    )
+
+
+def _rate_limit_session(session, rate_limiter: Optional[RateLimiter]):
+    """Make the given requests.Session wait for the rate limiter before every request."""
+    if rate_limiter is None:
+        return session
+
+    request = session.request
+
+    def rate_limited_request(*args, **kargs):
+        rate_limiter.acquire()
+        return request(*args, **kargs)
+
+    session.request = rate_limited_request
+    return session
+
+
+def _make_tw_gcal_aggregator(
+    combination: Combination, resources: SharedResources, options: Dict
+) -> Aggregator:
+    from taskwarrior_syncall import GCalSide, cached_gcal_calendar_id, make_tw_gcal_aggregator
+
+    gcal_calendar_id, save_gcal_calendar_id = cached_gcal_calendar_id(
+        combination.config,
+        config_fname=f"{combination.kind}_configs",
+        combination=combination.name,
+        gcal_calendar=combination.config["gcal_calendar"],
+    )
+
+    # credentials are shared between all the GCalSide instances of the same account
+    gcal_side = GCalSide(
+        calendar_summary=combination.config["gcal_calendar"],
+        oauth_port=options["oauth_port"],
+        client_secret=options["google_secret"],
+        rate_limiter=resources.rate_limiter("gcal"),
+        calendar_id=gcal_calendar_id,
+        save_calendar_id=save_gcal_calendar_id,
+    )
+
+    return make_tw_gcal_aggregator(
+        gcal_side,
+        _tw_side(combination, resources),
+        resolution_strategy=options["resolution_strategy"],
+        config_fname=combination.name,
+        max_parallel_writes=options["max_parallel_writes"],
+        horizon=options["horizon"],
+    )
+
+
+def _make_tw_notion_aggregator(
+    combination: Combination, resources: SharedResources, options: Dict
+) -> Aggregator:
+    import httpx
+    from notion_client import Client  # type: ignore
+
+    from taskwarrior_syncall import NotionSide, make_tw_notion_aggregator
+
+    token = _fetch_token(
+        "NOTION_API_KEY",
+        combination.config.get("token_pass_path", options["notion_token_pass_path"]),
+    )
+
+    def create_client() -> Client:
+        rate_limiter = resources.rate_limiter("notion")
+        event_hooks = {}
+        if rate_limiter is not None:
+            event_hooks["request"] = [lambda _: rate_limiter.acquire()]
+
+        return Client(auth=token, client=httpx.Client(event_hooks=event_hooks))
+
+    notion_side = NotionSide(
+        client=resources.client("notion", token, create_client),
+        page_id=combination.config["notion_page_id"],
+    )
+
+    return make_tw_notion_aggregator(
+        notion_side,
+        _tw_side(combination, resources),
+        resolution_strategy=options["resolution_strategy"],
+        config_fname=combination.name,
+        max_parallel_writes=options["max_parallel_writes"],
+        horizon=options["horizon"],
+    )
+
+
+def _make_tw_asana_aggregator(
+    combination: Combination, resources: SharedResources, options: Dict
+) -> Aggregator:
+    import asana
+
+    from taskwarrior_syncall import AsanaSide, make_tw_asana_aggregator
+
+    token = _fetch_token(
+        "ASANA_PERSONAL_ACCESS_TOKEN",
+        combination.config.get("token_pass_path", options["asana_token_pass_path"]),
+    )
+
+    def create_client() -> asana.Client:
+        client = asana.Client.access_token(token)
+        client.headers["Asana-Disable"] = ",".join(
+            [client.headers.get("Asana-Disable", ""), "new_user_task_lists"]
+        )
+        client.options["client_name"] = "taskwarrior_syncall"
+        _rate_limit_session(client.session, resources.rate_limiter("asana"))
+        return client
+
+    asana_side = AsanaSide(
+        client=resources.client("asana", token, create_client),
+        task_gid=combination.config.get("asana_task_gid"),
+        workspace_gid=combination.config["asana_workspace_gid"],
+    )
+
+    return make_tw_asana_aggregator(
+        asana_side,
+        _tw_side(combination, resources),
+        resolution_strategy=options["resolution_strategy"],
+        config_fname=combination.name,
+        max_parallel_writes=options["max_parallel_writes"],
+        horizon=options["horizon"],
+    )
+
+
+_aggregator_makers = {
+    "tw_gcal": _make_tw_gcal_aggregator,
+    "tw_notion": _make_tw_notion_aggregator,
+    "tw_asana": _make_tw_asana_aggregator,
+}
+
+
+def _parse_rate_limits(ctx, param, rate_limits: Sequence[str]) -> Dict[str, float]:
+    requests_per_second = dict(DEFAULT_REQUESTS_PER_SECOND)
+    for rate_limit in rate_limits:
+        backend, _, rate = rate_limit.partition("=")
+        try:
+            if backend not in requests_per_second:
+                raise ValueError(backend)
+            requests_per_second[backend] = float(rate)
+        except ValueError:
+            raise click.BadParameter(
+                "Expected <backend>=<requests per second> with backend one of"
+                f" {', '.join(requests_per_second)}, got {rate_limit}"
+            )
+
+    return requests_per_second
+
+
+# CLI parsing ---------------------------------------------------------------------------------
+@click.command()
+@click.option(
+    "-k",
+    "--kind",
+    "kinds",
+    type=click.Choice(COMBINATION_KINDS),
+    multiple=True,
+    help="Only synchronize the saved combinations of this kind - may be repeated",
+)
+@click.option(
+    "-j",
+    "--workers",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of combinations to synchronize concurrently",
+)
+@click.option(
+    "--rate-limit",
+    "requests_per_second",
+    multiple=True,
+    callback=_parse_rate_limits,
+    help=(
+        "Requests per second to a backend, across all combinations, e.g., notion=3 - may be"
+        " repeated"
+    ),
+)
+# tokens --------------------------------------------------------------------------------------
+@click.option(
+    "--notion-token-pass-path",
+    help="Path in the UNIX password manager to fetch the Notion API key from",
+)
+@click.option(
+    "--asana-token-pass-path",
+    help="Path in the UNIX password manager to fetch the Asana Personal Access Token from",
+)
+# Google options ------------------------------------------------------------------------------
+@opt_google_secret_override()
+@opt_google_oauth_port()
+# misc options --------------------------------------------------------------------------------
+@opt_resolution_strategy()
+@opt_max_parallel_writes()
+@opt_horizon()
+@opt_daemon()
+@opt_interval()
+@click.option("-v", "--verbose", count=True)
+@click.version_option(__version__)
+def main(
+    kinds: Tuple[str, ...],
+    workers: int,
+    requests_per_second: Dict[str, float],
+    notion_token_pass_path: Optional[str],
+    asana_token_pass_path: Optional[str],
+    google_secret: str,
+    oauth_port: int,
+    resolution_strategy: str,
+    max_parallel_writes: int,
+    horizon: Optional[datetime.timedelta],
+    daemon: bool,
+    interval: int,
+    verbose: int,
+):
+    """Synchronize all the saved TW<->Google Calendar/Notion/Asana combinations.
+
+    The combinations are the ones saved by tw_gcal_sync, tw_notion_sync and tw_asana_sync and
+    run concurrently, sharing a single Taskwarrior export per taskrc, a single API client per
+    account and a single request budget per backend.
+
+    A combination may also specify the taskrc (tw_config_file) and the path to its API token
+    in the UNIX password manager (token_pass_path), e.g., when syncing different accounts.
+    Combinations with tw_use_change_journal set only fetch the tasks journaled as changed by the
+    hooks of tw_install_hooks. Combinations with tw_cache_export set share the latest export of
+    their taskrc with other processes, e.g., with the tw_*_sync scripts. Combinations with
+    tw_read_data_files set read the tasks directly off the data files of their taskrc.
+    Combinations with tw_lazy_tasks set convert the fields of their tasks on first access.
+    """
+    # setup logger ----------------------------------------------------------------------------
+    loguru_tqdm_sink(verbosity=verbose)
+    log_to_syslog(name="tw_sync_scheduler")
+    logger.debug("Initialising...")
+
+    combinations = load_combinations(kinds or COMBINATION_KINDS)
+    if not combinations:
+        logger.error("No saved combinations found, nothing to do.")
+        return 1
+    logger.info(f"Loaded {len(combinations)} combinations.")
+
+    options = {
+        "notion_token_pass_path": notion_token_pass_path,
+        "asana_token_pass_path": asana_token_pass_path,
+        "google_secret": google_secret,
+        "oauth_port": oauth_port,
+        "resolution_strategy": resolution_strategy,
+        "max_parallel_writes": max_parallel_writes,
+        "horizon": horizon,
+    }
+
+    def make_aggregator(combination: Combination, resources: SharedResources) -> Aggregator:
+        return _aggregator_makers[combination.kind](combination, resources, options)
+
+    # sync ------------------------------------------------------------------------------------
+    try:
+        with Scheduler(
+            combinations=combinations,
+            make_aggregator=make_aggregator,
+            resources=SharedResources(requests_per_second=requests_per_second),
+            max_workers=workers,
+        ) as scheduler:
+            if daemon:
+                scheduler.sync_periodically(interval=interval)
+            else:
+                results = scheduler.sync_all()
+                if not all(results.values()):
+                    return 1
+    except KeyboardInterrupt:
+        logger.error("Exiting...")
+        return 1
+    except:
+        report_toplevel_exception(is_verbose=verbose >= 1)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
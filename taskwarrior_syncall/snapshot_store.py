@@ -0,0 +1,168 @@
+import pickle
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from bubop import logger, pickle_load
+from item_synchronizer.types import ID, Item
+
+from taskwarrior_syncall.constants import SQLITE_BUSY_TIMEOUT, SQLITE_MAX_QUERY_PARAMS
+from taskwarrior_syncall.utils import chunked
+
+
+class SnapshotStore:
+    """Store of the cached (serialized) versions of the items of a single side.
+
+    All the snapshots of a side live in a single SQLite database, keyed by the item ID. This
+    replaces the directory of one pickle file per item, which turns into tens of thousands of
+    open/read/close calls per run for large databases.
+
+    Bulk operations (:py:meth:`load`, :py:meth:`upsert`, :py:meth:`delete`) run in a single
+    transaction each.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        # the owner may use the store from different threads, though never concurrently
+        self._conn = sqlite3.connect(
+            str(path), timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False
+        )
+        # multiple synchronizers may share the same store - allow concurrent readers, writers
+        # wait for each other
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots"
+                " (id TEXT PRIMARY KEY, item BLOB NOT NULL)"
+            )
+
+    def __str__(self) -> str:
+        return str(self._path)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def __contains__(self, item_id: ID) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM snapshots WHERE id = ?", (str(item_id),)
+        ).fetchone()
+        return row is not None
+
+    def ids(self) -> List[ID]:
+        """Return the IDs of all the stored snapshots."""
+        return [row[0] for row in self._conn.execute("SELECT id FROM snapshots")]
+
+    def get(self, item_id: ID) -> Optional[Item]:
+        """Return the snapshot of the given item, None if there is none."""
+        row = self._conn.execute(
+            "SELECT item FROM snapshots WHERE id = ?", (str(item_id),)
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def load(self, ids: Iterable[ID]) -> Dict[ID, Item]:
+        """Bulk-load the snapshots of the given items.
+
+        Items without a snapshot are not part of the returned dictionary.
+        """
+        ids = [str(id_) for id_ in ids]
+        out: Dict[ID, Item] = {}
+        for chunk in chunked(ids, SQLITE_MAX_QUERY_PARAMS):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT id, item FROM snapshots WHERE id IN ({placeholders})", chunk
+            )
+            out.update((id_, pickle.loads(blob)) for id_, blob in rows)
+
+        return out
+
+    def load_all(self) -> Dict[ID, Item]:
+        """Load all the stored snapshots."""
+        rows = self._conn.execute("SELECT id, item FROM snapshots")
+        return {id_: pickle.loads(blob) for id_, blob in rows}
+
+    def upsert(self, items: Mapping[ID, Item]) -> None:
+        """Insert or replace the snapshots of the given items in a single transaction."""
+        if not items:
+            return
+
+        rows = [
+            (str(id_), pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL))
+            for id_, item in items.items()
+        ]
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?)", rows)
+
+    def delete(self, ids: Iterable[ID]) -> int:
+        """Delete the snapshots of the given items in a single transaction.
+
+        :returns: The number of snapshots that were actually deleted
+        """
+        ids = [str(id_) for id_ in ids]
+        deleted = 0
+        with self._conn:
+            for chunk in chunked(ids, SQLITE_MAX_QUERY_PARAMS):
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(
+                    f"DELETE FROM snapshots WHERE id IN ({placeholders})", chunk
+                )
+                deleted += cursor.rowcount
+
+        if deleted != len(ids):
+            logger.warning(
+                f"Requested deletion of {len(ids)} snapshots but only {deleted} existed in"
+                f" {self}, this may indicate an error"
+            )
+
+        return deleted
+
+    def migrate_from_pickle_dir(self, serdes_dir: Path) -> int:
+        """Import the snapshots of the legacy, one-pickle-file-per-item directory.
+
+        The pickle files are imported in a single transaction and are removed afterwards,
+        along with the directory itself. Files that fail to load are kept, so that they can be
+        inspected. This is a no-op if the directory doesn't exist.
+
+        :returns: The number of imported snapshots
+        """
+        if not serdes_dir.is_dir():
+            return 0
+
+        paths = [p for p in serdes_dir.iterdir() if p.is_file()]
+        logger.info(f"Migrating {len(paths)} cached items from {serdes_dir} to {self}...")
+
+        items: Dict[ID, Item] = {}
+        migrated: List[Path] = []
+        for p in paths:
+            try:
+                items[p.name] = pickle_load(p)
+            except Exception:
+                logger.warning(f"Couldn't load cached item, skipping it -> {p}")
+                logger.opt(exception=True).debug(f"Couldn't load cached item -> {p}")
+            else:
+                migrated.append(p)
+
+        self.upsert(items)
+
+        for p in migrated:
+            p.unlink()
+        if len(migrated) != len(paths):
+            logger.warning(
+                f"Keeping {len(paths) - len(migrated)} cached items that couldn't be migrated"
+                f" -> {serdes_dir}"
+            )
+            return len(items)
+
+        try:
+            serdes_dir.rmdir()
+        except OSError:
+            logger.warning(f"Couldn't remove legacy serdes directory -> {serdes_dir}")
+
+        return len(items)
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,13 +1,36 @@
 import abc
 import datetime
-from typing import Any, Mapping, Optional, Sequence, final
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union, final
 
-from bubop.time import is_same_datetime
+from bubop.time import assume_local_tz_if_none, is_same_datetime
 from item_synchronizer.types import ID
 from loguru import logger
 
 ItemType = Mapping[str, Any]
 
+# Two datetimes closer than this are considered the same when comparing items
+DATETIME_TOLERANCE = datetime.timedelta(minutes=10)
+
+
+def _normalize_for_fingerprint(value: Any) -> Any:
+    """Convert the given value to a canonical, JSON-serializable representation."""
+    if isinstance(value, datetime.datetime):
+        # round down to the comparison tolerance - values in the same bucket are identical
+        ts = assume_local_tz_if_none(value).timestamp()
+        return ["datetime", int(ts // DATETIME_TOLERANCE.total_seconds())]
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, list):
+        return [_normalize_for_fingerprint(v) for v in value]
+    elif isinstance(value, tuple):
+        return ["tuple", [_normalize_for_fingerprint(v) for v in value]]
+    elif isinstance(value, Mapping):
+        return {str(k): _normalize_for_fingerprint(v) for k, v in value.items()}
+    else:
+        return [type(value).__name__, str(value)]
+
 
 class SyncSide(abc.ABC):
     """Interface class for interacting with the various synchronization sides.
@@ -19,6 +42,27 @@ class SyncSide(abc.ABC):
     item_synchronizer.
     """
 
+    # Whether the start/get_all_items/finish methods of this side can run in a separate thread,
+    # concurrently with the ones of the other side, and whether multiple items of this side can
+    # be added/updated/deleted concurrently. Set to False in derived classes that are not
+    # thread-safe.
+    is_thread_safe: bool = True
+
+    # Whether the items returned by get_all_items are complete, i.e., the same as the ones that
+    # get_item would return. If not, the Aggregator fetches the items again via get_item
+    # before caching them or handing them over to the other side.
+    listing_is_complete: bool = True
+
+    # Maximum number of items to pass to a single add_items/update_items/delete_items call.
+    # Leave these to 1 unless the corresponding method is overridden to use a bulk request -
+    # the Aggregator runs separate calls concurrently.
+    max_add_batch_size: int = 1
+    max_update_batch_size: int = 1
+    max_delete_batch_size: int = 1
+
+    # Start of the sync horizon - see set_horizon
+    _horizon_start: Optional[datetime.datetime] = None
+
     def __init__(self, name: str, fullname: str, *args, **kargs) -> None:
         self._fullname = fullname
         self._name = name
@@ -52,6 +96,55 @@ class SyncSide(abc.ABC):
         """
         pass
 
+    def invalidate_cache(self):
+        """Forget the data cached during the previous synchronization run.
+
+        The Aggregator calls this before every synchronization run but the first, so that
+        long-lived sides (e.g., in daemon mode) pick up the latest changes. Derived classes
+        that cache items across calls should drop or refresh these caches here.
+        """
+        pass
+
+    def refresh_credentials(self):
+        """Refresh the credentials of the side, if they are about to expire.
+
+        Called while a long-lived side is idle, between synchronization runs, so that the runs
+        themselves don't have to wait for it.
+        """
+        pass
+
+    def commit_writes(self):
+        """Make the writes of the current synchronization run durable.
+
+        The Aggregator calls this after writing to the side and before it records the writes
+        as done. Derived classes that buffer their writes, instead of sending them right away,
+        should send them here.
+        """
+        pass
+
+    def set_horizon(self, start: Optional[datetime.datetime]):
+        """Limit the listings of the side to the items that are still active and to the ones
+        that finished, e.g., were completed or ended, after the given start.
+
+        The Aggregator calls this before every synchronization run. Derived classes that can
+        limit their listings take the start of the horizon into account in get_all_items and
+        override finished_at accordingly - the rest list all their items.
+
+        :param start: Start of the horizon, None to list all the items
+        """
+        self._horizon_start = start
+
+    @classmethod
+    def finished_at(cls, item: ItemType) -> Optional[datetime.datetime]:
+        """When the given item finished, e.g., was completed or ended.
+
+        Items that finished before the start of the horizon are not listed and the Aggregator
+        leaves them as they are, instead of treating them as deleted.
+
+        :returns: None if the item is still active or if the side doesn't limit its listings
+        """
+        return None
+
     @abc.abstractmethod
     def get_all_items(self, **kargs) -> Sequence[ItemType]:
         """Query side and return a sequence of items
@@ -61,6 +154,28 @@ class SyncSide(abc.ABC):
         """
         raise NotImplementedError("Implement in derived")
 
+    def change_journal_position(self) -> Optional[str]:
+        """Position of the journal of the changes of the side, as of the latest listing.
+
+        Sides that keep a journal of their changes override this and get_changed_items, so that
+        the Aggregator only fetches the items that changed since the previous run. The
+        Aggregator calls this after listing the items, via get_all_items or get_changed_items -
+        changes made during the listing should be after the returned position.
+
+        :returns: An opaque position to pass to get_changed_items in the next run, None if the
+                  side has no change journal
+        """
+        return None
+
+    def get_changed_items(self, since: str) -> Optional[Dict[ID, Optional[ItemType]]]:
+        """Get the items that changed after the given position of the change journal.
+
+        :returns: The latest version of every changed item - None for the ones that were
+                  deleted or are no longer part of the side - or None if the changes are
+                  unknown, e.g., the journal has a gap. The Aggregator then lists all the items.
+        """
+        return None
+
     @abc.abstractmethod
     def get_item(self, item_id: ID, use_cached: bool = False) -> Optional[ItemType]:
         """Get a single item based on the given UUID.
@@ -97,6 +212,63 @@ class SyncSide(abc.ABC):
         """
         raise NotImplementedError("Implement in derived")
 
+    def delete_items(self, item_ids: Sequence[ID]) -> Dict[ID, Optional[Exception]]:
+        """Delete multiple items.
+
+        By default, delete them one by one. Override to use a bulk request where the side
+        offers one.
+
+        :returns: The exception raised for each item that couldn't be deleted, None for the
+                  rest
+        """
+        results: Dict[ID, Optional[Exception]] = {}
+        for item_id in item_ids:
+            try:
+                self.delete_single_item(item_id)
+                results[item_id] = None
+            except Exception as exc:
+                results[item_id] = exc
+
+        return results
+
+    def update_items(self, changes: Mapping[ID, ItemType]) -> Dict[ID, Optional[Exception]]:
+        """Update multiple items.
+
+        By default, update them one by one. Override to use a bulk request where the side
+        offers one.
+
+        :param changes: Changes to apply to each item, see update_item
+        :returns: The exception raised for each item that couldn't be updated, None for the
+                  rest
+        """
+        results: Dict[ID, Optional[Exception]] = {}
+        for item_id, item_changes in changes.items():
+            try:
+                self.update_item(item_id, **item_changes)
+                results[item_id] = None
+            except Exception as exc:
+                results[item_id] = exc
+
+        return results
+
+    def add_items(self, items: Sequence[ItemType]) -> List[Union[ItemType, Exception]]:
+        """Add multiple new items.
+
+        By default, add them one by one. Override to use a bulk request where the side offers
+        one.
+
+        :returns: For each of the given items, in the same order, either the newly added item
+                  or the exception raised while adding it
+        """
+        results: List[Union[ItemType, Exception]] = []
+        for item in items:
+            try:
+                results.append(self.add_item(item))
+            except Exception as exc:
+                results.append(exc)
+
+        return results
+
     @classmethod
     @abc.abstractmethod
     def id_key(cls) -> str:
@@ -141,6 +313,18 @@ class SyncSide(abc.ABC):
         """
         raise NotImplementedError("Implement in derived")
 
+    @classmethod
+    def fingerprint(cls, item: ItemType, ignore_keys: Sequence[str] = []) -> Optional[str]:
+        """Compute a digest of the fields of the item that items_are_identical compares.
+
+        Items with equal fingerprints must also be identical according to
+        :py:meth:`items_are_identical`. The opposite doesn't have to hold - items with
+        different fingerprints are compared in full.
+
+        .. returns:: The digest or None if this side doesn't support fingerprints.
+        """
+        return None
+
     @final
     @staticmethod
     def _items_are_identical(item1: ItemType, item2: ItemType, keys: list) -> bool:
@@ -165,7 +349,7 @@ class SyncSide(abc.ABC):
             if isinstance(item1[k], datetime.datetime) and isinstance(
                 item2[k], datetime.datetime
             ):
-                if is_same_datetime(item1[k], item2[k], tol=datetime.timedelta(minutes=10)):
+                if is_same_datetime(item1[k], item2[k], tol=DATETIME_TOLERANCE):
                     continue
                 else:
                     logger.opt(lazy=True).trace(
@@ -184,3 +368,15 @@ class SyncSide(abc.ABC):
                     return False
 
         return True
+
+    @final
+    @staticmethod
+    def _fingerprint(item: ItemType, keys: Iterable[str]) -> str:
+        """Compute a digest of the provided keys of the given item.
+
+        Counterpart of :py:meth:`_items_are_identical` - missing keys are treated as None and
+        datetimes are rounded down to the comparison tolerance.
+        """
+        normalized = {k: _normalize_for_fingerprint(item.get(k, None)) for k in keys}
+        serialized = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,221 @@
+import pickle
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+from item_synchronizer.types import ID, Item
+
+from taskwarrior_syncall.constants import SQLITE_BUSY_TIMEOUT, SQLITE_MAX_QUERY_PARAMS
+from taskwarrior_syncall.utils import chunked
+
+
+@dataclass
+class JournalEntry:
+    """A write to one of the sides, recorded before executing it."""
+
+    seq: int
+    side: str
+    # insert, update or delete
+    kind: str
+    # ID of the item to update or delete - a placeholder ID for the items to insert
+    item_id: ID
+    # ID of the counterpart of the item at the other side
+    other_id: Optional[ID]
+    item: Optional[Item]
+    done: bool = False
+    # ID of the inserted item, once done
+    result_id: Optional[ID] = None
+
+
+class SyncState:
+    """State of a single synchronization combination that doesn't belong in its YAML config.
+
+    Kept in a SQLite database next to the configuration file of the combination, e.g.,
+    ~/.config/taskwarrior_syncall/<combination>.sqlite3.
+
+    Holds:
+
+    - The correspondences between the IDs of the two sides, indexed in both directions
+    - The fingerprints of the cached version of each synchronized item, per side
+    - The journal of the writes of the current synchronization run
+    - The position of the change journal of each side, as of the last successful run
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        # the owner may use the store from different threads, though never concurrently
+        self._conn = sqlite3.connect(
+            str(path), timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints"
+                " (side TEXT NOT NULL, id TEXT NOT NULL, digest TEXT NOT NULL,"
+                " PRIMARY KEY (side, id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS correspondences"
+                " (id_B TEXT PRIMARY KEY, id_A TEXT NOT NULL UNIQUE)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal"
+                " (seq INTEGER PRIMARY KEY AUTOINCREMENT, side TEXT NOT NULL,"
+                " kind TEXT NOT NULL, item_id TEXT NOT NULL, other_id TEXT, item BLOB,"
+                " done INTEGER NOT NULL DEFAULT 0, result_id TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS change_positions"
+                " (side TEXT PRIMARY KEY, position TEXT NOT NULL)"
+            )
+
+    def __str__(self) -> str:
+        return str(self._path)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def load_fingerprints(self, side: str) -> Dict[ID, str]:
+        """Load the fingerprints of all the items of the given side."""
+        rows = self._conn.execute(
+            "SELECT id, digest FROM fingerprints WHERE side = ?", (side,)
+        )
+        return dict(rows)
+
+    def upsert_fingerprints(self, side: str, fingerprints: Mapping[ID, str]) -> None:
+        """Insert or replace the fingerprints of the given items in a single transaction."""
+        if not fingerprints:
+            return
+
+        rows = [(side, str(id_), digest) for id_, digest in fingerprints.items()]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)", rows
+            )
+
+    def delete_fingerprints(self, side: str, ids: Iterable[ID]) -> None:
+        """Delete the fingerprints of the given items in a single transaction."""
+        ids = [str(id_) for id_ in ids]
+        with self._conn:
+            for chunk in chunked(ids, SQLITE_MAX_QUERY_PARAMS):
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM fingerprints WHERE side = ? AND id IN ({placeholders})",
+                    (side, *chunk),
+                )
+
+    def load_correspondences(self) -> Dict[ID, ID]:
+        """Load the correspondences between the two sides, from the IDs of side B to the ones
+        of side A.
+        """
+        return dict(self._conn.execute("SELECT id_B, id_A FROM correspondences"))
+
+    def update_correspondences(
+        self, upserts: Mapping[ID, ID], deleted: Iterable[ID] = ()
+    ) -> None:
+        """Add/replace and delete correspondences in a single transaction.
+
+        :param upserts: New correspondences, from the IDs of side B to the ones of side A. They
+                        replace any existing correspondence of either of the two IDs.
+        :param deleted: IDs of side B whose correspondences to delete
+        """
+        deleted = [str(id_B) for id_B in deleted]
+        if not upserts and not deleted:
+            return
+
+        with self._conn:
+            for chunk in chunked(deleted, SQLITE_MAX_QUERY_PARAMS):
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM correspondences WHERE id_B IN ({placeholders})", chunk
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO correspondences VALUES (?, ?)",
+                ((str(id_B), str(id_A)) for id_B, id_A in upserts.items()),
+            )
+
+    def journal_writes(self, entries: Sequence[JournalEntry]) -> List[int]:
+        """Record the given writes in a single transaction, before executing them.
+
+        The `seq` of the given entries is ignored.
+
+        :returns: The sequence number of each recorded entry, in order
+        """
+        seqs = []
+        with self._conn:
+            for entry in entries:
+                cursor = self._conn.execute(
+                    "INSERT INTO journal (side, kind, item_id, other_id, item)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        entry.side,
+                        entry.kind,
+                        str(entry.item_id),
+                        None if entry.other_id is None else str(entry.other_id),
+                        pickle.dumps(entry.item, protocol=pickle.HIGHEST_PROTOCOL),
+                    ),
+                )
+                seqs.append(cursor.lastrowid)
+
+        return seqs
+
+    def complete_write(self, seq: int, result_id: Optional[ID] = None) -> None:
+        """Mark a journaled write as done, right after executing it."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE journal SET done = 1, result_id = ? WHERE seq = ?",
+                (None if result_id is None else str(result_id), seq),
+            )
+
+    def load_journal(self) -> List[JournalEntry]:
+        """Load the journaled writes, in the order they were recorded."""
+        rows = self._conn.execute(
+            "SELECT seq, side, kind, item_id, other_id, item, done, result_id FROM journal"
+            " ORDER BY seq"
+        )
+        return [
+            JournalEntry(
+                seq=seq,
+                side=side,
+                kind=kind,
+                item_id=item_id,
+                other_id=other_id,
+                item=pickle.loads(item),
+                done=bool(done),
+                result_id=result_id,
+            )
+            for seq, side, kind, item_id, other_id, item, done, result_id in rows
+        ]
+
+    def discard_write(self, seq: int) -> None:
+        """Drop a journaled write that failed, i.e., that had no effect."""
+        with self._conn:
+            self._conn.execute("DELETE FROM journal WHERE seq = ?", (seq,))
+
+    def clear_journal(self) -> None:
+        """Drop all the journaled writes, once their effects are persisted."""
+        with self._conn:
+            self._conn.execute("DELETE FROM journal")
+
+    def load_change_position(self, side: str) -> Optional[str]:
+        """Position of the change journal of the given side as of the last successful run."""
+        row = self._conn.execute(
+            "SELECT position FROM change_positions WHERE side = ?", (side,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def save_change_position(self, side: str, position: Optional[str]) -> None:
+        """Save the position of the change journal of the given side - None to forget it."""
+        with self._conn:
+            if position is None:
+                self._conn.execute("DELETE FROM change_positions WHERE side = ?", (side,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO change_positions VALUES (?, ?)", (side, position)
+                )
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,13 +1,24 @@
 import datetime
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Sequence, Set, Union, cast
-from uuid import UUID
+from typing import Dict, List, Literal, Mapping, Optional, Sequence, Set, Union, cast
 
 from bubop import logger, parse_datetime, pickle_dump
+from bubop.time import assume_local_tz_if_none
 from taskw import TaskWarrior
 from taskw.warrior import TASKRC
 
 from taskwarrior_syncall.sync_side import ItemType, SyncSide
+from taskwarrior_syncall.taskwarrior_export_cache import TaskWarriorExportCache
+from taskwarrior_syncall.taskwarrior_side import (
+    TASK_DELETE_MAX_TASKS,
+    TASK_IMPORT_MAX_TASKS,
+    delete_tasks,
+    export_filter,
+    import_tasks,
+    marshal_tasks,
+    new_task,
+    updated_task,
+)
 from taskwarrior_syncall.types import TaskwarriorRawItem
 
 OrderByType = Literal[
@@ -40,19 +51,29 @@ class TaskWarriorCustomSide(SyncSide):
     SUMMARY_KEY = "description"
     LAST_MODIFICATION_KEY = "modified"
 
+    max_add_batch_size = TASK_IMPORT_MAX_TASKS
+    max_update_batch_size = TASK_IMPORT_MAX_TASKS
+    max_delete_batch_size = TASK_DELETE_MAX_TASKS
+
     def __init__(
         self,
         sync_value: Union[str, None] = None,
         config_file: Optional[Path] = Path(TASKRC),
+        cache_export: bool = False,
         **kargs,
     ):
         """
         :param sync_value: value for the 'sync' UDA that marks task as syncable
         :param config_file: Path to the taskwarrior RC file
+        :param cache_export: Reuse the snapshot of the latest full export of the database,
+            shared with other processes, while the database is unchanged
         """
         super().__init__(name="Tw_c", fullname="TaskwarriorCustom", **kargs)
         self._sync_value: Union[str, None] = sync_value
         self._tw = TaskWarrior(marshal=True, config_filename=config_file)
+        self._export_cache: Optional[TaskWarriorExportCache] = None
+        if cache_export:
+            self._export_cache = TaskWarriorExportCache(config_file or Path(TASKRC))
 
         # All TW tasks
         self._items_cache: Dict[str, TaskwarriorRawItem] = {}
@@ -72,13 +93,29 @@ class TaskWarriorCustomSide(SyncSide):
         if not self._reload_items:
             return
 
-        tasks = self._tw.load_tasks()
-        items = [*tasks["completed"], *tasks["pending"]]
+        if self._export_cache is not None:
+            # full export, shared with other processes, filtered in get_all_items
+            tasks = self._export_cache.load_tasks(
+                lambda: self._tw._get_json(*export_filter(), "export")
+            )
+            items = marshal_tasks(self._tw, tasks)
+        elif self._sync_value:
+            # only export the tasks that are synchronized
+            items = self._tw._get_task_objects(
+                *export_filter(ended_after=self._horizon_start, sync=self._sync_value),
+                "export",
+            )
+        else:
+            tasks = self._tw.load_tasks()
+            items = [*tasks["completed"], *tasks["pending"]]
         self._items_cache: Dict[str, TaskwarriorRawItem] = {  # type: ignore
             str(item["uuid"]): item for item in items
         }
         self._reload_items = False
 
+    def invalidate_cache(self):
+        self._reload_items = True
+
     def get_all_items(
         self,
         skip_completed=False,
@@ -100,6 +137,8 @@ class TaskWarriorCustomSide(SyncSide):
         tasks = list(self._items_cache.values())
         if skip_completed:
             tasks = [t for t in tasks if t["status"] != "completed"]
+        if self._horizon_start is not None:
+            tasks = [t for t in tasks if self._is_within_horizon(t)]
 
         # filter the tasks based on their tags and their project ------------------------------
         if self._sync_value:
@@ -115,6 +154,19 @@ class TaskWarriorCustomSide(SyncSide):
 
         return tasks  # type: ignore
 
+    @classmethod
+    def finished_at(cls, item: ItemType) -> Optional[datetime.datetime]:
+        return item.get("end") if item["status"] == "completed" else None
+
+    def _is_within_horizon(self, task: TaskwarriorRawItem) -> bool:
+        """Whether the given task is still active or completed after the start of the horizon."""
+        finished_at = self.finished_at(task)
+        return (
+            self._horizon_start is None
+            or finished_at is None
+            or assume_local_tz_if_none(finished_at) >= self._horizon_start
+        )
+
     def get_item(self, item_id: str, use_cached: bool = True) -> Optional[TaskwarriorRawItem]:
         item = self._items_cache.get(item_id)
         if not use_cached or item is None:
@@ -132,20 +184,29 @@ class TaskWarriorCustomSide(SyncSide):
 
         :raises ValaueError: In case the item is not present in the db
         """
-        changes.pop("id", False)
-        t = self._tw.get_task(uuid=UUID(item_id))[-1]
-
-        # task CLI doesn't allow `imask`
-        unwanted_keys = ["imask", "recur", "rtype", "parent", "urgency"]
-        for i in unwanted_keys:
-            t.pop(i, False)
-
-        # taskwarrior doesn't let you explicitly set the update time.
-        # even if you set it it will revert to the time  that you call
-        # `tw.task_update`
-        d = dict(t)
-        d.update(changes)
-        self._tw.task_update(d)
+        err = self.update_items({item_id: changes})[item_id]
+        if err is not None:
+            raise err
+
+    def update_items(self, changes: Mapping[str, ItemType]) -> Dict[str, Optional[Exception]]:
+        """Update the given tasks with a single `task import`."""
+        results: Dict[str, Optional[Exception]] = {}
+        tasks = []
+        for item_id, item_changes in changes.items():
+            task = self.get_item(item_id)
+            if task is None:
+                results[item_id] = ValueError(f"No task with UUID {item_id}")
+                continue
+            tasks.append(updated_task(task, item_changes))
+
+        for task, imported in zip(tasks, import_tasks(self._tw, tasks)):
+            if isinstance(imported, Exception):
+                results[task["uuid"]] = imported
+            else:
+                results[task["uuid"]] = None
+                self._items_cache[task["uuid"]] = imported
+
+        return results
 
     def add_item(self, item: ItemType) -> ItemType:
         """Add a new Item as a TW task.
@@ -154,31 +215,52 @@ class TaskWarriorCustomSide(SyncSide):
                       tasks (e.g., proj, tag, due). It is mandatory that it
                       contains the 'description' key for the task title
         """
-        item = cast(TaskwarriorRawItem, item)
-        assert "description" in item.keys(), "Item doesn't have a description."
-        assert (
-            "uuid" not in item.keys()
-        ), "Item already has a UUID, try updating it instead of adding it"
-
-        curr_status = item.get("status", None)
-        if curr_status not in ["pending", "done", "completed"]:
-            logger.warning(f'Invalid status of task [{item["status"]}], setting it to pending')  # type: ignore
-            item["status"] = "pending"
-
-        if self._sync_value:
-            item["sync"] = self._sync_value
-
-        item["tags"] = item.get("tags", []) + ["added_by_notion"]
-        description = item.pop("description")
-        new_item = self._tw.task_add(description=description, **item)  # type: ignore
-        new_id = new_item["id"]
-        len_print = min(20, len(description))
-        logger.debug(f'Task "{new_id}" created - "{description[0:len_print]}"...')
-
-        return cast(ItemType, new_item)
+        new_item = self.add_items([item])[0]
+        if isinstance(new_item, Exception):
+            raise new_item
+        return new_item
+
+    def add_items(self, items: Sequence[ItemType]) -> List[Union[ItemType, Exception]]:
+        """Add the given items with a single `task import`, assigning their UUIDs here."""
+        tasks = []
+        for item in items:
+            task = new_task(item)
+            if self._sync_value:
+                task["sync"] = self._sync_value
+            task["tags"] = task.get("tags", []) + ["added_by_notion"]
+            tasks.append(task)
+
+        new_items = import_tasks(self._tw, tasks)
+        for new_item in new_items:
+            if not isinstance(new_item, Exception):
+                self._items_cache[new_item["uuid"]] = new_item
+                logger.debug(
+                    f'Task "{new_item["uuid"]}" created - "{new_item["description"][0:20]}"...'
+                )
+
+        return cast(List[Union[ItemType, Exception]], new_items)
 
     def delete_single_item(self, item_id) -> None:
-        self._tw.task_delete(uuid=item_id)
+        err = self.delete_items([item_id])[item_id]
+        if err is not None:
+            raise err
+
+    def delete_items(self, item_ids: Sequence[str]) -> Dict[str, Optional[Exception]]:
+        """Delete the given tasks with a single `task <uuid>... delete`."""
+        results: Dict[str, Optional[Exception]] = {}
+        uuids = []
+        for item_id in item_ids:
+            if self.get_item(item_id) is None:
+                results[item_id] = ValueError(f"No task with UUID {item_id}")
+            else:
+                uuids.append(item_id)
+
+        for uuid_, err in delete_tasks(self._tw, uuids).items():
+            results[uuid_] = err
+            if err is None:
+                self._items_cache.pop(uuid_, None)
+
+        return results
 
     @classmethod
     def id_key(cls) -> str:
@@ -231,3 +313,17 @@ class TaskWarriorCustomSide(SyncSide):
                 item["modified"] = parse_datetime_(item["modified"])
 
         return SyncSide._items_are_identical(item1, item2, keys)
+
+    @classmethod
+    def fingerprint(cls, item: dict, ignore_keys: Sequence[str] = []) -> str:
+        keys = [
+            k for k in ["description", "due", "status", "uuid"] + UDAS if k not in ignore_keys
+        ]
+        item_ = {k: item[k] for k in keys if k in item}
+        if "uuid" in item_:
+            item_["uuid"] = str(item_["uuid"])
+
+        # annotations are always compared - a missing key is the same as an empty list
+        item_["annotations"] = item.get("annotations", [])
+
+        return SyncSide._fingerprint(item_, [*keys, "annotations"])
@@ -0,0 +1,311 @@
+import datetime
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from bubop import logger
+from taskw.fields import DateField, Field, NumericField
+from taskw.task import Task
+from taskw.taskrc import TaskRc
+from taskw.utils import DATE_FORMAT, decode_task
+
+# Database of Taskwarrior 3 - Taskwarrior 2 keeps its tasks in pending.data and completed.data
+TASKCHAMPION_DB = "taskchampion.sqlite3"
+
+# status of the loaded tasks -> group they're returned in, as in TaskWarrior.load_tasks
+_STATUS_GROUPS = {"pending": "pending", "waiting": "pending", "completed": "completed"}
+
+# Let SQLite memory-map the whole taskchampion database instead of read()-ing its pages
+_SQLITE_MMAP_SIZE = 1 << 30
+
+_INTEGER_RE = re.compile(r"-?\d+")
+
+# (path, mtime in ns, size) of each file, None for missing files
+FilesState = Tuple[Tuple[str, Optional[int], Optional[int]], ...]
+
+
+def task_fields(udas: Optional[Mapping[str, Field]] = None) -> Dict[str, Field]:
+    """Fields of the tasks of a database with the given user defined attributes."""
+    return {**Task.FIELDS, **(udas or {})}
+
+
+class LazyTask(MutableMapping):
+    """Task as exported by Taskwarrior, converting each field to Python on first access.
+
+    Stands in for the marshalled taskw Task. Most fields of most tasks are never read - e.g.,
+    comparing tasks only reads a handful of them - so the exported JSON values are kept as is
+    until needed.
+
+    Copies (copy.copy) are lazy as well. Pickled and deep-copied tasks are plain dicts.
+
+    Reads decode fields in place, so they may run concurrently with other reads of the same
+    task - e.g., from the listing and the writer threads - each field is decoded at most once
+    visibly. Concurrent writes to the same task need external synchronization, as with dicts.
+    """
+
+    __slots__ = ("_raw", "_decoded", "_fields")
+
+    def __init__(self, raw: Dict[str, Any], fields: Mapping[str, Field]):
+        """
+        :param raw: Exported task, owned by the LazyTask from then on
+        :param fields: Fields of the tasks of the database, see task_fields
+        """
+        # the keys of the two are disjoint - fields move to _decoded once accessed
+        self._raw = raw
+        self._decoded: Dict[str, Any] = {}
+        self._fields = fields
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._decoded[key]
+        except KeyError:
+            pass
+
+        try:
+            raw = self._raw[key]
+        except KeyError:
+            # decoded by another thread since the lookup above - or missing altogether
+            return self._decoded[key]
+
+        # decode before moving the field, so that it's kept as is if the conversion fails
+        value = Task._get_converter_for_field(key, fields=self._fields).deserialize(raw)
+        value = self._decoded.setdefault(key, value)
+        self._raw.pop(key, None)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._raw.pop(key, None)
+        self._decoded[key] = value
+
+    def __delitem__(self, key: str):
+        if key in self._decoded:
+            del self._decoded[key]
+        else:
+            del self._raw[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._decoded or key in self._raw
+
+    def __iter__(self) -> Iterator[str]:
+        # fields are added to _decoded before they're removed from _raw - listing _raw first,
+        # fields moved by concurrent reads meanwhile are in either or both of the lists
+        raw = list(self._raw)
+        decoded = list(self._decoded)
+        yield from decoded
+        decoded_keys = set(decoded)
+        yield from (key for key in raw if key not in decoded_keys)
+
+    def __len__(self) -> int:
+        return len(self._decoded) + len(self._raw.keys() - self._decoded.keys())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def copy(self) -> "LazyTask":
+        task = LazyTask(dict(self._raw), self._fields)
+        task._decoded = dict(self._decoded)
+        return task
+
+    __copy__ = copy
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def data_location(config: Mapping[str, Any]) -> Path:
+    """Directory of the data files of the given taskrc.
+
+    Like Taskwarrior, the TASKDATA environment variable overrides the data.location.
+    """
+    location = os.environ.get("TASKDATA") or config.get("data", {}).get("location", "~/.task")
+    return Path(location).expanduser()
+
+
+def data_files(location: Path) -> List[Path]:
+    """Files that hold the tasks of the database at the given data.location."""
+    taskchampion = location / TASKCHAMPION_DB
+    if taskchampion.is_file():
+        return [taskchampion, taskchampion.with_name(f"{TASKCHAMPION_DB}-wal")]
+
+    return [location / "pending.data", location / "completed.data"]
+
+
+def files_state(paths: Iterable[Path]) -> FilesState:
+    """Modification time and size of the given files - changes whenever one of them changes."""
+    state = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            state.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append((str(path), None, None))
+
+    return tuple(state)
+
+
+class TaskWarriorDataReader:
+    """Read the tasks of a Taskwarrior database directly off its data files.
+
+    Supports the pending.data and completed.data files of Taskwarrior 2 and the
+    taskchampion.sqlite3 database of Taskwarrior 3. The tasks are the same as the ones of
+    ``TaskWarrior(marshal=True).load_tasks()`` except for the urgency, which only Taskwarrior
+    computes.
+
+    The data files are only parsed again if their modification time or size changed since the
+    previous load.
+    """
+
+    def __init__(
+        self,
+        data_location: Path,
+        udas: Optional[Mapping[str, Any]] = None,
+        lazy: bool = False,
+    ):
+        """
+        :param data_location: Directory of the data files - data.location in the taskrc
+        :param udas: User defined attributes, as returned by TaskRc.get_udas
+        :param lazy: Return LazyTask instead of Task objects
+        """
+        self._data_location = data_location.expanduser()
+        self._udas = dict(udas or {})
+        self._lazy = lazy
+
+        self._fields = task_fields(self._udas)
+        self._date_keys = {k for k, f in self._fields.items() if isinstance(f, DateField)}
+        self._numeric_keys = {
+            k for k, f in self._fields.items() if isinstance(f, NumericField)
+        }
+
+        self._tasks: Optional[Dict[str, List[Union[Task, LazyTask]]]] = None
+        self._cache_key: Optional[FilesState] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config_file(cls, config_file: Path, **kargs) -> "TaskWarriorDataReader":
+        """Create a reader for the database of the given taskrc."""
+        config = TaskRc(str(config_file))
+        return cls(data_location(config), udas=config.get_udas(), **kargs)
+
+    @property
+    def data_files(self) -> List[Path]:
+        return data_files(self._data_location)
+
+    def load_tasks(self) -> Dict[str, List[Union[Task, LazyTask]]]:
+        """Return the completed and pending tasks, parsing the data files if they changed.
+
+        The returned tasks are shared - copy them before modifying them.
+        """
+        with self._lock:
+            # computed before reading - changes made while reading are picked up next time
+            cache_key = files_state(self.data_files)
+            if self._tasks is not None and cache_key == self._cache_key:
+                logger.debug("Taskwarrior data files unchanged, reusing the loaded tasks")
+                return self._tasks
+
+            self._tasks = {"pending": [], "completed": []}
+            for raw_task, id_ in self._read_raw_tasks():
+                group = _STATUS_GROUPS.get(raw_task.get("status", ""))
+                if group is not None:
+                    self._tasks[group].append(
+                        self._to_task(raw_task, id_ if group == "pending" else 0)
+                    )
+            self._cache_key = cache_key
+
+            return self._tasks
+
+    def _read_raw_tasks(self) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Yield the attributes of every task, as stored in the data files, and its ID."""
+        taskchampion = self._data_location / TASKCHAMPION_DB
+        if taskchampion.is_file():
+            yield from self._read_taskchampion(taskchampion)
+        else:
+            yield from self._read_data_file(self._data_location / "pending.data")
+            yield from self._read_data_file(self._data_location / "completed.data")
+
+    @staticmethod
+    def _read_data_file(path: Path) -> Iterator[Tuple[Dict[str, Any], int]]:
+        # empty files can't be memory-mapped
+        if not path.is_file() or path.stat().st_size == 0:
+            return
+
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # the ID of a pending task is its line in pending.data
+            for line_no, line in enumerate(iter(mm.readline, b""), start=1):
+                line = line.strip()
+                if line:
+                    yield decode_task(line.decode("utf-8")), line_no
+
+    @staticmethod
+    def _read_taskchampion(path: Path) -> Iterator[Tuple[Dict[str, Any], int]]:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            conn.execute(f"PRAGMA mmap_size={_SQLITE_MMAP_SIZE}")
+            ids = {uuid: id_ for id_, uuid in conn.execute("SELECT id, uuid FROM working_set")}
+            for uuid, data in conn.execute("SELECT uuid, data FROM tasks"):
+                raw_task = json.loads(data)
+                raw_task["uuid"] = uuid
+                yield raw_task, ids.get(uuid, 0)
+        finally:
+            conn.close()
+
+    def _to_task(self, raw_task: Mapping[str, Any], id_: int) -> Union[Task, LazyTask]:
+        """Convert the stored attributes of a task to the ones of `task export`."""
+        task: Dict[str, Any] = {"id": id_}
+        tags: List[str] = []
+        depends: List[str] = []
+        annotations = []
+        for key, value in raw_task.items():
+            if key.startswith("annotation_"):
+                annotations.append((int(key[len("annotation_") :]), value))
+            elif key.startswith("tag_"):
+                tags.append(key[len("tag_") :])
+            elif key.startswith("dep_"):
+                depends.append(key[len("dep_") :])
+            elif key == "tags":
+                tags.extend(value if isinstance(value, list) else value.split(","))
+            elif key == "depends":
+                depends.extend(value.split(","))
+            elif key in self._date_keys:
+                task[key] = _format_date(value)
+            elif key in self._numeric_keys:
+                task[key] = int(value) if _INTEGER_RE.fullmatch(value) else float(value)
+            else:
+                task[key] = value
+
+        if tags:
+            task["tags"] = list(dict.fromkeys(tag for tag in tags if tag))
+        if depends:
+            task["depends"] = list(dict.fromkeys(uuid for uuid in depends if uuid))
+        if annotations:
+            task["annotations"] = [
+                {"entry": _format_date(entry), "description": description}
+                for entry, description in sorted(annotations)
+            ]
+
+        if self._lazy:
+            return LazyTask(task, self._fields)
+
+        return Task(task, udas=self._udas)
+
+
+def _format_date(epoch) -> str:
+    """Convert the epoch timestamps of the data files to the date format of `task export`."""
+    return datetime.datetime.fromtimestamp(int(epoch), tz=datetime.timezone.utc).strftime(
+        DATE_FORMAT
+    )
@@ -0,0 +1,89 @@
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from bubop import logger
+from bubop.common_dir import CommonDir
+from taskw.taskrc import TaskRc
+
+from taskwarrior_syncall.app_utils import app_name
+from taskwarrior_syncall.taskwarrior_data import data_files, data_location, files_state
+
+# Tasks as exported by `task export`, before marshalling them
+ExportedTasks = List[Dict[str, Any]]
+
+
+class TaskWarriorExportCache:
+    """Snapshot of the latest full export of a Taskwarrior database, shared across processes.
+
+    E.g., when tw_gcal_sync, tw_notion_sync and tw_asana_sync run back to back against the same
+    taskrc, only the first one exports the tasks, as long as the database doesn't change in
+    between.
+
+    The snapshot is a pickle of the exported tasks under the cache directory of the app, one per
+    taskrc. It's valid while the modification times and sizes of the taskrc and the data files
+    are the same as when exporting. Processes hold an exclusive lock while checking, exporting
+    and writing the snapshot, so only one of them exports at a time.
+    """
+
+    def __init__(self, config_file: Path, cache_dir: Optional[Path] = None):
+        """
+        :param config_file: Path to the taskwarrior RC file
+        :param cache_dir: Directory of the snapshots - defaults to the cache directory of the
+            app
+        """
+        self._config_file = Path(config_file).expanduser().resolve()
+        self._data_location = data_location(TaskRc(str(self._config_file)))
+        if cache_dir is None:
+            cache_dir = CommonDir.cache() / app_name() / "tw_exports"
+
+        digest = hashlib.sha1(str(self._config_file).encode()).hexdigest()[:16]
+        self._path = cache_dir / f"{digest}.pickle"
+        self._lock_path = cache_dir / f"{digest}.lock"
+
+    def __str__(self) -> str:
+        return str(self._path)
+
+    def load_tasks(self, export: Callable[[], ExportedTasks]) -> ExportedTasks:
+        """Return the tasks of the snapshot if it's still valid - export them via the given
+        function and snapshot them otherwise.
+        """
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock_path.open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            # taken before exporting - changes made while exporting invalidate the snapshot
+            state = files_state([self._config_file, *data_files(self._data_location)])
+            snapshot = self._read()
+            if snapshot is not None and snapshot["state"] == state:
+                logger.debug(f"Reusing the Taskwarrior export snapshot {self}")
+                return snapshot["tasks"]
+
+            tasks = export()
+            self._write({"state": state, "tasks": tasks})
+            return tasks
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            with self._path.open("rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.opt(exception=True).warning(f"Ignoring corrupt export snapshot {self}")
+            return None
+
+    def _write(self, snapshot: Dict[str, Any]):
+        # readers never see a partially written snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,190 @@
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Set, Tuple
+
+from bubop import logger
+
+# Hook that appends every added/modified task to the journal - see install_hooks
+HOOK_SCRIPT = Path(__file__).parent / "res" / "tw_change_journal_hook.py"
+
+# Journal in the data.location of the database - kept in sync with HOOK_SCRIPT
+JOURNAL_FNAME = "syncall_changes.journal"
+_HEADER_PREFIX = "# journal "
+
+# Filenames of the installed hooks - Taskwarrior runs the executables of its hooks directory
+# whose names start with the event
+HOOK_FNAMES = ("on-add-syncall.py", "on-modify-syncall.py")
+
+
+def install_hooks(hooks_dir: Path) -> List[Path]:
+    """Install the on-add and on-modify hooks that journal the changes of the database.
+
+    :param hooks_dir: The hooks directory of Taskwarrior, e.g., ~/.task/hooks
+    :returns: The paths of the installed hooks
+    """
+    hooks_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for fname in HOOK_FNAMES:
+        path = hooks_dir / fname
+        shutil.copyfile(HOOK_SCRIPT, path)
+        path.chmod(0o755)
+        paths.append(path)
+
+    return paths
+
+
+def _last_line(f: BinaryIO) -> Tuple[bytes, int]:
+    """Return the last complete line of the given file, without the newline, and its offset."""
+    end = f.seek(0, os.SEEK_END)
+    start = end
+    data = b""
+    while start > 0 and data.count(b"\n") < 2:
+        start = max(start - 4096, 0)
+        f.seek(start)
+        data = f.read(end - start)
+
+    # the last line may be still being written, skip it unless terminated
+    complete_end = data.rfind(b"\n") + 1
+    if complete_end == 0:
+        return b"", start
+
+    line_start = data.rfind(b"\n", 0, complete_end - 1) + 1
+    return data[line_start : complete_end - 1], start + line_start
+
+
+class ChangeJournal:
+    """Reader of the journal of the changes of a Taskwarrior database.
+
+    The journal is appended to by the hooks of :py:func:`install_hooks`, one line per added or
+    modified task with a sequence number, the UUID and the modification time of the task. Once
+    it grows large, the hooks drop its oldest entries.
+
+    Positions in the journal are opaque strings, they include the ID of the journal so that a
+    deleted and recreated journal is not mistaken for the same one, and the offset of their
+    entry, so that only the entries after them are read.
+
+    Changes that Taskwarrior doesn't run hooks for - e.g., the ones pulled by `task sync` - are
+    not journaled.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+
+    def __str__(self) -> str:
+        return str(self._path)
+
+    def _open(self) -> Optional[BinaryIO]:
+        try:
+            return self._path.open("rb")
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read_id(f: BinaryIO) -> Optional[str]:
+        """Read the ID of the journal, leaving the file right after the header."""
+        f.seek(0)
+        header = f.readline().decode(errors="replace")
+        if not header.startswith(_HEADER_PREFIX) or not header.endswith("\n"):
+            return None
+
+        return header[len(_HEADER_PREFIX) : -1]
+
+    def position(self) -> Optional[str]:
+        """Current position of the journal - None if missing or malformed.
+
+        Only reads the header and the last entry of the journal.
+        """
+        f = self._open()
+        if f is None:
+            return None
+
+        with f:
+            journal_id = self._read_id(f)
+            if journal_id is None:
+                return None
+
+            header_end = f.tell()
+            last_line, offset = _last_line(f)
+
+        seq = 0
+        if offset >= header_end:
+            try:
+                seq = int(last_line.split(b" ", 1)[0])
+            except ValueError:
+                return None
+
+        return f"{journal_id}:{seq}:{offset}"
+
+    def _read_entries_after(self, f: BinaryIO, seq: int, offset: Optional[int]) -> List[str]:
+        """Read the entries after the given one - all the entries if it's not at the offset."""
+        header_end = f.tell()
+        if seq != 0 and offset is not None and offset >= header_end:
+            f.seek(offset - 1)
+            preceding, line = f.read(1), f.readline()
+            # sequence numbers are unique within a journal, the entry is at the offset if a line
+            # starting there has its number - otherwise, e.g., the journal was compacted since
+            if preceding != b"\n" or not line.startswith(f"{seq} ".encode()):
+                f.seek(header_end)
+        else:
+            f.seek(header_end)
+
+        # the last line may be still being written, skip it unless terminated
+        return f.read().decode(errors="replace").split("\n")[:-1]
+
+    def changed_uuids(self, since: str) -> Optional[Set[str]]:
+        """Return the UUIDs of the tasks changed after the given position.
+
+        :returns: None if the changes are unknown, i.e., the journal is missing, it's a different
+                  journal than the one of the position, or it has a gap after the position -
+                  e.g., its entries after the position were dropped
+        """
+        since_id, *rest = since.split(":")
+        try:
+            since_seq = int(rest[0])
+            since_offset = int(rest[1]) if len(rest) > 1 else None
+        except (ValueError, IndexError):
+            logger.warning(
+                f"Ignoring invalid position of change journal {self._path}: {since}"
+            )
+            return None
+
+        f = self._open()
+        if f is None:
+            logger.debug(f"No change journal at {self._path}")
+            return None
+
+        with f:
+            journal_id = self._read_id(f)
+            if journal_id is None:
+                logger.debug(f"No change journal at {self._path}")
+                return None
+
+            if since_id != journal_id:
+                logger.debug(f"Change journal {self._path} was recreated since {since}")
+                return None
+
+            entries = self._read_entries_after(f, since_seq, since_offset)
+
+        expected_seq = since_seq + 1
+        uuids = set()
+        # entries are in order, skip the ones up to the position
+        for entry in entries:
+            parts = entry.split(" ")
+            try:
+                seq = int(parts[0])
+                task_uuid = parts[1]
+            except (ValueError, IndexError):
+                logger.warning(f"Malformed entry in change journal {self._path}: {entry}")
+                return None
+
+            if seq < expected_seq:
+                continue
+            if seq != expected_seq:
+                logger.warning(f"Gap in change journal {self._path} after position {since}")
+                return None
+
+            uuids.add(task_uuid)
+            expected_seq += 1
+
+        return uuids
@@ -1,14 +1,42 @@
 import datetime
+import json
+import tempfile
+import threading
+import uuid
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Sequence, Set, Union, cast
-from uuid import UUID
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+    cast,
+)
 
 from bubop import logger, parse_datetime
+from bubop.time import assume_local_tz_if_none
 from taskw import TaskWarrior
+from taskw.fields import DateField
+from taskw.task import Task
 from taskw.warrior import TASKRC
 
 from taskwarrior_syncall.sync_side import ItemType, SyncSide
+from taskwarrior_syncall.taskwarrior_data import (
+    LazyTask,
+    TaskWarriorDataReader,
+    data_location,
+    task_fields,
+)
+from taskwarrior_syncall.taskwarrior_export_cache import ExportedTasks, TaskWarriorExportCache
+from taskwarrior_syncall.taskwarrior_journal import JOURNAL_FNAME, ChangeJournal
+from taskwarrior_syncall.taskwarrior_store import TaskStore
 from taskwarrior_syncall.types import TaskwarriorRawItem
+from taskwarrior_syncall.utils import chunked
 
 OrderByType = Literal[
     "description",
@@ -21,6 +49,25 @@ OrderByType = Literal[
 ]
 
 
+# Maximum number of tasks to add or update with a single `task import`
+TASK_IMPORT_MAX_TASKS = 1000
+
+# Maximum number of tasks to delete with a single `task <uuid>... delete` - keeps the command
+# line well within the argument limits of the OS
+TASK_DELETE_MAX_TASKS = 200
+
+# Maximum number of tasks to fetch with a single `task <uuid>... export`
+TASK_EXPORT_MAX_TASKS = 200
+
+# Filter for the statuses of the exported tasks - the same as the ones of
+# TaskWarrior.load_tasks
+_STATUSES = ("pending", "waiting", "completed")
+_STATUS_FILTER = ["(", "status:pending", "or", "status:waiting", "or", "status:completed", ")"]
+
+# Keys that Taskwarrior computes on its own
+_COMPUTED_KEYS = ("id", "urgency")
+
+
 def parse_datetime_(dt: Union[str, datetime.datetime]) -> datetime.datetime:
     if isinstance(dt, datetime.datetime):
         return dt
@@ -28,6 +75,245 @@ def parse_datetime_(dt: Union[str, datetime.datetime]) -> datetime.datetime:
         return parse_datetime(dt)
 
 
+def export_filter(
+    tags: Iterable[str] = (),
+    project: str = "",
+    ended_after: Optional[datetime.datetime] = None,
+    **attributes: str,
+) -> List[str]:
+    """Taskwarrior filter for the tasks with all the given tags, project and attribute values,
+    e.g., of UDAs.
+
+    Like TaskWarrior.load_tasks, only pending, waiting and completed tasks are included.
+
+    :param ended_after: Only include the completed tasks that ended after this date
+    """
+
+    def quote(value: str) -> str:
+        return f"'{value}'" if any(c.isspace() for c in value) else value
+
+    args = [f"+{tag}" for tag in sorted(tags)]
+    if project:
+        args.append(f"project:{quote(project)}")
+    args.extend(f"{key}:{quote(value)}" for key, value in sorted(attributes.items()))
+    if ended_after is None:
+        return [*args, *_STATUS_FILTER]
+
+    end = DateField().serialize(ended_after)
+    return [
+        *args,
+        *["(", "status:pending", "or", "status:waiting", "or"],
+        *["(", "status:completed", "and", f"end.after:{end}", ")", ")"],
+    ]
+
+
+def export_tasks(tw: TaskWarrior, *args: str, lazy: bool = False) -> List[TaskwarriorRawItem]:
+    """Run `task <args> export`.
+
+    :param lazy: Return LazyTask objects, that convert their fields on first access, instead of
+        marshalled Task ones
+    """
+    return marshal_tasks(tw, tw._get_json(*args, "export"), lazy=lazy)
+
+
+def marshal_tasks(
+    tw: TaskWarrior, tasks: ExportedTasks, lazy: bool = False
+) -> List[TaskwarriorRawItem]:
+    """Convert the given exported tasks to Task objects - LazyTask ones if lazy."""
+    if not lazy:
+        return [tw._get_task_object(task) for task in tasks]
+
+    fields = task_fields(tw.config.get_udas())
+    return [LazyTask(task, fields) for task in tasks]
+
+
+def new_task(item: Mapping[str, Any]) -> Dict[str, Any]:
+    """Complete an item to add with the keys that Taskwarrior would set on `task add`.
+
+    The UUID is assigned here, so that the task can be added with `task import` - see
+    :py:func:`import_tasks`.
+    """
+    assert "description" in item.keys(), "Item doesn't have a description."
+    assert (
+        "uuid" not in item.keys()
+    ), "Item already has a UUID, try updating it instead of adding it"
+
+    task = dict(item)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    task["uuid"] = str(uuid.uuid4())
+    task["description"] = task["description"].strip()
+    task.setdefault("entry", now)
+    task["modified"] = now
+
+    if task.get("status") not in ["pending", "done", "completed"]:
+        logger.warning(f'Invalid status of task [{task.get("status")}], setting it to pending')
+        task["status"] = "pending"
+    if task["status"] == "done":
+        task["status"] = "completed"
+    if task["status"] == "completed":
+        task.setdefault("end", now)
+
+    return task
+
+
+def updated_task(task: Mapping[str, Any], changes: Mapping[str, Any]) -> Dict[str, Any]:
+    """Apply the given changes to a task, for updating it with `task import`."""
+    updated = {**task, **changes}
+    updated["uuid"] = str(task["uuid"])
+    updated["modified"] = datetime.datetime.now(datetime.timezone.utc)
+
+    # keep the entry date of the annotations that are already there
+    if "annotations" in changes:
+        existing = {str(annotation): annotation for annotation in task.get("annotations", [])}
+        updated["annotations"] = [
+            existing.get(str(annotation), annotation) for annotation in changes["annotations"]
+        ]
+
+    return updated
+
+
+def serialize_for_import(task: Mapping[str, Any], udas: Mapping) -> Dict[str, Any]:
+    """Serialize a task to the JSON format of `task import`."""
+    serialized = Task.from_stub(
+        {k: v for k, v in task.items() if k not in _COMPUTED_KEYS}, udas=udas
+    ).serialized()
+
+    # taskw serializes annotations to plain strings, `task import` expects their entry date
+    now = datetime.datetime.now(datetime.timezone.utc)
+    serialized["annotations"] = [
+        {
+            "entry": DateField().serialize(getattr(annotation, "entry", None) or now),
+            "description": str(annotation),
+        }
+        for annotation in task.get("annotations", [])
+    ]
+
+    return {k: v for k, v in serialized.items() if v not in (None, "", [])}
+
+
+def import_tasks(
+    tw: TaskWarrior, tasks: Sequence[Mapping[str, Any]]
+) -> List[Union[TaskwarriorRawItem, Exception]]:
+    """Add or update the given tasks with a single `task import`.
+
+    The tasks are identified by their UUID, so importing a task again has no further effect.
+    If the import fails, import the tasks one by one to find out which ones failed.
+
+    :returns: For each task, the task as it would be exported after the import, or the
+              exception that the import of the task raised
+    """
+    udas = tw.config.get_udas()
+    serialized = [serialize_for_import(task, udas=udas) for task in tasks]
+
+    def import_(tasks: Sequence[Dict[str, Any]]):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(tasks, f)
+            f.flush()
+            tw._execute("import", f.name)
+
+    results: List[Optional[Exception]] = [None] * len(serialized)
+    try:
+        import_(serialized)
+    except Exception as err:
+        if len(serialized) == 1:
+            results = [err]
+        else:
+            logger.warning(
+                f"Failed to import {len(serialized)} tasks at once, importing them one by one"
+            )
+            for i, task in enumerate(serialized):
+                try:
+                    import_([task])
+                except Exception as err:
+                    results[i] = err
+
+    imported: List[Union[TaskwarriorRawItem, Exception]] = []
+    for task, err in zip(serialized, results):
+        if err is not None:
+            imported.append(err)
+            continue
+
+        item = dict(Task(task, udas=udas))
+        item["uuid"] = str(item["uuid"])
+        imported.append(cast(TaskwarriorRawItem, item))
+
+    return imported
+
+
+def delete_tasks(tw: TaskWarrior, uuids: Sequence[str]) -> Dict[str, Optional[Exception]]:
+    """Delete the given tasks with a single `task <uuid>... delete` per chunk of them.
+
+    If a command fails, delete the tasks of its chunk one by one to find out which ones failed.
+
+    :returns: The exception raised for each task that couldn't be deleted, None for the rest
+    """
+
+    def delete(uuids: Sequence[str]):
+        tw._execute("rc.confirmation=off", "rc.bulk=0", *uuids, "delete")
+
+    results: Dict[str, Optional[Exception]] = {}
+    for chunk in chunked(uuids, TASK_DELETE_MAX_TASKS):
+        try:
+            delete(chunk)
+            results.update((uuid_, None) for uuid_ in chunk)
+        except Exception as err:
+            if len(chunk) == 1:
+                results[chunk[0]] = err
+                continue
+
+            logger.warning(
+                f"Failed to delete {len(chunk)} tasks at once, deleting them one by one"
+            )
+            for uuid_ in chunk:
+                try:
+                    delete([uuid_])
+                    results[uuid_] = None
+                except Exception as err:
+                    results[uuid_] = err
+
+    return results
+
+
+class TaskWarriorExport:
+    """Export of all the tasks of a Taskwarrior database, shared by multiple sides.
+
+    The tasks are exported on first use and reused until :py:meth:`invalidate` is called, e.g.,
+    by sides that synchronize different filters of the same database.
+    """
+
+    def __init__(self, config_file: Optional[Path] = Path(TASKRC), lazy: bool = False):
+        """
+        :param config_file: Path to the taskwarrior RC file
+        :param lazy: Export LazyTask objects instead of marshalled Task ones
+        """
+        self._tw = TaskWarrior(marshal=True, config_filename=config_file)
+        self._lazy = lazy
+        self._tasks: Optional[Dict[str, List[TaskwarriorRawItem]]] = None
+        self._lock = threading.Lock()
+
+    def load_tasks(self) -> Dict[str, List[TaskwarriorRawItem]]:
+        """Return the completed and pending tasks, exporting them if necessary.
+
+        The returned tasks are shared - copy them before modifying them.
+        """
+        with self._lock:
+            if self._tasks is None and self._lazy:
+                self._tasks = {
+                    "pending": export_tasks(
+                        self._tw, "(", "status:pending", "or", "status:waiting", ")", lazy=True
+                    ),
+                    "completed": export_tasks(self._tw, "status:completed", lazy=True),
+                }
+            elif self._tasks is None:
+                self._tasks = self._tw.load_tasks()  # type: ignore
+
+            return self._tasks  # type: ignore
+
+    def invalidate(self):
+        with self._lock:
+            self._tasks = None
+
+
 class TaskWarriorSide(SyncSide):
     """Handles interaction with the TaskWarrior client."""
 
@@ -35,25 +321,66 @@ class TaskWarriorSide(SyncSide):
     SUMMARY_KEY = "description"
     LAST_MODIFICATION_KEY = "modified"
 
+    max_add_batch_size = TASK_IMPORT_MAX_TASKS
+    max_update_batch_size = TASK_IMPORT_MAX_TASKS
+    max_delete_batch_size = TASK_DELETE_MAX_TASKS
+
     def __init__(
         self,
         tags: Sequence[str] = [],
         project: Optional[str] = None,
         config_file: Optional[Path] = Path(TASKRC),
+        export: Optional[TaskWarriorExport] = None,
+        read_data_files: bool = False,
+        use_change_journal: bool = False,
+        lazy_tasks: bool = False,
+        cache_export: bool = False,
         **kargs,
     ):
         """
         :param tags: List of tags that all fetched and submitted tasks should have
         :param project: project identifier that all fetched and submitted tasks should have
         :param config_file: Path to the taskwarrior RC file
+        :param export: Export of the tasks of the same database, shared with other sides
+        :param read_data_files: Read the tasks directly off the data files instead of running
+            `task export`
+        :param use_change_journal: Only fetch the tasks that changed since the previous
+            synchronization, as journaled by the hooks of install_hooks
+        :param lazy_tasks: Convert the fields of the exported tasks to Python objects on first
+            access, instead of converting all of them upfront
+        :param cache_export: Reuse the snapshot of the latest full export of the database,
+            shared with other processes, while the database is unchanged
         """
         super().__init__(name="Tw", fullname="Taskwarrior", **kargs)
         self._tags: Set[str] = set(tags)
         self._project: str = project or ""
         self._tw = TaskWarrior(marshal=True, config_filename=config_file)
+        self._export = export
+        self._lazy_tasks = lazy_tasks
+        self._export_cache: Optional[TaskWarriorExportCache] = None
+        if cache_export:
+            self._export_cache = TaskWarriorExportCache(config_file or Path(TASKRC))
+        self._data_reader: Optional[TaskWarriorDataReader] = None
+        if read_data_files:
+            self._data_reader = TaskWarriorDataReader.from_config_file(
+                config_file or Path(TASKRC), lazy=lazy_tasks
+            )
+
+        self._change_journal: Optional[ChangeJournal] = None
+        if use_change_journal:
+            self._change_journal = ChangeJournal(
+                data_location(self._tw.config) / JOURNAL_FNAME
+            )
+        # position of the change journal before the latest listing - tasks changed while
+        # listing are listed again in the next run
+        self._listing_position: Optional[str] = None
 
         # All TW tasks
-        self._items_cache: Dict[str, TaskwarriorRawItem] = {}
+        self._store = TaskStore()
+
+        # Writes of concurrent batches - e.g., with max_parallel_writes > 1 - are serialized:
+        # they all run against the same data files and update the same store
+        self._write_lock = threading.Lock()
 
         # Whether to refresh the cached list of items
         self._reload_items = True
@@ -70,13 +397,37 @@ class TaskWarriorSide(SyncSide):
         if not self._reload_items:
             return
 
-        tasks = self._tw.load_tasks()
-        items = [*tasks["completed"], *tasks["pending"]]
-        self._items_cache: Dict[str, TaskwarriorRawItem] = {  # type: ignore
-            str(item["uuid"]): item for item in items
-        }
+        if self._change_journal is not None:
+            self._listing_position = self._change_journal.position()
+        if self._data_reader is not None:
+            # parsed again only if the data files changed, filter it below
+            tasks = self._data_reader.load_tasks()
+            items = [item.copy() for item in (*tasks["completed"], *tasks["pending"])]
+        elif self._export_cache is not None:
+            # full export, shared with other processes, filter it below
+            tasks = self._export_cache.load_tasks(
+                lambda: self._tw._get_json(*export_filter(), "export")
+            )
+            items = marshal_tasks(self._tw, tasks, lazy=self._lazy_tasks)
+        elif self._export is None:
+            # only export the tasks that are synchronized
+            items = export_tasks(
+                self._tw,
+                *export_filter(
+                    tags=self._tags, project=self._project, ended_after=self._horizon_start
+                ),
+                lazy=self._lazy_tasks,
+            )
+        else:
+            # the export is shared with sides of other filters, filter it below
+            tasks = self._export.load_tasks()
+            items = [item.copy() for item in (*tasks["completed"], *tasks["pending"])]
+        self._store.load(items)
         self._reload_items = False
 
+    def invalidate_cache(self):
+        self._reload_items = True
+
     def get_all_items(
         self,
         skip_completed=False,
@@ -95,34 +446,69 @@ class TaskWarriorSide(SyncSide):
         :raises: ValueError in case the order_by key is invalid
         """
         self._load_all_items()
-        tasks = list(self._items_cache.values())
-        if skip_completed:
-            tasks = [t for t in tasks if t["status"] != "completed"]
-
-        # filter the tasks based on their tags and their project ------------------------------
-        if self._tags:
-            tasks = [t for t in tasks if self._tags.issubset(t.get("tags", []))]
-        if self._project:
-            tasks = [t for t in tasks if t.get("project", "") == self._project]
-
-        for task in tasks:
-            task["uuid"] = str(task["uuid"])
+        statuses = [s for s in _STATUSES if not (skip_completed and s == "completed")]
+        return self._store.select(
+            statuses,
+            tags=self._tags,
+            project=self._project,
+            order_by=order_by,
+            reverse=not use_ascending_order,
+            ended_after=self._horizon_start,
+        )
 
-        if order_by is not None:
-            tasks.sort(key=lambda t: t[kargs["order_by"]], reverse=not use_ascending_order)  # type: ignore
+    @classmethod
+    def finished_at(cls, item: ItemType) -> Optional[datetime.datetime]:
+        return item.get("end") if item["status"] == "completed" else None
 
-        return tasks  # type: ignore
+    def _is_synchronized(self, task: TaskwarriorRawItem) -> bool:
+        """Whether the given task has the status, the tags and the project of the side and
+        whether it's within the horizon.
+        """
+        finished_at = self.finished_at(task)
+        return (
+            task["status"] in _STATUSES
+            and self._tags.issubset(task.get("tags", []))
+            and (not self._project or task.get("project", "") == self._project)
+            and (
+                self._horizon_start is None
+                or finished_at is None
+                or assume_local_tz_if_none(finished_at) >= self._horizon_start
+            )
+        )
+
+    def change_journal_position(self) -> Optional[str]:
+        return self._listing_position
+
+    def get_changed_items(
+        self, since: str
+    ) -> Optional[Dict[str, Optional[TaskwarriorRawItem]]]:
+        """Export the tasks journaled as changed after the given position."""
+        if self._change_journal is None:
+            return None
+
+        self._listing_position = self._change_journal.position()
+        uuids = self._change_journal.changed_uuids(since)
+        if uuids is None:
+            return None
+
+        changed: Dict[str, Optional[TaskwarriorRawItem]] = dict.fromkeys(uuids)
+        for chunk in chunked(sorted(uuids), TASK_EXPORT_MAX_TASKS):
+            for task in export_tasks(self._tw, *chunk, lazy=self._lazy_tasks):
+                self._store.upsert(task)
+                if self._is_synchronized(task):
+                    changed[task["uuid"]] = task
+
+        return changed
 
     def get_item(self, item_id: str, use_cached: bool = True) -> Optional[TaskwarriorRawItem]:
-        item = self._items_cache.get(item_id)
+        item = self._store.get(item_id)
         if not use_cached or item is None:
             item = self._tw.get_task(id=item_id)[-1]
             if item is None:
                 return None
 
             # amend cache
-            self._items_cache[str(item["uuid"])] = item  # type: ignore
-        item["uuid"] = str(item["uuid"])
+            self._store.upsert(item)  # type: ignore
         return item if item["status"] != "deleted" else None  # type: ignore
 
     def update_item(self, item_id: str, **changes):
@@ -130,20 +516,33 @@ class TaskWarriorSide(SyncSide):
 
         :raises ValaueError: In case the item is not present in the db
         """
-        changes.pop("id", False)
-        t = self._tw.get_task(uuid=UUID(item_id))[-1]
-
-        # task CLI doesn't allow `imask`
-        unwanted_keys = ["imask", "recur", "rtype", "parent", "urgency"]
-        for i in unwanted_keys:
-            t.pop(i, False)
-
-        # taskwarrior doesn't let you explicitly set the update time.
-        # even if you set it it will revert to the time  that you call
-        # `tw.task_update`
-        d = dict(t)
-        d.update(changes)
-        self._tw.task_update(d)
+        err = self.update_items({item_id: changes})[item_id]
+        if err is not None:
+            raise err
+
+    def update_items(self, changes: Mapping[str, ItemType]) -> Dict[str, Optional[Exception]]:
+        """Update the given tasks with a single `task import`."""
+        with self._write_lock:
+            return self._update_items(changes)
+
+    def _update_items(self, changes: Mapping[str, ItemType]) -> Dict[str, Optional[Exception]]:
+        results: Dict[str, Optional[Exception]] = {}
+        tasks = []
+        for item_id, item_changes in changes.items():
+            task = self.get_item(item_id)
+            if task is None:
+                results[item_id] = ValueError(f"No task with UUID {item_id}")
+                continue
+            tasks.append(updated_task(task, item_changes))
+
+        for task, imported in zip(tasks, import_tasks(self._tw, tasks)):
+            if isinstance(imported, Exception):
+                results[task["uuid"]] = imported
+            else:
+                results[task["uuid"]] = None
+                self._store.upsert(imported)
+
+        return results
 
     def add_item(self, item: ItemType) -> ItemType:
         """Add a new Item as a TW task.
@@ -152,32 +551,61 @@ class TaskWarriorSide(SyncSide):
                       tasks (e.g., proj, tag, due). It is mandatory that it
                       contains the 'description' key for the task title
         """
-        item = cast(TaskwarriorRawItem, item)
-        assert "description" in item.keys(), "Item doesn't have a description."
-        assert (
-            "uuid" not in item.keys()
-        ), "Item already has a UUID, try updating it instead of adding it"
-
-        curr_status = item.get("status", None)
-        if curr_status not in ["pending", "done", "completed"]:
-            logger.warning(f'Invalid status of task [{item["status"]}], setting it to pending')  # type: ignore
-            item["status"] = "pending"
-
-        if self._tags:
-            item["tags"] = list(self._tags.union(item.get("tags", {})))
-        if self._project:
-            item["project"] = self._project
-
-        description = item.pop("description")
-        new_item = self._tw.task_add(description=description, **item)  # type: ignore
-        new_id = new_item["id"]
-        len_print = min(20, len(description))
-        logger.debug(f'Task "{new_id}" created - "{description[0:len_print]}"...')
-
-        return cast(ItemType, new_item)
+        new_item = self.add_items([item])[0]
+        if isinstance(new_item, Exception):
+            raise new_item
+        return new_item
+
+    def add_items(self, items: Sequence[ItemType]) -> List[Union[ItemType, Exception]]:
+        """Add the given items with a single `task import`, assigning their UUIDs here."""
+        with self._write_lock:
+            return self._add_items(items)
+
+    def _add_items(self, items: Sequence[ItemType]) -> List[Union[ItemType, Exception]]:
+        tasks = []
+        for item in items:
+            task = new_task(item)
+            if self._tags:
+                task["tags"] = list(self._tags.union(task.get("tags", {})))
+            if self._project:
+                task["project"] = self._project
+            tasks.append(task)
+
+        new_items = import_tasks(self._tw, tasks)
+        for new_item in new_items:
+            if not isinstance(new_item, Exception):
+                self._store.upsert(new_item)
+                logger.debug(
+                    f'Task "{new_item["uuid"]}" created - "{new_item["description"][0:20]}"...'
+                )
+
+        return cast(List[Union[ItemType, Exception]], new_items)
 
     def delete_single_item(self, item_id) -> None:
-        self._tw.task_delete(uuid=item_id)
+        err = self.delete_items([item_id])[item_id]
+        if err is not None:
+            raise err
+
+    def delete_items(self, item_ids: Sequence[str]) -> Dict[str, Optional[Exception]]:
+        """Delete the given tasks with a single `task <uuid>... delete`."""
+        with self._write_lock:
+            return self._delete_items(item_ids)
+
+    def _delete_items(self, item_ids: Sequence[str]) -> Dict[str, Optional[Exception]]:
+        results: Dict[str, Optional[Exception]] = {}
+        uuids = []
+        for item_id in item_ids:
+            if self.get_item(item_id) is None:
+                results[item_id] = ValueError(f"No task with UUID {item_id}")
+            else:
+                uuids.append(item_id)
+
+        for uuid_, err in delete_tasks(self._tw, uuids).items():
+            results[uuid_] = err
+            if err is None:
+                self._store.remove(uuid_)
+
+        return results
 
     @classmethod
     def id_key(cls) -> str:
@@ -229,3 +657,15 @@ class TaskWarriorSide(SyncSide):
                 item["modified"] = parse_datetime_(item["modified"])
 
         return SyncSide._items_are_identical(item1, item2, keys)
+
+    @classmethod
+    def fingerprint(cls, item: dict, ignore_keys: Sequence[str] = []) -> str:
+        keys = [k for k in ["description", "due", "status", "uuid"] if k not in ignore_keys]
+        item_ = {k: item[k] for k in keys if k in item}
+        if "uuid" in item_:
+            item_["uuid"] = str(item_["uuid"])
+
+        # annotations are always compared - a missing key is the same as an empty list
+        item_["annotations"] = item.get("annotations", [])
+
+        return SyncSide._fingerprint(item_, [*keys, "annotations"])
@@ -0,0 +1,226 @@
+import datetime
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from bubop.time import assume_local_tz_if_none
+
+from taskwarrior_syncall.types import TaskwarriorRawItem
+
+# Row offsets of the set bits of every byte value - for iterating over the rows of a bitset
+_BYTE_ROWS: List[Tuple[int, ...]] = [
+    tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)
+]
+
+# Dates that tasks can be ordered by via their epoch column
+_DATE_KEYS = ("due", "end", "entry", "modified")
+
+# Epoch of the tasks that don't have a date, ordered before the rest
+_NO_DATE = -(2**63)
+
+
+def _rows_of(bitset: int) -> Iterator[int]:
+    """Yield the rows of the set bits of the given bitset, in order."""
+    for offset, byte in enumerate(bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")):
+        if byte:
+            base = offset * 8
+            for bit in _BYTE_ROWS[byte]:
+                yield base + bit
+
+
+def _bitset_of(rows: Iterable[int]) -> int:
+    """Bitset with the bits of the given rows set."""
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    bits = bytearray(max(rows) // 8 + 1)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _to_epoch(value: Any) -> int:
+    if isinstance(value, datetime.datetime):
+        return int(assume_local_tz_if_none(value).timestamp())
+    return _NO_DATE
+
+
+class _Codes:
+    """Interned values of a column, along with the bitset of the rows of each value."""
+
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+        self.rows: List[int] = []
+
+    def code(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.rows)
+            self.rows.append(0)
+        return code
+
+    def rows_of(self, value: Any) -> int:
+        code = self.codes.get(value)
+        return 0 if code is None else self.rows[code]
+
+
+class TaskStore:
+    """Columnar store of the loaded tasks of a Taskwarrior side.
+
+    Each task is a row. The status, the project and the tags of the tasks are interned to
+    integer codes, with a bitset of the rows of each code, so that filtering the tasks is a
+    handful of bitwise operations on Python integers instead of a pass over every task. Dates
+    are kept as epoch-int columns for ordering, built on first use.
+
+    The tasks themselves are only handed out for the selected rows.
+    """
+
+    def __init__(self, tasks: Iterable[TaskwarriorRawItem] = ()):
+        self.load(tasks)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, uuid: object) -> bool:
+        return uuid in self._rows
+
+    def get(self, uuid: str) -> Optional[TaskwarriorRawItem]:
+        row = self._rows.get(uuid)
+        return None if row is None else self._tasks[row]
+
+    def load(self, tasks: Iterable[TaskwarriorRawItem]):
+        """Replace the stored tasks with the given ones."""
+        self._tasks: List[Optional[TaskwarriorRawItem]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+
+        # codes of each row
+        self._status = array("l")
+        self._project = array("l")
+        self._tags: List[Tuple[int, ...]] = []
+        self._statuses = _Codes()
+        self._projects = _Codes()
+        self._tag_codes = _Codes()
+
+        self._date_columns: Dict[str, array] = {}
+
+        # the latest version of a task wins
+        latest: Dict[str, TaskwarriorRawItem] = {}
+        for task in tasks:
+            uuid = task["uuid"] = str(task["uuid"])
+            latest[uuid] = task
+
+        rows_of_codes: Dict[Tuple[_Codes, int], List[int]] = {}
+        for uuid, task in latest.items():
+            row = len(self._tasks)
+            self._rows[uuid] = row
+            self._tasks.append(task)
+            self._append_codes(task)
+            for codes, code in self._codes_of_row(row):
+                rows_of_codes.setdefault((codes, code), []).append(row)
+
+        for (codes, code), rows in rows_of_codes.items():
+            codes.rows[code] |= _bitset_of(rows)
+
+    def upsert(self, task: TaskwarriorRawItem):
+        """Add the given task or replace the stored one of the same UUID."""
+        uuid = task["uuid"] = str(task["uuid"])
+        row = self._rows.get(uuid)
+        if row is not None:
+            self._unset_bits(row)
+            self._tasks[row] = task
+            self._set_codes(row, task)
+        elif self._free_rows:
+            row = self._free_rows.pop()
+            self._rows[uuid] = row
+            self._tasks[row] = task
+            self._set_codes(row, task)
+        else:
+            row = len(self._tasks)
+            self._rows[uuid] = row
+            self._tasks.append(task)
+            self._append_codes(task)
+
+        bit = 1 << row
+        for codes, code in self._codes_of_row(row):
+            codes.rows[code] |= bit
+        self._date_columns.clear()
+
+    def remove(self, uuid: str):
+        """Remove the task of the given UUID, if stored."""
+        row = self._rows.pop(uuid, None)
+        if row is None:
+            return
+
+        self._unset_bits(row)
+        self._tasks[row] = None
+        self._free_rows.append(row)
+        self._date_columns.clear()
+
+    def select(
+        self,
+        statuses: Iterable[str],
+        tags: Iterable[str] = (),
+        project: str = "",
+        order_by: Optional[str] = None,
+        reverse: bool = False,
+        ended_after: Optional[datetime.datetime] = None,
+    ) -> List[TaskwarriorRawItem]:
+        """Return the tasks with one of the given statuses, all the given tags and the given
+        project - any project if empty.
+
+        :param ended_after: Skip the completed tasks that ended before this date
+        """
+        bitset = 0
+        for status in statuses:
+            bitset |= self._statuses.rows_of(status)
+        for tag in tags:
+            bitset &= self._tag_codes.rows_of(tag)
+        if project:
+            bitset &= self._projects.rows_of(project)
+        if ended_after is not None:
+            start = _to_epoch(ended_after)
+            ends = self._date_column("end")
+            completed = bitset & self._statuses.rows_of("completed")
+            bitset &= ~_bitset_of(row for row in _rows_of(completed) if ends[row] < start)
+
+        rows: Sequence[int] = list(_rows_of(bitset))
+        if order_by in _DATE_KEYS:
+            rows = sorted(rows, key=self._date_column(order_by).__getitem__, reverse=reverse)
+        elif order_by is not None:
+            rows = sorted(rows, key=lambda row: self._tasks[row][order_by], reverse=reverse)  # type: ignore
+
+        return [self._tasks[row] for row in rows]  # type: ignore
+
+    def _date_column(self, key: str) -> array:
+        column = self._date_columns.get(key)
+        if column is None:
+            column = self._date_columns[key] = array(
+                "q",
+                (
+                    _NO_DATE if task is None else _to_epoch(task.get(key))
+                    for task in self._tasks
+                ),
+            )
+        return column
+
+    def _append_codes(self, task: TaskwarriorRawItem):
+        self._status.append(self._statuses.code(task.get("status")))
+        self._project.append(self._projects.code(task.get("project", "")))
+        self._tags.append(tuple(self._tag_codes.code(tag) for tag in task.get("tags") or ()))
+
+    def _set_codes(self, row: int, task: TaskwarriorRawItem):
+        self._status[row] = self._statuses.code(task.get("status"))
+        self._project[row] = self._projects.code(task.get("project", ""))
+        self._tags[row] = tuple(self._tag_codes.code(tag) for tag in task.get("tags") or ())
+
+    def _codes_of_row(self, row: int) -> Iterator[Tuple[_Codes, int]]:
+        yield self._statuses, self._status[row]
+        yield self._projects, self._project[row]
+        for code in self._tags[row]:
+            yield self._tag_codes, code
+
+    def _unset_bits(self, row: int):
+        mask = ~(1 << row)
+        for codes, code in self._codes_of_row(row):
+            codes.rows[code] &= mask
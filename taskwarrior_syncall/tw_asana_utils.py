@@ -5,7 +5,11 @@ import datetime
 import dateutil
 from bubop import format_datetime_tz, format_dict, logger, parse_datetime
 
+from taskwarrior_syncall.aggregator import Aggregator
+from taskwarrior_syncall.app_utils import get_resolution_strategy
+from taskwarrior_syncall.asana.asana_side import AsanaSide
 from taskwarrior_syncall.asana.asana_task import AsanaTask
+from taskwarrior_syncall.sync_side import SyncSide
 from taskwarrior_syncall.types import TwItem
 
 
@@ -142,3 +146,27 @@ def convert_asana_to_tw(asana_task: AsanaTask) -> TwItem:
         tw_task["modified"] = tw_modified
 
     return tw_task
+
+
+def make_tw_asana_aggregator(
+    asana_side: AsanaSide, tw_side: SyncSide, resolution_strategy: str, **kargs
+) -> Aggregator:
+    """Aggregator of the given sides - the rest of the kargs are passed to the Aggregator."""
+    return Aggregator(
+        side_A=asana_side,
+        side_B=tw_side,
+        converter_A_to_B=convert_asana_to_tw,
+        converter_B_to_A=convert_tw_to_asana,
+        resolution_strategy=get_resolution_strategy(
+            resolution_strategy, side_A_type=type(asana_side), side_B_type=type(tw_side)
+        ),
+        ignore_keys=(
+            (
+                "completed_at",
+                "created_at",
+                "modified_at",
+            ),
+            ("end", "entry", "modified", "urgency"),
+        ),
+        **kargs,
+    )
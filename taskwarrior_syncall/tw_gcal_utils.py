@@ -1,12 +1,15 @@
 import traceback
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Any, Callable, List, Mapping, Optional, Tuple
 from uuid import UUID
 
 from bubop import logger
 from item_synchronizer.types import Item
 
+from taskwarrior_syncall.aggregator import Aggregator
+from taskwarrior_syncall.app_utils import get_resolution_strategy, update_cached_combination
 from taskwarrior_syncall.google.gcal_side import GCalSide
+from taskwarrior_syncall.sync_side import SyncSide
 
 _prefix_title_done_str = "✅"
 
@@ -164,3 +167,41 @@ def _parse_gcal_item_desc(
                     )
 
     return annotations, status, uuid
+
+
+def cached_gcal_calendar_id(
+    app_config: Mapping[str, Any], config_fname: str, combination: str, gcal_calendar: str
+) -> Tuple[Optional[str], Optional[Callable[[str], None]]]:
+    """ID of the calendar, as looked up in a previous run, and a function for caching it.
+
+    The ID is only cached if the combination refers to the same calendar.
+    """
+    if app_config.get("gcal_calendar") != gcal_calendar:
+        return None, None
+
+    def save_gcal_calendar_id(calendar_id: str):
+        update_cached_combination(
+            config_fname=config_fname, combination=combination, gcal_calendar_id=calendar_id
+        )
+
+    return app_config.get("gcal_calendar_id"), save_gcal_calendar_id
+
+
+def make_tw_gcal_aggregator(
+    gcal_side: GCalSide, tw_side: SyncSide, resolution_strategy: str, **kargs
+) -> Aggregator:
+    """Aggregator of the given sides - the rest of the kargs are passed to the Aggregator."""
+    return Aggregator(
+        side_A=gcal_side,
+        side_B=tw_side,
+        converter_B_to_A=convert_tw_to_gcal,
+        converter_A_to_B=convert_gcal_to_tw,
+        resolution_strategy=get_resolution_strategy(
+            resolution_strategy, side_A_type=type(gcal_side), side_B_type=type(tw_side)
+        ),
+        ignore_keys=(
+            (),
+            ("due", "end", "entry", "modified", "urgency"),
+        ),
+        **kargs,
+    )
@@ -5,7 +5,11 @@ from typing import cast
 from bubop import format_datetime_tz, parse_datetime
 from notion_client import Client
 
+from taskwarrior_syncall.aggregator import Aggregator
+from taskwarrior_syncall.app_utils import get_resolution_strategy
+from taskwarrior_syncall.notion_side import NotionSide
 from taskwarrior_syncall.notion_todo_block import NotionTodoBlock
+from taskwarrior_syncall.sync_side import SyncSide
 from taskwarrior_syncall.types import NotionPage, TwItem
 
 
@@ -43,3 +47,23 @@ def convert_notion_to_tw(todo_block: NotionTodoBlock) -> TwItem:
         "description": todo_block.plaintext,
         "modified": format_datetime_tz(todo_block.last_modified_date),
     }
+
+
+def make_tw_notion_aggregator(
+    notion_side: NotionSide, tw_side: SyncSide, resolution_strategy: str, **kargs
+) -> Aggregator:
+    """Aggregator of the given sides - the rest of the kargs are passed to the Aggregator."""
+    return Aggregator(
+        side_A=notion_side,
+        side_B=tw_side,
+        converter_B_to_A=convert_tw_to_notion,
+        converter_A_to_B=convert_notion_to_tw,
+        resolution_strategy=get_resolution_strategy(
+            resolution_strategy, side_A_type=type(notion_side), side_B_type=type(tw_side)
+        ),
+        ignore_keys=(
+            ("last_modified_date",),
+            ("due", "end", "entry", "modified", "urgency"),
+        ),
+        **kargs,
+    )
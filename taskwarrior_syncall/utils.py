@@ -0,0 +1,10 @@
+"""Utility functions of the library modules."""
+from typing import Iterator, Sequence, TypeVar
+
+_T = TypeVar("_T")
+
+
+def chunked(items: Sequence[_T], n: int) -> Iterator[Sequence[_T]]:
+    """Split the given items in consecutive chunks of up to n items."""
+    for i in range(0, len(items), n):
+        yield items[i : i + n]
@@ -0,0 +1,128 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, cast
+
+from item_synchronizer.types import ID, Item
+
+from taskwarrior_syncall.sync_side import SyncSide
+from taskwarrior_syncall.utils import chunked
+
+# Created item and raised exception, for each write of a batch
+_BatchResults = List[Tuple[Optional[Item], Optional[Exception]]]
+
+
+class WriteKind(Enum):
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+@dataclass
+class WriteOp:
+    """A single write to a side, recorded during the synchronization and executed later."""
+
+    kind: WriteKind
+    # ID of the item to update or delete - a placeholder ID for the items to insert
+    item_id: ID
+    # Item to insert, or changes to apply to the item
+    item: Optional[Item] = None
+    # ID of the counterpart of the item to delete, to restore the correspondence on failure
+    other_id: Optional[ID] = None
+    # Sequence number of the write in the journal of the combination, if journaled
+    seq: Optional[int] = None
+
+
+class WriteExecutor:
+    """Execute the writes of a synchronization run, concurrently.
+
+    The writes to each side are grouped in batches, up to the maximum batch size the side
+    supports for each kind of write - see SyncSide.add_items/update_items/delete_items. Each
+    side gets its own thread pool with up to ``max_parallel_writes`` batches in flight, or a
+    single one if the side is not thread-safe. The writes of a run are independent of each
+    other - each one touches a different item - so they can complete in any order.
+
+    The results are yielded in the thread of the caller, as they complete, so that the caller
+    can update the correspondences and cached items without any locking.
+    """
+
+    def __init__(self, max_parallel_writes: int = 1):
+        if max_parallel_writes < 1:
+            raise ValueError(
+                f"Number of parallel writes must be positive, got {max_parallel_writes}"
+            )
+
+        self._max_parallel_writes = max_parallel_writes
+
+    @property
+    def max_parallel_writes(self) -> int:
+        return self._max_parallel_writes
+
+    def run(
+        self, writes: Sequence[Tuple[SyncSide, Sequence[WriteOp]]]
+    ) -> Iterator[Tuple[SyncSide, WriteOp, Optional[Item], Optional[BaseException]]]:
+        """Execute the given writes of each side.
+
+        :returns: Iterator of (side, write, created item, exception) tuples, in order of
+                  completion. The created item is only set for successful insertions, the
+                  exception only for failed writes.
+        """
+        pools: List[ThreadPoolExecutor] = []
+        futures: Dict["Future[_BatchResults]", Tuple[SyncSide, Sequence[WriteOp]]] = {}
+        try:
+            for side, ops in writes:
+                if not ops:
+                    continue
+
+                pool = ThreadPoolExecutor(
+                    max_workers=self._max_parallel_writes if side.is_thread_safe else 1,
+                    thread_name_prefix=f"syncall-{side.name}",
+                )
+                pools.append(pool)
+                for kind, batch_size in (
+                    (WriteKind.INSERT, side.max_add_batch_size),
+                    (WriteKind.UPDATE, side.max_update_batch_size),
+                    (WriteKind.DELETE, side.max_delete_batch_size),
+                ):
+                    ops_of_kind = [op for op in ops if op.kind is kind]
+                    for batch in chunked(ops_of_kind, max(batch_size, 1)):
+                        future = pool.submit(self._write_batch, side, kind, batch)
+                        futures[future] = (side, batch)
+
+            for future in as_completed(futures):
+                side, batch = futures[future]
+                exc = future.exception()
+                results = [(None, exc)] * len(batch) if exc is not None else future.result()
+                for op, (item, op_exc) in zip(batch, results):
+                    yield side, op, item, op_exc
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _write_batch(
+        side: SyncSide, kind: WriteKind, batch: Sequence[WriteOp]
+    ) -> _BatchResults:
+        """Execute a batch of writes of the same kind.
+
+        :returns: The created item and the raised exception, for each write of the batch
+        """
+        if kind is WriteKind.INSERT:
+            added = side.add_items([cast(Item, op.item) for op in batch])
+            if len(added) != len(batch):
+                raise RuntimeError(
+                    f"Expected {len(batch)} results from {side}, got {len(added)} instead"
+                )
+            return [(None, r) if isinstance(r, Exception) else (r, None) for r in added]
+
+        if kind is WriteKind.UPDATE:
+            errors = side.update_items({op.item_id: cast(Item, op.item) for op in batch})
+        elif kind is WriteKind.DELETE:
+            errors = side.delete_items([op.item_id for op in batch])
+        else:
+            raise RuntimeError(f"Unknown kind of write -> {kind}")
+
+        missing = [op.item_id for op in batch if op.item_id not in errors]
+        if missing:
+            raise RuntimeError(f"No results from {side} for items -> {missing}")
+        return [(None, errors[op.item_id]) for op in batch]
@@ -8,6 +8,7 @@ from loguru import logger
 
 from .conftest_gkeep import *
 from .conftest_notion import *
+from .conftest_sides import *
 from .conftest_tw import *
 
 
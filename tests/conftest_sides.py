@@ -0,0 +1,137 @@
+import itertools
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pytest
+from bubop import common_dir
+from item_synchronizer.types import ID
+
+from taskwarrior_syncall import ItemType, SyncSide
+
+
+class MockSide(SyncSide):
+    def __init__(self, name: str, fullname: str, *args, **kargs) -> None:
+        self._fullname = fullname
+        self._name = name
+
+    def __str__(self) -> str:
+        return self._fullname
+
+    def get_all_items(self, **kargs) -> Sequence[ItemType]:
+        raise NotImplementedError("Implement in derived")
+
+    def get_item(self, item_id: ID, use_cached: bool = False) -> Optional[ItemType]:
+        raise NotImplementedError("Should be implemented in derived")
+
+    def delete_single_item(self, item_id: ID):
+        raise NotImplementedError("Should be implemented in derived")
+
+    def update_item(self, item_id: ID, **changes):
+        raise NotImplementedError("Should be implemented in derived")
+
+    def add_item(self, item: ItemType) -> ItemType:
+        raise NotImplementedError("Implement in derived")
+
+    @classmethod
+    def id_key(cls) -> str:
+        raise NotImplementedError("Implement in derived")
+
+    @classmethod
+    def summary_key(cls) -> str:
+        raise NotImplementedError("Implement in derived")
+
+    @classmethod
+    def items_are_identical(
+        cls, item1: ItemType, item2: ItemType, ignore_keys: Sequence[str] = []
+    ) -> bool:
+        """Determine whether two items are identical.
+
+        .. returns:: True if items are identical, False otherwise.
+        """
+        raise NotImplementedError("Implement in derived")
+
+
+class InMemorySide(MockSide):
+    """Side that keeps its items in a dictionary."""
+
+    def __init__(self, name: str, fullname: str, items: Sequence[ItemType] = ()) -> None:
+        super().__init__(name=name, fullname=fullname)
+        self.items = {item["id"]: item for item in items}
+        self.fetched: List[ID] = []
+        self._next_id = itertools.count()
+
+    def get_all_items(self, **kargs) -> Sequence[ItemType]:
+        return list(self.items.values())
+
+    def get_item(self, item_id: ID, use_cached: bool = False) -> Optional[ItemType]:
+        self.fetched.append(item_id)
+        return self.items.get(item_id)
+
+    def delete_single_item(self, item_id: ID):
+        self.items.pop(item_id)
+
+    def update_item(self, item_id: ID, **changes):
+        self.items[item_id].update(changes)
+
+    def add_item(self, item: ItemType) -> ItemType:
+        item = {**item, "id": f"{self._name}{next(self._next_id)}"}
+        self.items[item["id"]] = item
+        return item
+
+    @classmethod
+    def id_key(cls) -> str:
+        return "id"
+
+    @classmethod
+    def summary_key(cls) -> str:
+        return "title"
+
+    @classmethod
+    def last_modification_key(cls) -> str:
+        return "modified"
+
+    @classmethod
+    def items_are_identical(
+        cls, item1: ItemType, item2: ItemType, ignore_keys: Sequence[str] = []
+    ) -> bool:
+        keys = [k for k in ("title", "modified") if k not in ignore_keys]
+        return SyncSide._items_are_identical(item1, item2, keys)
+
+    @classmethod
+    def fingerprint(cls, item: ItemType, ignore_keys: Sequence[str] = []) -> str:
+        keys = [k for k in ("title", "modified") if k not in ignore_keys]
+        return SyncSide._fingerprint(item, keys)
+
+
+@pytest.fixture()
+def config_dir(tmp_path, monkeypatch) -> Path:
+    """Point the configuration directory of the app to a temporary directory."""
+    monkeypatch.setitem(common_dir._os_to_config_dir, sys.platform, tmp_path)
+    return tmp_path
+
+
+class SlowWritesSide(InMemorySide):
+    """Side whose writes only return once `parallel` of them are in flight."""
+
+    def __init__(self, name: str, parallel: int, **kargs) -> None:
+        super().__init__(name=name, fullname=name, **kargs)
+        self.barrier = threading.Barrier(parallel, timeout=5)
+        self.failing_titles: Sequence[str] = ()
+
+    def add_item(self, item: ItemType) -> ItemType:
+        self.barrier.wait()
+        if item["title"] in self.failing_titles:
+            raise RuntimeError("kalimera")
+        return super().add_item(item)
+
+    def update_item(self, item_id: ID, **changes):
+        if changes.get("title") in self.failing_titles:
+            raise RuntimeError("kalimera")
+        super().update_item(item_id, **changes)
+
+    def delete_single_item(self, item_id: ID):
+        if self.items[item_id]["title"] in self.failing_titles:
+            raise RuntimeError("kalimera")
+        super().delete_single_item(item_id)
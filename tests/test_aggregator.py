@@ -1,47 +1,576 @@
-from typing import Optional, Sequence
+import datetime
+import threading
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
 
+import pytest
+from bidict import bidict  # type: ignore
+from bubop import PrefsManager
 from item_synchronizer.types import ID
 
-from taskwarrior_syncall import ItemType, SyncSide
+from taskwarrior_syncall import Aggregator, ItemType, SyncSide
+from taskwarrior_syncall.app_utils import app_name
 
+from .conftest_sides import InMemorySide, SlowWritesSide
 
-class MockSide(SyncSide):
-    def __init__(self, name: str, fullname: str, *args, **kargs) -> None:
-        self._fullname = fullname
-        self._name = name
 
-    def __str__(self) -> str:
-        return self._fullname
+def _make_aggregator(n: int) -> Tuple[Aggregator, Dict[ID, ItemType]]:
+    """Aggregator with n already synchronized items, along with the current items of side B.
+
+    Of the current items, 1% are new, 1% are deleted and 1% are modified.
+    """
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = InMemorySide(name="A", fullname="A")
+    side_B = InMemorySide(name="B", fullname="B")
+    aggregator = Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+        config_fname=f"changes_{n}",
+    )
+
+    items_B = {
+        f"b{i}": {"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(n)
+    }
+    aggregator._B_to_A_map.update((f"b{i}", f"a{i}") for i in range(n))
+    aggregator._cache_items(aggregator._helper_B, items_B)
+
+    n_changes = n // 100
+    for i in range(n_changes):
+        items_B.pop(f"b{i}")
+        items_B[f"new{i}"] = {"id": f"new{i}", "title": "new", "modified": modified}
+        items_B[f"b{n - 1 - i}"] = {
+            "id": f"b{n - 1 - i}",
+            "title": "mod",
+            "modified": modified,
+        }
+
+    return aggregator, items_B
+
+
+def test_detect_changes(config_dir):
+    aggregator, items_B = _make_aggregator(1000)
+    changes = aggregator.detect_changes(aggregator._helper_B, items_B)
+
+    assert changes.new == {f"new{i}" for i in range(10)}
+    assert changes.deleted == {f"b{i}" for i in range(10)}
+    assert changes.modified == {f"b{999 - i}" for i in range(10)}
+
+
+class BarrierSide(InMemorySide):
+    """Side whose methods only return once the other side has called them as well."""
+
+    def __init__(self, name: str, barrier: threading.Barrier, **kargs) -> None:
+        super().__init__(name=name, fullname=name, **kargs)
+        self.barrier = barrier
+        self.threads: List[str] = []
+
+    def start(self):
+        self.threads.append(threading.current_thread().name)
+        self.barrier.wait()
 
     def get_all_items(self, **kargs) -> Sequence[ItemType]:
-        raise NotImplementedError("Implement in derived")
+        self.barrier.wait()
+        return super().get_all_items(**kargs)
+
+
+def test_sides_run_concurrently(config_dir):
+    barrier = threading.Barrier(2, timeout=5)
+    side_A = BarrierSide(name="A", barrier=barrier)
+    side_B = BarrierSide(name="B", barrier=barrier)
+    aggregator = Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    )
+
+    aggregator.start()
+    aggregator.sync()
+    aggregator.finish()
+    assert threading.current_thread().name not in side_A.threads + side_B.threads
+
+
+def test_sides_run_sequentially_if_not_thread_safe(config_dir):
+    side_A = InMemorySide(name="A", fullname="A")
+    side_B = BarrierSide(name="B", barrier=threading.Barrier(1))
+    side_B.is_thread_safe = False
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    ):
+        pass
+
+    assert side_B.threads == [threading.current_thread().name]
+
+
+def test_errors_from_concurrent_sides_are_raised(config_dir):
+    class FailingSide(InMemorySide):
+        def get_all_items(self, **kargs) -> Sequence[ItemType]:
+            raise RuntimeError("kalimera")
+
+    aggregator = Aggregator(
+        side_A=InMemorySide(name="A", fullname="A"),
+        side_B=FailingSide(name="B", fullname="B"),
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    )
+    with pytest.raises(RuntimeError, match="kalimera"):
+        aggregator.sync()
+
+
+def _sync_new_items(
+    config_dir, listing_is_complete: bool
+) -> Tuple[InMemorySide, InMemorySide]:
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = InMemorySide(name="A", fullname="A")
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(10)],
+    )
+    side_B.listing_is_complete = listing_is_complete
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    ) as aggregator:
+        aggregator.sync()
+
+    return side_A, side_B
+
 
-    def get_item(self, item_id: ID, use_cached: bool = False) -> Optional[ItemType]:
-        raise NotImplementedError("Should be implemented in derived")
+def test_sync_reuses_listed_items(config_dir):
+    side_A, side_B = _sync_new_items(config_dir, listing_is_complete=True)
+    assert len(side_A.items) == 10
+    assert side_B.fetched == []
 
-    def delete_single_item(self, item_id: ID):
-        raise NotImplementedError("Should be implemented in derived")
 
-    def update_item(self, item_id: ID, **changes):
-        raise NotImplementedError("Should be implemented in derived")
+def test_sync_refetches_items_of_incomplete_listings(config_dir):
+    side_A, side_B = _sync_new_items(config_dir, listing_is_complete=False)
+    assert len(side_A.items) == 10
+    assert set(side_B.fetched) == set(side_B.items)
+
+
+def test_writes_run_concurrently(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = SlowWritesSide(name="A", parallel=4)
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(8)],
+    )
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+        max_parallel_writes=4,
+    ) as aggregator:
+        aggregator.sync()
+
+        # correspondences point to the actual IDs, regardless of the order of completion
+        assert len(side_A.items) == 8
+        assert {
+            id_B: side_A.items[id_A]["title"] for id_B, id_A in aggregator._B_to_A_map.items()
+        } == {id_B: item["title"] for id_B, item in side_B.items.items()}
+        assert set(aggregator._get_snapshot_stores(aggregator._helper_A)[0].ids()) == set(
+            side_A.items
+        )
+
+
+def test_failed_writes_are_retried_in_the_next_run(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = SlowWritesSide(name="A", parallel=1)
+    side_A.failing_titles = ("0", "1")
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(4)],
+    )
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+        max_parallel_writes=4,
+    ) as aggregator:
+        aggregator.sync()
+        assert sorted(item["title"] for item in side_A.items.values()) == ["2", "3"]
+        assert set(aggregator._B_to_A_map) == {"b2", "b3"}
+
+        side_A.failing_titles = ("2",)
+        side_B.items.pop("b2")
+        side_B.items.pop("b3")
+        aggregator.sync()
+
+        # failed deletion is still registered, failed insertions are now in
+        assert sorted(item["title"] for item in side_A.items.values()) == ["0", "1", "2"]
+        assert set(aggregator._B_to_A_map) == {"b0", "b1", "b2"}
+
+
+class BufferedSide(InMemorySide):
+    """Side whose insertions only reach its items once committed."""
+
+    def __init__(self, name: str, **kargs) -> None:
+        super().__init__(name=name, fullname=name, **kargs)
+        self.buffered: Dict[ID, ItemType] = {}
+        self.commit_error: Optional[Exception] = None
 
     def add_item(self, item: ItemType) -> ItemType:
-        raise NotImplementedError("Implement in derived")
+        item = {**item, "id": f"{self._name}{next(self._next_id)}"}
+        self.buffered[item["id"]] = item
+        return item
 
-    @classmethod
-    def id_key(cls) -> str:
-        raise NotImplementedError("Implement in derived")
+    def commit_writes(self):
+        buffered, self.buffered = self.buffered, {}
+        if self.commit_error is not None:
+            raise self.commit_error
+        self.items.update(buffered)
 
-    @classmethod
-    def summary_key(cls) -> str:
-        raise NotImplementedError("Implement in derived")
+
+def test_writes_are_only_registered_once_committed(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = BufferedSide(name="A")
+    side_A.commit_error = RuntimeError("kalimera")
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(4)],
+    )
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    ) as aggregator:
+        aggregator.sync()
+        assert side_A.items == {}
+        assert aggregator._B_to_A_map == {}
+        assert aggregator._state.load_correspondences() == {}
+
+        side_A.commit_error = None
+        aggregator.sync()
+        assert sorted(item["title"] for item in side_A.items.values()) == ["0", "1", "2", "3"]
+        assert aggregator._state.load_correspondences() == {
+            id_B: id_A for id_B, id_A in aggregator._B_to_A_map.items()
+        }
+        assert set(aggregator._B_to_A_map) == set(side_B.items)
+
+
+class BatchSide(InMemorySide):
+    """Side that adds items in batches, failing some of them."""
+
+    max_add_batch_size = 3
+
+    def __init__(self, name: str, **kargs) -> None:
+        super().__init__(name=name, fullname=name, **kargs)
+        self.batches: List[int] = []
+
+    def add_items(self, items: Sequence[ItemType]) -> List[Union[ItemType, Exception]]:
+        self.batches.append(len(items))
+        return [
+            RuntimeError("kalimera") if item["title"] == "0" else self.add_item(item)
+            for item in items
+        ]
+
+
+def test_writes_are_batched(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = BatchSide(name="A")
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(7)],
+    )
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    ) as aggregator:
+        aggregator.sync()
+
+        assert sorted(side_A.batches) == [1, 3, 3]
+        # the failed item is left out of the correspondences
+        assert set(aggregator._B_to_A_map) == {f"b{i}" for i in range(1, 7)}
+        assert {side_A.items[id_A]["title"] for id_A in aggregator._B_to_A_map.values()} == {
+            f"{i}" for i in range(1, 7)
+        }
+
+
+def test_sync_periodically(config_dir):
+    stop = threading.Event()
+
+    class CountingSide(InMemorySide):
+        def __init__(self, *args, **kargs):
+            super().__init__(*args, **kargs)
+            self.calls: List[str] = []
+
+        def invalidate_cache(self):
+            self.calls.append("invalidate_cache")
+
+        def refresh_credentials(self):
+            self.calls.append("refresh_credentials")
+
+        def get_all_items(self, **kargs) -> Sequence[ItemType]:
+            self.calls.append("get_all_items")
+            if self.calls.count("get_all_items") == 3:
+                stop.set()
+            return super().get_all_items(**kargs)
+
+    side_A = CountingSide(name="A", fullname="A")
+    with Aggregator(
+        side_A=side_A,
+        side_B=InMemorySide(name="B", fullname="B"),
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+    ) as aggregator:
+        aggregator.sync_periodically(interval=0.01, stop=stop)
+
+    assert side_A.calls == [
+        "get_all_items",
+        "refresh_credentials",
+        "invalidate_cache",
+        "get_all_items",
+        "refresh_credentials",
+        "invalidate_cache",
+        "get_all_items",
+        "refresh_credentials",
+    ]
+
+
+def _in_memory_aggregator(side_B: Optional[SyncSide] = None, **kargs) -> Aggregator:
+    return Aggregator(
+        side_A=InMemorySide(name="A", fullname="A"),
+        side_B=side_B or InMemorySide(name="B", fullname="B"),
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+        **kargs,
+    )
+
+
+def test_correspondences_are_migrated_from_prefs(config_dir):
+    with PrefsManager(app_name=app_name(), config_fname="migration") as prefs_manager:
+        prefs_manager["B_A_ids"] = bidict({f"b{i}": f"a{i}" for i in range(10)})
+
+    aggregator = _in_memory_aggregator(config_fname="migration")
+    assert aggregator._B_to_A_map == {f"b{i}": f"a{i}" for i in range(10)}
+    aggregator.finish()
+
+    with PrefsManager(app_name=app_name(), config_fname="migration") as prefs_manager:
+        assert not isinstance(prefs_manager["B_A_ids"], Mapping)
+
+    aggregator = _in_memory_aggregator(config_fname="migration")
+    assert aggregator._B_to_A_map == {f"b{i}": f"a{i}" for i in range(10)}
+    aggregator.finish()
+
+
+def test_only_changed_correspondences_are_saved(config_dir, monkeypatch):
+    modified = datetime.datetime(2022, 1, 1)
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(100)],
+    )
+    with _in_memory_aggregator(side_B=side_B) as aggregator:
+        aggregator.sync()
+
+        saved = []
+        monkeypatch.setattr(
+            aggregator._state,
+            "update_correspondences",
+            lambda upserts, deleted=(): saved.append((dict(upserts), set(deleted))),
+        )
+        side_B.items.pop("b0")
+        side_B.items["b100"] = {"id": "b100", "title": "100", "modified": modified}
+        aggregator.sync()
+        aggregator.flush()
+
+        assert len(saved) == 1
+        upserts, deleted = saved[0]
+        assert list(upserts) == ["b100"] and deleted == {"b0"}
+
+
+def test_interrupted_sync_is_recovered(config_dir, monkeypatch):
+    modified = datetime.datetime(2022, 1, 1)
+    side_B = InMemorySide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(6)],
+    )
+    side_A = InMemorySide(name="A", fullname="A")
+
+    def make_aggregator() -> Aggregator:
+        return Aggregator(
+            side_A=side_A,
+            side_B=side_B,
+            converter_B_to_A=lambda item: item,
+            converter_A_to_B=lambda item: item,
+        )
+
+    # the process dies right after the 4th insertion, before marking it as done
+    aggregator = make_aggregator()
+    complete_write = aggregator._state.complete_write
+    completed = []
+
+    def interrupting_complete_write(seq, result_id=None):
+        if len(completed) == 3:
+            raise KeyboardInterrupt
+        completed.append(seq)
+        complete_write(seq, result_id=result_id)
+
+    monkeypatch.setattr(aggregator._state, "complete_write", interrupting_complete_write)
+    with pytest.raises(KeyboardInterrupt):
+        aggregator.sync()
+    assert len(side_A.items) >= 4
+
+    # the next run registers the inserted items instead of inserting them again
+    with make_aggregator() as aggregator:
+        aggregator.sync()
+        assert sorted(item["title"] for item in side_A.items.values()) == [
+            f"{i}" for i in range(6)
+        ]
+        assert set(aggregator._B_to_A_map) == set(side_B.items)
+        assert aggregator._state.load_journal() == []
+
+
+class JournaledSide(InMemorySide):
+    """Side that journals the IDs of its changed items."""
+
+    def __init__(self, *args, **kargs):
+        super().__init__(*args, **kargs)
+        self.journal: List[ID] = []
+        self.num_listings = 0
+
+    def get_all_items(self, **kargs) -> Sequence[ItemType]:
+        self.num_listings += 1
+        return super().get_all_items(**kargs)
+
+    def change_journal_position(self) -> Optional[str]:
+        return str(len(self.journal))
+
+    def get_changed_items(self, since: str) -> Optional[Dict[ID, Optional[ItemType]]]:
+        return {item_id: self.items.get(item_id) for item_id in self.journal[int(since) :]}
+
+
+def test_only_journaled_changes_are_fetched(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_B = JournaledSide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(3)],
+    )
+    with _in_memory_aggregator(side_B=side_B) as aggregator:
+        side_A = aggregator._side_A
+        # no previous position - list all the items
+        aggregator.sync()
+        assert side_B.num_listings == 1
+        assert len(side_A.items) == 3
+
+        side_B.items["b0"].update(title="changed", modified=datetime.datetime(2022, 2, 1))
+        side_B.items.pop("b1")
+        side_B.items["b3"] = {"id": "b3", "title": "3", "modified": modified}
+        side_B.journal.extend(["b0", "b1", "b3"])
+
+        aggregator.sync()
+        assert side_B.num_listings == 1
+        assert sorted(item["title"] for item in side_A.items.values()) == ["2", "3", "changed"]
+
+
+def test_failed_writes_of_journaled_changes_are_retried(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = SlowWritesSide(name="A", parallel=1)
+    side_B = JournaledSide(
+        name="B",
+        fullname="B",
+        items=[{"id": f"b{i}", "title": f"{i}", "modified": modified} for i in range(2)],
+    )
+    with Aggregator(
+        side_A=side_A,
+        side_B=side_B,
+        converter_B_to_A=lambda item: item,
+        converter_A_to_B=lambda item: item,
+        max_parallel_writes=4,
+    ) as aggregator:
+        aggregator.sync()
+        assert len(side_A.items) == 2
+
+        side_A.failing_titles = ("2", "changed")
+        side_B.items["b0"].update(title="changed", modified=datetime.datetime(2022, 2, 1))
+        side_B.items["b2"] = {"id": "b2", "title": "2", "modified": modified}
+        side_B.journal.extend(["b0", "b2"])
+        aggregator.sync()
+        assert sorted(item["title"] for item in side_A.items.values()) == ["0", "1"]
+
+        # the failed changes are listed again, even though the journal didn't change
+        side_A.failing_titles = ()
+        aggregator.sync()
+        assert side_B.num_listings == 1
+        assert sorted(item["title"] for item in side_A.items.values()) == ["1", "2", "changed"]
+
+
+class HorizonSide(InMemorySide):
+    """Side that only lists the items that ended after the start of the horizon."""
+
+    def get_all_items(self, **kargs) -> Sequence[ItemType]:
+        return [
+            item
+            for item in self.items.values()
+            if self._horizon_start is None
+            or item["end"] is None
+            or item["end"] >= self._horizon_start
+        ]
 
     @classmethod
-    def items_are_identical(
-        cls, item1: ItemType, item2: ItemType, ignore_keys: Sequence[str] = []
-    ) -> bool:
-        """Determine whether two items are identical.
-
-        .. returns:: True if items are identical, False otherwise.
-        """
-        raise NotImplementedError("Implement in derived")
+    def finished_at(cls, item: ItemType) -> Optional[datetime.datetime]:
+        return item["end"]
+
+
+def test_items_beyond_the_horizon_are_frozen(config_dir):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    modified = datetime.datetime(2022, 1, 1)
+    side_A = InMemorySide(name="A", fullname="A")
+    side_B = HorizonSide(
+        name="B",
+        fullname="B",
+        items=[
+            {
+                "id": "b0",
+                "title": "0",
+                "modified": modified,
+                "end": now - datetime.timedelta(days=10),
+            },
+            {"id": "b1", "title": "1", "modified": modified, "end": None},
+            {"id": "b2", "title": "2", "modified": modified, "end": None},
+            {
+                "id": "b3",
+                "title": "3",
+                "modified": modified,
+                "end": now - datetime.timedelta(days=40),
+            },
+        ],
+    )
+
+    def sync(horizon: datetime.timedelta):
+        with Aggregator(
+            side_A=side_A,
+            side_B=side_B,
+            converter_B_to_A=lambda item: item,
+            converter_A_to_B=lambda item: item,
+            config_fname="horizon",
+            horizon=horizon,
+        ) as aggregator:
+            aggregator.sync()
+
+    sync(horizon=datetime.timedelta(days=30))
+    assert sorted(item["title"] for item in side_A.items.values()) == ["0", "1", "2"]
+
+    # e.g., 25 days later - b0 ended before the horizon, b1 is deleted
+    side_B.items.pop("b1")
+    sync(horizon=datetime.timedelta(days=5))
+    assert sorted(item["title"] for item in side_A.items.values()) == ["0", "2"]
+    assert sorted(side_B.items) == ["b0", "b2", "b3"]
@@ -0,0 +1,78 @@
+import datetime
+
+from taskwarrior_syncall import TaskWarriorSide
+from taskwarrior_syncall.notion_side import NotionSide
+from taskwarrior_syncall.notion_todo_block import NotionTodoBlock
+
+
+def _tw_item(**kargs) -> dict:
+    item = {
+        "description": "Arrange to do any home pre-departure covid tests",
+        "due": datetime.datetime(2021, 11, 30, 17, 31, tzinfo=datetime.timezone.utc),
+        "modified": datetime.datetime(2021, 10, 27, 10, 47, 45),
+        "status": "pending",
+        "uuid": "3e3fdd67-b8b7-4924-bd86-36daa2e9c1c9",
+    }
+    item.update(kargs)
+    return item
+
+
+def test_tw_fingerprint_equal_implies_identical():
+    item = _tw_item()
+    fp = TaskWarriorSide.fingerprint(item, ignore_keys=["uuid"])
+
+    # keys that are not compared don't affect the fingerprint
+    other = _tw_item(modified=datetime.datetime(2022, 1, 1), urgency=3.2)
+    assert TaskWarriorSide.fingerprint(other, ignore_keys=["uuid"]) == fp
+
+    # missing annotations are the same as an empty list
+    assert TaskWarriorSide.fingerprint(_tw_item(annotations=[]), ignore_keys=["uuid"]) == fp
+
+    # datetimes within the same tolerance bucket
+    other = _tw_item(due=item["due"] + datetime.timedelta(minutes=5))
+    assert TaskWarriorSide.fingerprint(other, ignore_keys=["uuid"]) == fp
+    assert TaskWarriorSide.items_are_identical(item.copy(), other, ignore_keys=["uuid"])
+
+    # does not modify the item
+    assert item == _tw_item()
+
+
+def test_tw_fingerprint_differs():
+    fp = TaskWarriorSide.fingerprint(_tw_item(), ignore_keys=["uuid"])
+
+    for changes in (
+        {"description": "kalimera"},
+        {"status": "completed"},
+        {"annotations": ["kalimera"]},
+        {"due": datetime.datetime(2021, 12, 30, 17, 31, tzinfo=datetime.timezone.utc)},
+    ):
+        assert TaskWarriorSide.fingerprint(_tw_item(**changes), ignore_keys=["uuid"]) != fp
+
+    # ignored keys don't affect the fingerprint
+    assert TaskWarriorSide.fingerprint(
+        _tw_item(description="kalimera"), ignore_keys=["uuid", "description"]
+    ) == TaskWarriorSide.fingerprint(_tw_item(), ignore_keys=["uuid", "description"])
+
+
+def test_notion_fingerprint():
+    block = NotionTodoBlock(
+        is_archived=False,
+        is_checked=False,
+        last_modified_date=datetime.datetime(2021, 12, 4, 10, 1),
+        plaintext="Lacinato kale",
+        id="7de89eb6-4ee1-472c-abcd-8231049e9d8d",
+    )
+    checked = NotionTodoBlock(
+        is_archived=False,
+        is_checked=True,
+        last_modified_date=datetime.datetime(2021, 12, 4, 10, 1),
+        plaintext="Lacinato kale",
+        id="7de89eb6-4ee1-472c-abcd-8231049e9d8d",
+    )
+
+    assert NotionSide.fingerprint(block, ignore_keys=["id"]) != NotionSide.fingerprint(
+        checked, ignore_keys=["id"]
+    )
+    assert NotionSide.fingerprint(
+        block, ignore_keys=["id", "is_checked"]
+    ) == NotionSide.fingerprint(checked, ignore_keys=["id", "is_checked"])
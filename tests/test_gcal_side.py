@@ -0,0 +1,486 @@
+import copy
+import datetime
+import itertools
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import httplib2
+import pytest
+import yaml
+from googleapiclient.http import HttpError
+
+from taskwarrior_syncall import Aggregator, cached_gcal_calendar_id, convert_gcal_to_tw
+from taskwarrior_syncall.google import gcal_side as gcal_side_module
+from taskwarrior_syncall.google.gcal_side import LIST_FIELDS, LIST_PAGE_SIZE, GCalSide
+
+from .conftest_sides import SlowWritesSide
+
+
+class FakeRequest:
+    def __init__(self, fn, **kargs):
+        self._fn = fn
+        self.kargs = kargs
+        self.headers: Dict[str, str] = {}
+
+    def execute(self):
+        return self._fn(**self.kargs)
+
+
+def http_error(status: int, content: bytes = b"") -> HttpError:
+    return HttpError(resp=httplib2.Response({"status": status}), content=content)
+
+
+def rate_limit_error() -> HttpError:
+    return http_error(
+        403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}], "code": 403}}'
+    )
+
+
+class FakeEvents:
+    """In-memory events().* of the Google Calendar API, for a single calendar.
+
+    Every change gets a sequence number - sync tokens are the number of the latest change.
+    """
+
+    PAGE_SIZE = 2
+
+    def __init__(self):
+        self.calendar_id = "calendar"
+        self.events: Dict[str, dict] = {}
+        self.changes: List[str] = []
+        self.requests: List[dict] = []
+        self.expired_tokens = set()
+        self._ids = itertools.count()
+
+        # number of the next calls to fail due to rate limits
+        self.rate_limited_calls = 0
+
+    def add(self, summary: str, status: str = "confirmed") -> dict:
+        event = {"id": f"e{next(self._ids)}", "summary": summary, "status": status}
+        self.events[event["id"]] = event
+        self._changed(event["id"])
+        return event
+
+    def modify(self, event_id: str, **changes) -> dict:
+        self.events[event_id].update(changes)
+        self._changed(event_id)
+        return dict(self.events[event_id])
+
+    def cancel(self, event_id: str):
+        self.events[event_id]["status"] = "cancelled"
+        self._changed(event_id)
+
+    def _changed(self, event_id: str):
+        self.changes.append(event_id)
+        self.events[event_id]["etag"] = f'"{len(self.changes)}"'
+
+    def insert(self, calendarId: str, body: dict) -> FakeRequest:
+        return FakeRequest(self._call, call=lambda: self.add(**body))
+
+    def get(self, calendarId: str, eventId: str) -> FakeRequest:
+        return FakeRequest(self._call, call=lambda: dict(self._event(eventId)))
+
+    def update(self, calendarId: str, eventId: str, body: dict) -> FakeRequest:
+        self.requests.append({"method": "update", "eventId": eventId})
+
+        def update():
+            self._event(eventId)
+            return self.modify(eventId, **body)
+
+        return FakeRequest(self._call, call=update)
+
+    def patch(self, calendarId: str, eventId: str, body: dict) -> FakeRequest:
+        def patch():
+            etag = request.headers.get("If-Match")
+            if etag is not None and etag != self._event(eventId)["etag"]:
+                raise http_error(412)
+            event = self._event(eventId)
+            # nested objects are merged, null values clear their fields
+            changes = {}
+            for key, value in body.items():
+                if isinstance(value, dict) and isinstance(event.get(key), dict):
+                    value = {**event[key], **value}
+                    value = {k: v for k, v in value.items() if v is not None}
+                changes[key] = value
+            for key in ("start", "end"):
+                if {"date", "dateTime"}.issubset(changes.get(key, {})):
+                    raise http_error(400)
+            return self.modify(eventId, **changes)
+
+        request = FakeRequest(self._call, call=patch)
+        return request
+
+    def delete(self, calendarId: str, eventId: str) -> FakeRequest:
+        return FakeRequest(self._call, call=lambda: self.cancel(self._event(eventId)["id"]))
+
+    def _call(self, call):
+        if self.rate_limited_calls:
+            self.rate_limited_calls -= 1
+            raise rate_limit_error()
+
+        return call()
+
+    def _event(self, event_id: str) -> dict:
+        event = self.events.get(event_id)
+        if event is None or event["status"] == "cancelled":
+            raise http_error(404)
+
+        return event
+
+    def list(self, calendarId: str, **kargs) -> FakeRequest:
+        return FakeRequest(self._list, calendarId=calendarId, **kargs)
+
+    def list_next(self, request: FakeRequest, response: dict) -> Optional[FakeRequest]:
+        if "nextPageToken" not in response:
+            return None
+
+        return FakeRequest(
+            self._list, **{**request.kargs, "pageToken": response["nextPageToken"]}
+        )
+
+    def _list(self, calendarId: str, pageToken: int = 0, syncToken=None, **kargs) -> dict:
+        self.requests.append({"syncToken": syncToken, "pageToken": pageToken, **kargs})
+        if calendarId != self.calendar_id:
+            raise http_error(404)
+        if syncToken in self.expired_tokens:
+            raise http_error(410)
+
+        if syncToken is None:
+            ids = list(self.events)
+        else:
+            ids = list(dict.fromkeys(self.changes[int(syncToken) :]))
+
+        page = ids[pageToken : pageToken + self.PAGE_SIZE]
+        response = {"items": [dict(self.events[id_]) for id_ in page]}
+        if pageToken + self.PAGE_SIZE < len(ids):
+            response["nextPageToken"] = pageToken + self.PAGE_SIZE
+        else:
+            response["nextSyncToken"] = str(len(self.changes))
+        return response
+
+
+class FakeBatch:
+    def __init__(self, service: "FakeService", callback):
+        self._service = service
+        self._callback = callback
+        self._requests: Dict[str, FakeRequest] = {}
+
+    def add(self, request: FakeRequest, request_id: str):
+        self._requests[request_id] = request
+
+    def execute(self):
+        self._service.batch_sizes.append(len(self._requests))
+        for request_id, request in self._requests.items():
+            try:
+                response, exception = request.execute(), None
+            except HttpError as err:
+                response, exception = None, err
+            self._callback(request_id, response, exception)
+
+
+class FakeService:
+    def __init__(self):
+        self.fake_events = FakeEvents()
+        self.batch_sizes: List[int] = []
+
+    def events(self) -> FakeEvents:
+        return self.fake_events
+
+    def calendarList(self):
+        service = self
+
+        class CalendarList:
+            def list(self):
+                calendar = {"id": service.fake_events.calendar_id, "summary": "calendar"}
+                return FakeRequest(lambda: {"items": [calendar]})
+
+        return CalendarList()
+
+    def new_batch_http_request(self, callback=None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+
+@pytest.fixture()
+def gcal_side() -> GCalSide:
+    side = GCalSide(calendar_summary="calendar", client_secret=None, oauth_port=8081)
+    side._service = FakeService()
+    side._calendar_id = "calendar"
+    return side
+
+
+def _summaries(items) -> List[str]:
+    return sorted(item["summary"] for item in items)
+
+
+def test_changed_events_are_listed_via_the_sync_token(gcal_side):
+    events = gcal_side._service.events()
+    for summary in ("a", "b", "c"):
+        events.add(summary)
+    events.cancel(events.add("cancelled")["id"])
+
+    assert _summaries(gcal_side.get_all_items()) == ["a", "b", "c"]
+    position = gcal_side.change_journal_position()
+    assert position is not None
+
+    events.add("d")
+    events.cancel("e0")
+    changed = gcal_side.get_changed_items(position)
+    assert changed["e0"] is None
+    assert _summaries(item for item in changed.values() if item is not None) == ["d"]
+    assert events.requests[-1]["syncToken"] is not None
+
+    # nothing changed since
+    assert gcal_side.get_changed_items(gcal_side.change_journal_position()) == {}
+
+
+def test_expired_sync_tokens_fall_back_to_listing_all_events(gcal_side):
+    events = gcal_side._service.events()
+    events.add("a")
+    gcal_side.get_all_items()
+    position = gcal_side.change_journal_position()
+
+    # the token of the listing above
+    events.expired_tokens.add("1")
+    assert gcal_side.get_changed_items(position) is None
+    assert gcal_side.change_journal_position() is None
+
+
+def test_sync_tokens_of_other_calendars_are_ignored(gcal_side):
+    gcal_side._service.events().add("a")
+    gcal_side.get_all_items()
+    position = gcal_side.change_journal_position()
+
+    gcal_side._calendar_id = "other"
+    assert gcal_side.get_changed_items(position) is None
+    assert gcal_side.get_changed_items("not a position") is None
+
+
+def test_no_sync_tokens_with_a_horizon(gcal_side):
+    events = gcal_side._service.events()
+    events.add("a")
+    gcal_side.get_all_items()
+    position = gcal_side.change_journal_position()
+
+    horizon_start = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    gcal_side.set_horizon(horizon_start)
+    assert gcal_side.get_changed_items(position) is None
+    gcal_side.get_all_items()
+    assert events.requests[-1]["timeMin"] == horizon_start.isoformat()
+    assert gcal_side.change_journal_position() is None
+
+
+def test_writes_are_batched(gcal_side):
+    events = gcal_side._service.events()
+    added = gcal_side.add_items([{"summary": str(i)} for i in range(120)])
+    assert [event["summary"] for event in added] == [str(i) for i in range(120)]
+    assert gcal_side._service.batch_sizes == [50, 50, 20]
+
+    ids = [event["id"] for event in added]
+    results = gcal_side.update_items(
+        {ids[0]: {"summary": "updated"}, "missing": {"summary": "updated"}}
+    )
+    assert results[ids[0]] is None
+    assert isinstance(results["missing"], HttpError)
+    assert events.events[ids[0]]["summary"] == "updated"
+
+    results = gcal_side.delete_items(ids[:60])
+    assert results == dict.fromkeys(ids[:60])
+    assert len(gcal_side.get_all_items()) == 60
+
+
+def test_rate_limited_calls_are_retried(gcal_side, monkeypatch):
+    monkeypatch.setattr(gcal_side_module, "BATCH_RETRY_DELAY", 0)
+    events = gcal_side._service.events()
+    events.rate_limited_calls = 3
+
+    added = gcal_side.add_items([{"summary": str(i)} for i in range(5)])
+    assert [event["summary"] for event in added] == [str(i) for i in range(5)]
+    assert gcal_side._service.batch_sizes == [5, 3]
+
+    # give up after a few attempts
+    events.rate_limited_calls = 100
+    (result,) = gcal_side.add_items([{"summary": "a"}])
+    assert isinstance(result, HttpError) and result.resp.status == 403
+
+
+def test_updates_are_patches_of_the_listed_events(gcal_side):
+    events = gcal_side._service.events()
+    e0, e1 = events.add("a")["id"], events.add("b")["id"]
+    gcal_side.get_all_items()
+
+    # e1 modified concurrently, after the listing
+    events.modify(e1, description="concurrent")
+    results = gcal_side.update_items({e0: {"summary": "A"}, e1: {"summary": "B"}})
+    assert results == {e0: None, e1: None}
+    assert events.events[e0]["summary"] == "A"
+    assert events.events[e1]["summary"] == "B"
+    assert events.events[e1]["description"] == "concurrent"
+
+    # only the event that was modified concurrently is updated in full
+    assert [r["eventId"] for r in events.requests if r.get("method") == "update"] == [e1]
+
+    # the ETags of the latest versions are kept
+    gcal_side.update_item(e1, summary="BB")
+    assert [r["eventId"] for r in events.requests if r.get("method") == "update"] == [e1]
+    assert events.events[e1]["summary"] == "BB"
+
+
+def test_updates_of_all_day_events(gcal_side):
+    events = gcal_side._service.events()
+    event_id = events.add("a")["id"]
+    events.modify(event_id, start={"date": "2022-01-01"}, end={"date": "2022-01-02"})
+    gcal_side.get_all_items()
+
+    start = {"dateTime": "2022-01-01T10:00:00Z"}
+    end = {"dateTime": "2022-01-01T11:00:00Z"}
+    assert gcal_side.update_items({event_id: {"start": start, "end": end}}) == {event_id: None}
+    assert events.events[event_id]["start"] == start
+    assert events.events[event_id]["end"] == end
+
+
+class RecordingDict(dict):
+    """Dictionary that records the keys that are read off it."""
+
+    def __init__(self, *args, **kargs):
+        super().__init__(*args, **kargs)
+        self.read: Set[str] = set()
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.read.add(key)
+        return super().__contains__(key)
+
+    def keys(self):
+        recording = self
+
+        class Keys:
+            def __contains__(self, key):
+                return key in recording
+
+            def __iter__(self):
+                return iter(dict.keys(recording))
+
+        return Keys()
+
+
+def test_listing_fields_cover_the_keys_read(gcal_side, test_data: Path):
+    with open(test_data / "sample_items.yaml", "r") as f:
+        sample_items = yaml.load(f, Loader=yaml.Loader)
+
+    events = [RecordingDict(sample_items[name]) for name in ("gcal_item", "gcal_item_w_date")]
+    for event in events:
+        convert_gcal_to_tw(event)
+        GCalSide.finished_at(event)
+        event[GCalSide.id_key()]
+        # resolution of conflicts
+        event[GCalSide.last_modification_key()]
+
+    # all-day events can't be compared yet
+    other = RecordingDict(sample_items["gcal_item"])
+    GCalSide.items_are_identical(copy.copy(events[0]), copy.copy(other))
+    GCalSide.fingerprint(other)
+
+    read = set.union(other.read, *(event.read for event in events))
+    (listed_keys,) = re.findall(r"items\((.*?)\)", LIST_FIELDS)
+    assert read <= set(listed_keys.split(","))
+    assert {"etag", "id", "status"} <= set(listed_keys.split(","))
+
+    # the listing requests only ask for these
+    gcal_side._service.events().add("a")
+    gcal_side.get_all_items()
+    request = gcal_side._service.events().requests[-1]
+    assert request["fields"] == LIST_FIELDS and request["maxResults"] == LIST_PAGE_SIZE
+
+
+def test_cached_calendar_ids_are_revalidated_when_not_found(monkeypatch):
+    service = FakeService()
+    build_kargs = {}
+
+    def build(*args, **kargs):
+        build_kargs.update(kargs)
+        return service
+
+    monkeypatch.setattr(gcal_side_module.discovery, "build", build)
+    saved_ids = []
+    side = GCalSide(
+        calendar_summary="calendar",
+        client_secret=None,
+        oauth_port=8081,
+        calendar_id="calendar",
+        save_calendar_id=saved_ids.append,
+    )
+    monkeypatch.setattr(side, "_get_credentials", lambda: None)
+
+    # the cached ID is used as is, without looking up the calendars
+    side.start()
+    assert build_kargs["static_discovery"] is True
+    events = service.events()
+    events.add("a")
+    assert _summaries(side.get_all_items()) == ["a"]
+    position = side.change_journal_position()
+    assert saved_ids == []
+
+    # e.g., calendar deleted and created again
+    events.calendar_id = "recreated"
+    assert side.get_changed_items(position) is None
+    assert saved_ids == ["recreated"]
+    assert _summaries(side.get_all_items()) == ["a"]
+
+    # calendars that can't be found even after looking them up again
+    events.calendar_id = "inaccessible"
+    monkeypatch.setattr(side, "_fetch_cal_id", lambda: "recreated")
+    with pytest.raises(HttpError):
+        side.get_all_items()
+
+
+def test_calendar_ids_are_only_cached_for_the_same_calendar():
+    app_config = {"gcal_calendar": "calendar", "gcal_calendar_id": "id"}
+    assert cached_gcal_calendar_id(
+        app_config, config_fname="tw_gcal_configs", combination="c", gcal_calendar="other"
+    ) == (None, None)
+
+    calendar_id, save_calendar_id = cached_gcal_calendar_id(
+        app_config, config_fname="tw_gcal_configs", combination="c", gcal_calendar="calendar"
+    )
+    assert calendar_id == "id"
+    assert save_calendar_id is not None
+
+
+def test_sync_tokens_are_kept_if_the_listed_events_fail_to_synchronize(
+    gcal_side, config_dir, monkeypatch
+):
+    events = gcal_side._service.events()
+    events.add("a")
+    side_B = SlowWritesSide(name="B", parallel=1)
+    monkeypatch.setattr(gcal_side, "start", lambda: None)
+    with Aggregator(
+        side_A=gcal_side,
+        side_B=side_B,
+        converter_B_to_A=lambda item: {"summary": item["title"]},
+        converter_A_to_B=lambda event: {
+            "title": event["summary"],
+            "modified": datetime.datetime(2022, 1, 1),
+        },
+    ) as aggregator:
+        aggregator.sync()
+        assert [item["title"] for item in side_B.items.values()] == ["a"]
+
+        events.add("b")
+        side_B.failing_titles = ("b",)
+        aggregator.sync()
+        assert events.requests[-1]["syncToken"] is not None
+        assert [item["title"] for item in side_B.items.values()] == ["a"]
+
+        # the failed event is listed again, via the sync token of the previous listing
+        side_B.failing_titles = ()
+        aggregator.sync()
+        assert events.requests[-1]["syncToken"] is not None
+        assert sorted(item["title"] for item in side_B.items.values()) == ["a", "b"]
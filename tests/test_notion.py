@@ -1,3 +1,5 @@
+import copy
+from types import SimpleNamespace
 from typing import List
 
 import pytest
@@ -62,3 +64,61 @@ def test_find_todos_in_page(page_contents: NotionPageContents):
         assert todo.is_checked == is_checked[i]
         assert todo.is_archived == is_archived[i]
         assert todo.plaintext == plaintext[i]
+
+
+# test batched insertions ---------------------------------------------------------------------
+class FakeBlockChildren:
+    def __init__(self, returned_titles: List[str], template: NotionTodoBlockItem):
+        self._returned_titles = returned_titles
+        self._template = template
+
+    def list(self, block_id: str) -> NotionPageContents:
+        return {"object": "list", "results": []}
+
+    def append(self, block_id: str, children: List[dict]) -> NotionPageContents:
+        results = []
+        for i, title in enumerate(self._returned_titles):
+            block = copy.deepcopy(self._template)
+            block["id"] = str(i)
+            block["to_do"]["text"][0]["plain_text"] = title
+            results.append(block)
+
+        return {"object": "list", "results": results}
+
+
+class FakeClient:
+    def __init__(self, block_children: FakeBlockChildren):
+        self.blocks = SimpleNamespace(children=block_children)
+
+
+def _notion_side_returning(titles: List[str], template: NotionTodoBlockItem) -> NotionSide:
+    client = FakeClient(FakeBlockChildren(titles, template))
+    return NotionSide(client=client, page_id="page")  # type: ignore
+
+
+def _todo(title: str, template: NotionTodoBlockItem) -> NotionTodoBlock:
+    todo = NotionTodoBlock.from_raw_item(template)
+    todo.plaintext = title
+    todo.id = None
+    return todo
+
+
+def test_add_items(notion_simple_todo: NotionTodoBlockItem):
+    side = _notion_side_returning(["a", "b"], notion_simple_todo)
+    added = side.add_items([_todo("a", notion_simple_todo), _todo("b", notion_simple_todo)])
+    assert [(todo.id, todo.plaintext) for todo in added] == [("0", "a"), ("1", "b")]
+
+
+def test_add_items_with_missing_blocks(notion_simple_todo: NotionTodoBlockItem):
+    # only the items without a returned block fail
+    side = _notion_side_returning(["c", "a"], notion_simple_todo)
+    added = side.add_items(
+        [
+            _todo("a", notion_simple_todo),
+            _todo("b", notion_simple_todo),
+            _todo("c", notion_simple_todo),
+        ]
+    )
+    assert isinstance(added[0], NotionTodoBlock) and added[0].id == "1"
+    assert isinstance(added[1], RuntimeError)
+    assert isinstance(added[2], NotionTodoBlock) and added[2].id == "0"
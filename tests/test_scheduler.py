@@ -0,0 +1,122 @@
+import datetime
+import threading
+import time
+
+import pytest
+from bubop import PrefsManager
+
+from taskwarrior_syncall import Aggregator
+from taskwarrior_syncall.app_utils import app_name
+from taskwarrior_syncall.rate_limiter import RateLimiter
+from taskwarrior_syncall.scheduler import (
+    Combination,
+    Scheduler,
+    SharedResources,
+    load_combinations,
+)
+
+from .conftest_sides import InMemorySide
+
+
+def test_rate_limiter_throttles_acquisitions():
+    rate_limiter = RateLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        rate_limiter.acquire()
+
+    # the first acquisition is free, the rest are 20ms apart
+    assert time.monotonic() - start >= 0.18
+
+
+def test_rate_limiter_is_shared_between_threads():
+    rate_limiter = RateLimiter(rate=100, burst=1)
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda: [rate_limiter.acquire() for _ in range(5)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start >= 0.18
+
+
+def test_load_combinations(config_dir):
+    with PrefsManager(app_name=app_name(), config_fname="tw_gcal_configs") as prefs_manager:
+        prefs_manager["work"] = {"gcal_calendar": "Work", "tw_project": "work", "tw_tags": []}
+    with PrefsManager(app_name=app_name(), config_fname="tw_asana_configs") as prefs_manager:
+        prefs_manager["home"] = {"asana_workspace_gid": "1", "tw_project": "", "tw_tags": []}
+
+    assert {str(c) for c in load_combinations()} == {"tw_gcal/work", "tw_asana/home"}
+    assert [c.config["gcal_calendar"] for c in load_combinations(["tw_gcal"])] == ["Work"]
+
+
+def test_clients_are_shared_per_account():
+    resources = SharedResources()
+    created = []
+
+    def create():
+        created.append(object())
+        return created[-1]
+
+    client = resources.client("notion", "token1", create)
+    assert resources.client("notion", "token1", create) is client
+    assert resources.client("notion", "token2", create) is not client
+    assert len(created) == 2
+    assert resources.rate_limiter("notion") is resources.rate_limiter("notion")
+
+
+class FailingSide(InMemorySide):
+    def get_all_items(self, **kargs):
+        raise RuntimeError("kalimera")
+
+
+def test_failing_combination_does_not_affect_the_rest(config_dir):
+    modified = datetime.datetime(2022, 1, 1)
+    sides = {}
+
+    def make_aggregator(combination: Combination, resources: SharedResources) -> Aggregator:
+        if combination.name == "broken_init":
+            raise RuntimeError("kalimera")
+
+        side_cls = FailingSide if combination.name == "broken_sync" else InMemorySide
+        side_A = InMemorySide(name="A", fullname="A")
+        side_B = side_cls(
+            name="B",
+            fullname="B",
+            items=[{"id": "b0", "title": combination.name, "modified": modified}],
+        )
+        sides[combination.name] = side_A
+        return Aggregator(
+            side_A=side_A,
+            side_B=side_B,
+            converter_B_to_A=lambda item: item,
+            converter_A_to_B=lambda item: item,
+            config_fname=combination.name,
+        )
+
+    combinations = [
+        Combination(kind="tw_gcal", name=name, config={})
+        for name in ("first", "broken_init", "broken_sync", "second")
+    ]
+    with Scheduler(combinations, make_aggregator, max_workers=2) as scheduler:
+        assert set(scheduler.aggregators) == {
+            "tw_gcal/first",
+            "tw_gcal/broken_sync",
+            "tw_gcal/second",
+        }
+        assert scheduler.sync_all() == {
+            "tw_gcal/first": True,
+            "tw_gcal/broken_sync": False,
+            "tw_gcal/second": True,
+        }
+
+    assert [item["title"] for item in sides["first"].items.values()] == ["first"]
+    assert [item["title"] for item in sides["second"].items.values()] == ["second"]
+
+
+def test_scheduler_requires_workers():
+    with pytest.raises(ValueError):
+        Scheduler([], lambda *_: None, max_workers=0)
@@ -0,0 +1,68 @@
+from bubop import pickle_dump
+
+from taskwarrior_syncall.snapshot_store import SnapshotStore
+
+
+def test_upsert_load_delete(tmp_path):
+    store = SnapshotStore(tmp_path / "side.sqlite3")
+    store.upsert({"a": {"description": "kalimera"}, "b": {"description": "kalispera"}})
+    assert len(store) == 2
+    assert "a" in store and "c" not in store
+
+    # bulk load ignores the items without a snapshot
+    assert store.load(["a", "c"]) == {"a": {"description": "kalimera"}}
+
+    store.upsert({"a": {"description": "kalinuxta"}})
+    assert store.get("a") == {"description": "kalinuxta"}
+    assert len(store) == 2
+
+    assert store.delete(["a", "c"]) == 1
+    assert store.get("a") is None
+    assert store.load_all() == {"b": {"description": "kalispera"}}
+
+
+def test_bulk_operations_above_query_params_limit(tmp_path):
+    store = SnapshotStore(tmp_path / "side.sqlite3")
+    items = {str(i): {"i": i} for i in range(2000)}
+    store.upsert(items)
+
+    assert store.load(items.keys()) == items
+    assert store.delete(items.keys()) == len(items)
+    assert len(store) == 0
+
+
+def test_persists_across_instances(tmp_path):
+    path = tmp_path / "side.sqlite3"
+    store = SnapshotStore(path)
+    store.upsert({"a": [1, 2, 3]})
+    store.close()
+
+    assert SnapshotStore(path).get("a") == [1, 2, 3]
+
+
+def test_migrate_from_pickle_dir(tmp_path):
+    serdes_dir = tmp_path / "tw"
+    serdes_dir.mkdir()
+    for i in range(3):
+        pickle_dump({"uuid": str(i)}, serdes_dir / str(i))
+
+    store = SnapshotStore(tmp_path / "tw.sqlite3")
+    assert store.migrate_from_pickle_dir(serdes_dir) == 3
+    assert store.load_all() == {str(i): {"uuid": str(i)} for i in range(3)}
+    assert not serdes_dir.exists()
+
+    # second time is a no-op
+    assert store.migrate_from_pickle_dir(serdes_dir) == 0
+    assert len(store) == 3
+
+
+def test_migrate_from_pickle_dir_keeps_unreadable_files(tmp_path):
+    serdes_dir = tmp_path / "tw"
+    serdes_dir.mkdir()
+    pickle_dump({"uuid": "a"}, serdes_dir / "a")
+    (serdes_dir / "b").write_bytes(b"not a pickle")
+
+    store = SnapshotStore(tmp_path / "tw.sqlite3")
+    assert store.migrate_from_pickle_dir(serdes_dir) == 1
+    assert store.load_all() == {"a": {"uuid": "a"}}
+    assert [p.name for p in serdes_dir.iterdir()] == ["b"]
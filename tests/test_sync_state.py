@@ -0,0 +1,64 @@
+import uuid
+
+from bidict import bidict  # type: ignore
+
+from taskwarrior_syncall.sync_state import JournalEntry, SyncState
+
+
+def test_update_correspondences(tmp_path):
+    state = SyncState(tmp_path / "combination.sqlite3")
+    state.update_correspondences({"b1": "a1", "b2": "a2", "b3": "a3"})
+    assert state.load_correspondences() == {"b1": "a1", "b2": "a2", "b3": "a3"}
+
+    # replaces the existing correspondences of either ID
+    state.update_correspondences({"b1": "a4", "b5": "a2"}, deleted=["b3", "b6"])
+    assert state.load_correspondences() == {"b1": "a4", "b5": "a2"}
+
+
+def test_correspondences_persist_across_instances(tmp_path):
+    path = tmp_path / "combination.sqlite3"
+    state = SyncState(path)
+    state.update_correspondences({str(i): f"a{i}" for i in range(2000)})
+    state.update_correspondences({}, deleted=[str(i) for i in range(1000)])
+    state.close()
+
+    assert SyncState(path).load_correspondences() == {
+        str(i): f"a{i}" for i in range(1000, 2000)
+    }
+
+
+def test_load_correspondences_into_bidict(tmp_path):
+    state = SyncState(tmp_path / "combination.sqlite3")
+    correspondences = {str(uuid.uuid4()): str(uuid.uuid4()) for _ in range(10_000)}
+    state.update_correspondences(correspondences)
+
+    assert bidict(state.load_correspondences()) == correspondences
+
+
+def test_journal(tmp_path):
+    state = SyncState(tmp_path / "combination.sqlite3")
+    seqs = state.journal_writes(
+        [
+            JournalEntry(
+                seq=-1, side="A", kind="insert", item_id="<1>", other_id="b1", item={}
+            ),
+            JournalEntry(
+                seq=-1, side="A", kind="delete", item_id="a2", other_id="b2", item=None
+            ),
+            JournalEntry(
+                seq=-1, side="B", kind="update", item_id="b3", other_id="a3", item={"x": 1}
+            ),
+        ]
+    )
+    state.complete_write(seqs[0], result_id="a1")
+    state.discard_write(seqs[1])
+
+    entries = state.load_journal()
+    assert [(e.item_id, e.done, e.result_id) for e in entries] == [
+        ("<1>", True, "a1"),
+        ("b3", False, None),
+    ]
+    assert entries[1].item == {"x": 1}
+
+    state.clear_journal()
+    assert state.load_journal() == []
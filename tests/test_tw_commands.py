@@ -0,0 +1,160 @@
+import datetime
+import json
+from typing import List
+
+from taskw.fields.annotationarray import Annotation
+from taskw.taskrc import TaskRc
+
+from taskwarrior_syncall.taskwarrior_side import (
+    TASK_DELETE_MAX_TASKS,
+    delete_tasks,
+    export_filter,
+    import_tasks,
+    new_task,
+    serialize_for_import,
+    updated_task,
+)
+
+
+class FakeTaskWarrior:
+    """Records the tasks of each `task import` and `task delete`, failing the ones with the
+    given description or UUID.
+    """
+
+    def __init__(self, failing_description: str = "", failing_uuid: str = ""):
+        self.config = TaskRc(None)
+        self.imports: List[list] = []
+        self.deletes: List[list] = []
+        self._failing_description = failing_description
+        self._failing_uuid = failing_uuid
+
+    def _execute(self, *args):
+        if args[0] == "import":
+            with open(args[1]) as f:
+                tasks = json.load(f)
+            if any(task["description"] == self._failing_description for task in tasks):
+                raise RuntimeError("kalimera")
+            self.imports.append(tasks)
+        else:
+            assert args[:2] == ("rc.confirmation=off", "rc.bulk=0") and args[-1] == "delete"
+            if self._failing_uuid in args:
+                raise RuntimeError("kalimera")
+            self.deletes.append(list(args[2:-1]))
+
+        return "", ""
+
+
+def test_new_task():
+    task = new_task({"description": " kalimera ", "status": "done", "tags": ["a"]})
+    assert task["description"] == "kalimera"
+    assert task["status"] == "completed"
+    assert {"uuid", "entry", "modified", "end"} <= task.keys()
+    assert new_task({"description": "kalimera"})["uuid"] != task["uuid"]
+
+
+def test_updated_task_keeps_annotation_entries():
+    task = {
+        "uuid": "3e3fdd67-b8b7-4924-bd86-36daa2e9c1c9",
+        "description": "kalimera",
+        "annotations": [Annotation("first", "20220101T100000Z")],
+        "recur": "weekly",
+    }
+    updated = updated_task(task, {"description": "kalispera", "annotations": ["first", "2nd"]})
+    assert updated["description"] == "kalispera"
+    assert updated["recur"] == "weekly"
+
+    serialized = serialize_for_import(updated, udas={})
+    assert serialized["annotations"][0] == {
+        "entry": "20220101T100000Z",
+        "description": "first",
+    }
+    assert serialized["annotations"][1]["description"] == "2nd"
+    assert serialized["modified"] > "20220101T100000Z"
+
+
+def test_serialize_for_import():
+    task = new_task(
+        {
+            "description": "kalimera",
+            "due": datetime.datetime(2022, 1, 1, 10, tzinfo=datetime.timezone.utc),
+        }
+    )
+    task.update({"id": 3, "urgency": 1.2})
+
+    serialized = serialize_for_import(task, udas={})
+    assert serialized["due"] == "20220101T100000Z"
+    assert serialized["uuid"] == task["uuid"]
+    assert "id" not in serialized and "urgency" not in serialized
+    assert "annotations" not in serialized
+
+
+def test_import_tasks_in_a_single_command():
+    tw = FakeTaskWarrior()
+    tasks = [new_task({"description": f"{i}"}) for i in range(5)]
+    imported = import_tasks(tw, tasks)
+
+    assert len(tw.imports) == 1
+    assert [task["uuid"] for task in tw.imports[0]] == [task["uuid"] for task in tasks]
+    assert [task["uuid"] for task in imported] == [task["uuid"] for task in tasks]
+    assert isinstance(imported[0]["entry"], datetime.datetime)
+
+
+def test_import_tasks_one_by_one_on_failure():
+    tw = FakeTaskWarrior(failing_description="2")
+    imported = import_tasks(tw, [new_task({"description": f"{i}"}) for i in range(4)])
+
+    assert isinstance(imported[2], RuntimeError)
+    assert [task["description"] for task in imported if isinstance(task, dict)] == [
+        "0",
+        "1",
+        "3",
+    ]
+    assert [len(tasks) for tasks in tw.imports] == [1, 1, 1]
+
+
+def test_delete_tasks_in_chunks():
+    tw = FakeTaskWarrior()
+    uuids = [f"uuid{i}" for i in range(TASK_DELETE_MAX_TASKS + 10)]
+    assert delete_tasks(tw, uuids) == {uuid: None for uuid in uuids}
+    assert [len(chunk) for chunk in tw.deletes] == [TASK_DELETE_MAX_TASKS, 10]
+
+
+def test_delete_tasks_one_by_one_on_failure():
+    tw = FakeTaskWarrior(failing_uuid="uuid1")
+    results = delete_tasks(tw, ["uuid0", "uuid1", "uuid2"])
+
+    assert isinstance(results.pop("uuid1"), RuntimeError)
+    assert results == {"uuid0": None, "uuid2": None}
+    assert tw.deletes == [["uuid0"], ["uuid2"]]
+
+
+def test_export_filter():
+    assert export_filter(tags={"work", "remindme"}, project="My Project", sync="notion") == [
+        "+remindme",
+        "+work",
+        "project:'My Project'",
+        "sync:notion",
+        "(",
+        "status:pending",
+        "or",
+        "status:waiting",
+        "or",
+        "status:completed",
+        ")",
+    ]
+    assert export_filter()[0] == "("
+    ended_after = datetime.datetime(2022, 1, 1, 12, tzinfo=datetime.timezone.utc)
+    assert export_filter(tags={"work"}, ended_after=ended_after) == [
+        "+work",
+        "(",
+        "status:pending",
+        "or",
+        "status:waiting",
+        "or",
+        "(",
+        "status:completed",
+        "and",
+        "end.after:20220101T120000Z",
+        ")",
+        ")",
+    ]
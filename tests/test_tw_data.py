@@ -0,0 +1,220 @@
+import copy
+import json
+import os
+import pickle
+import sqlite3
+import uuid
+
+import pytest
+from taskw.fields import NumericField
+from taskw.task import Task
+
+from taskwarrior_syncall.taskwarrior_data import LazyTask, TaskWarriorDataReader, task_fields
+from taskwarrior_syncall.taskwarrior_side import TaskWarriorSide
+
+_PENDING = [
+    '[description:"first &open;task&close;" entry:"1650000000" modified:"1650000100"'
+    ' project:"work" status:"pending" tags:"a,b" tag_a:"" tag_b:""'
+    ' annotation_1650000200:"a note" estimate:"3"'
+    ' uuid:"6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c01"]',
+    '[description:"deleted" entry:"1650000000" status:"deleted"'
+    ' uuid:"6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c02"]',
+    '[description:"waiting" entry:"1650000000" status:"waiting" wait:"1990000000"'
+    ' depends:"6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c01"'
+    ' uuid:"6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c03"]',
+]
+_COMPLETED = [
+    '[description:"done" end:"1650000300" entry:"1650000000" status:"completed"'
+    ' uuid:"6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c04"]',
+]
+
+# what `task export` returns for the tasks above
+_EXPORTED = {
+    "pending": [
+        {
+            "id": 1,
+            "description": "first [task]",
+            "entry": "20220415T052000Z",
+            "modified": "20220415T052140Z",
+            "project": "work",
+            "status": "pending",
+            "tags": ["a", "b"],
+            "annotations": [{"entry": "20220415T052320Z", "description": "a note"}],
+            "estimate": 3,
+            "uuid": "6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c01",
+        },
+        {
+            "id": 3,
+            "description": "waiting",
+            "entry": "20220415T052000Z",
+            "status": "waiting",
+            "wait": "20330122T094640Z",
+            "depends": ["6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c01"],
+            "uuid": "6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c03",
+        },
+    ],
+    "completed": [
+        {
+            "id": 0,
+            "description": "done",
+            "end": "20220415T052500Z",
+            "entry": "20220415T052000Z",
+            "status": "completed",
+            "uuid": "6b2d1b2e-1a6e-4d4a-9a52-5a9c8f7f2c04",
+        },
+    ],
+}
+
+_UDAS = {"estimate": NumericField()}
+
+
+def _expected():
+    return {
+        group: [dict(Task(task, udas=_UDAS)) for task in tasks]
+        for group, tasks in _EXPORTED.items()
+    }
+
+
+def _loaded(reader):
+    return {
+        group: [dict(task) for task in tasks] for group, tasks in reader.load_tasks().items()
+    }
+
+
+def test_read_data_files(tmp_path):
+    (tmp_path / "pending.data").write_text("\n".join(_PENDING) + "\n")
+    (tmp_path / "completed.data").write_text("\n".join(_COMPLETED) + "\n")
+
+    assert _loaded(TaskWarriorDataReader(tmp_path, udas=_UDAS)) == _expected()
+
+
+def test_read_empty_data_location(tmp_path):
+    (tmp_path / "pending.data").touch()
+    assert TaskWarriorDataReader(tmp_path).load_tasks() == {"pending": [], "completed": []}
+
+
+def test_read_taskchampion_db(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "taskchampion.sqlite3"))
+    conn.execute("CREATE TABLE tasks (uuid STRING PRIMARY KEY, data STRING)")
+    conn.execute("CREATE TABLE working_set (id INTEGER PRIMARY KEY, uuid STRING)")
+    ids = {}
+    for group in ("pending", "completed"):
+        for task in _EXPORTED[group]:
+            data = {
+                "description": task["description"],
+                "entry": "1650000000",
+                "status": task["status"],
+            }
+            for key in ("modified", "end", "wait", "project"):
+                if key in task:
+                    data[key] = {
+                        "modified": "1650000100",
+                        "end": "1650000300",
+                        "wait": "1990000000",
+                        "project": task[key],
+                    }[key]
+            data.update({f"tag_{tag}": "" for tag in task.get("tags", [])})
+            data.update({f"dep_{uuid}": "x" for uuid in task.get("depends", [])})
+            if "annotations" in task:
+                data["annotation_1650000200"] = "a note"
+            if "estimate" in task:
+                data["estimate"] = "3"
+            conn.execute("INSERT INTO tasks VALUES (?, ?)", (task["uuid"], json.dumps(data)))
+            ids[task["uuid"]] = task["id"]
+    conn.executemany(
+        "INSERT INTO working_set VALUES (?, ?)", [(i, u) for u, i in ids.items() if i]
+    )
+    conn.commit()
+    conn.close()
+
+    assert _loaded(TaskWarriorDataReader(tmp_path, udas=_UDAS)) == _expected()
+
+
+def test_unchanged_data_files_are_not_parsed_again(tmp_path):
+    pending = tmp_path / "pending.data"
+    pending.write_text(_PENDING[0] + "\n")
+    reader = TaskWarriorDataReader(tmp_path, udas=_UDAS)
+
+    tasks = reader.load_tasks()
+    assert reader.load_tasks() is tasks
+
+    pending.write_text("\n".join(_PENDING) + "\n")
+    os.utime(pending, ns=(0, 0))
+    tasks = reader.load_tasks()
+    assert len(tasks["pending"]) == 2
+    assert reader.load_tasks() is tasks
+
+
+def test_lazy_task_is_same_as_marshalled(tmp_path):
+    (tmp_path / "pending.data").write_text("\n".join(_PENDING) + "\n")
+    (tmp_path / "completed.data").write_text("\n".join(_COMPLETED) + "\n")
+
+    tasks = TaskWarriorDataReader(tmp_path, udas=_UDAS, lazy=True).load_tasks()
+    assert all(isinstance(task, LazyTask) for task in tasks["pending"])
+    assert _loaded(TaskWarriorDataReader(tmp_path, udas=_UDAS, lazy=True)) == _expected()
+
+
+def test_lazy_task_decodes_on_access():
+    exported = _EXPORTED["pending"][0]
+    task = LazyTask(dict(exported), task_fields(_UDAS))
+    assert task._decoded == {}
+
+    marshalled = Task(exported, udas=_UDAS)
+    assert task["entry"] == marshalled["entry"]
+    assert task.get("due") is None
+    assert "entry" in task._decoded and "modified" not in task._decoded
+
+    # copies are independent
+    copied = copy.copy(task)
+    copied["description"] = "changed"
+    del copied["project"]
+    assert task["description"] == "first [task]" and "project" in task
+    assert len(copied) == len(task) - 1
+
+    assert task == marshalled
+    assert type(pickle.loads(pickle.dumps(task))) is dict
+    assert pickle.loads(pickle.dumps(task)) == marshalled
+
+
+def test_lazy_task_keeps_fields_that_fail_to_decode():
+    task = LazyTask({"entry": "not a date", "uuid": "u"}, task_fields(_UDAS))
+    with pytest.raises(ValueError):
+        task["entry"]
+
+    assert "entry" in task and task._raw["entry"] == "not a date"
+    assert sorted(task) == ["entry", "uuid"] and len(task) == 2
+
+
+def _exported_tasks(n):
+    return [
+        {
+            "id": i,
+            "description": f"task {i}",
+            "entry": "20220415T052000Z",
+            "modified": "20220415T052140Z",
+            "due": "20220501T120000Z",
+            "wait": "20220420T120000Z",
+            "scheduled": "20220421T120000Z",
+            "project": "work",
+            "status": "pending",
+            "tags": ["a", "b"],
+            "annotations": [{"entry": "20220415T052320Z", "description": "a note"}],
+            "urgency": 4.2,
+            "uuid": str(uuid.UUID(int=i)),
+        }
+        for i in range(n)
+    ]
+
+
+def test_lazy_tasks_match_eager_tasks():
+    # what loading and comparing/fingerprinting the tasks of a database reads
+    def eager():
+        tasks = [Task(task) for task in _exported_tasks(1000)]
+        return [TaskWarriorSide.fingerprint(task) for task in tasks]
+
+    def lazy():
+        fields = task_fields()
+        tasks = [LazyTask(task, fields) for task in _exported_tasks(1000)]
+        return [TaskWarriorSide.fingerprint(task) for task in tasks]
+
+    assert eager() == lazy()
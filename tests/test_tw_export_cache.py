@@ -0,0 +1,85 @@
+import os
+import threading
+
+from taskwarrior_syncall.taskwarrior_export_cache import TaskWarriorExportCache
+
+
+def _setup(tmp_path):
+    data_location = tmp_path / "data"
+    data_location.mkdir()
+    (data_location / "pending.data").write_text('[description:"kalimera" uuid:"u1"]\n')
+    (data_location / "completed.data").write_text("")
+
+    config_file = tmp_path / "taskrc"
+    config_file.write_text(f"data.location={data_location}\n")
+    return config_file, data_location
+
+
+class _CountingExport:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            return [{"uuid": "u1", "description": f"export {self.calls}"}]
+
+
+def test_export_is_reused_while_unchanged(tmp_path):
+    config_file, _ = _setup(tmp_path)
+    export = _CountingExport()
+
+    first = TaskWarriorExportCache(config_file, cache_dir=tmp_path / "cache")
+    assert first.load_tasks(export) == [{"uuid": "u1", "description": "export 1"}]
+
+    # e.g., another process
+    second = TaskWarriorExportCache(config_file, cache_dir=tmp_path / "cache")
+    assert second.load_tasks(export) == [{"uuid": "u1", "description": "export 1"}]
+    assert export.calls == 1
+
+
+def test_changed_data_files_are_exported_again(tmp_path):
+    config_file, data_location = _setup(tmp_path)
+    export = _CountingExport()
+    cache = TaskWarriorExportCache(config_file, cache_dir=tmp_path / "cache")
+    cache.load_tasks(export)
+
+    with (data_location / "pending.data").open("a") as f:
+        f.write('[description:"kalispera" uuid:"u2"]\n')
+    assert cache.load_tasks(export) == [{"uuid": "u1", "description": "export 2"}]
+
+    # same size, different modification time
+    stat = os.stat(data_location / "completed.data")
+    os.utime(
+        data_location / "completed.data", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)
+    )
+    cache.load_tasks(export)
+    assert export.calls == 3
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    config_file, _ = _setup(tmp_path)
+    export = _CountingExport()
+    cache = TaskWarriorExportCache(config_file, cache_dir=tmp_path / "cache")
+    cache.load_tasks(export)
+
+    with open(str(cache), "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.load_tasks(export) == [{"uuid": "u1", "description": "export 2"}]
+    assert cache.load_tasks(export) == [{"uuid": "u1", "description": "export 2"}]
+
+
+def test_concurrent_loads_export_once(tmp_path):
+    config_file, _ = _setup(tmp_path)
+    export = _CountingExport()
+
+    def load():
+        TaskWarriorExportCache(config_file, cache_dir=tmp_path / "cache").load_tasks(export)
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert export.calls == 1
@@ -0,0 +1,122 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+from taskwarrior_syncall.taskwarrior_journal import (
+    HOOK_FNAMES,
+    HOOK_SCRIPT,
+    JOURNAL_FNAME,
+    ChangeJournal,
+    install_hooks,
+)
+
+
+def _run_hook(data_location, *tasks):
+    """Run the hook the way Taskwarrior does, return its output."""
+    proc = subprocess.run(
+        [sys.executable, str(HOOK_SCRIPT), "api:2", "command:add", f"data:{data_location}"],
+        input="".join(json.dumps(task) + "\n" for task in tasks),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return proc.stdout
+
+
+def _task(uuid, modified="20220101T000000Z"):
+    return {"uuid": uuid, "description": "kalimera", "modified": modified}
+
+
+def test_hook_journals_changes(tmp_path):
+    journal = ChangeJournal(tmp_path / JOURNAL_FNAME)
+    assert journal.position() is None
+
+    # on-add
+    assert json.loads(_run_hook(tmp_path, _task("u1"))) == _task("u1")
+    start = journal.position()
+
+    # on-modify - original and modified task
+    out = _run_hook(tmp_path, _task("u2"), _task("u2", modified="20220102T000000Z"))
+    assert json.loads(out) == _task("u2", modified="20220102T000000Z")
+    _run_hook(tmp_path, _task("u3"))
+    _run_hook(tmp_path, _task("u2"))
+
+    assert journal.changed_uuids(start) == {"u2", "u3"}
+    assert journal.changed_uuids(journal.position()) == set()
+
+
+def test_partial_entries_are_dropped(tmp_path):
+    _run_hook(tmp_path, _task("u1"))
+    position = ChangeJournal(tmp_path / JOURNAL_FNAME).position()
+
+    # a hook killed mid-write
+    with (tmp_path / JOURNAL_FNAME).open("a") as f:
+        f.write("2 u")
+    assert ChangeJournal(tmp_path / JOURNAL_FNAME).changed_uuids(position) == set()
+
+    _run_hook(tmp_path, _task("u2"))
+    assert ChangeJournal(tmp_path / JOURNAL_FNAME).changed_uuids(position) == {"u2"}
+
+
+def test_changes_are_unknown_for_gaps_and_recreated_journals(tmp_path):
+    journal = ChangeJournal(tmp_path / JOURNAL_FNAME)
+    for uuid in ("u1", "u2", "u3"):
+        _run_hook(tmp_path, _task(uuid))
+    position = journal.position()
+
+    # entries removed after the position
+    _run_hook(tmp_path, _task("u4"))
+    _run_hook(tmp_path, _task("u5"))
+    lines = (tmp_path / JOURNAL_FNAME).read_text().splitlines()
+    (tmp_path / JOURNAL_FNAME).write_text("\n".join([*lines[:-2], lines[-1]]) + "\n")
+    assert journal.changed_uuids(position) is None
+
+    # a new journal with as many entries
+    os.remove(tmp_path / JOURNAL_FNAME)
+    for uuid in ("u1", "u2", "u3", "u4"):
+        _run_hook(tmp_path, _task(uuid))
+    assert journal.changed_uuids(position) is None
+
+
+def _load_hook_module():
+    spec = importlib.util.spec_from_file_location("tw_change_journal_hook", HOOK_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_journal_is_compacted(tmp_path, monkeypatch):
+    hook = _load_hook_module()
+    monkeypatch.setattr(hook, "JOURNAL_MAX_BYTES", 300)
+    path = tmp_path / JOURNAL_FNAME
+    journal = ChangeJournal(path)
+
+    hook.append_to_journal(path, "u0", "")
+    old_position = journal.position()
+    for i in range(1, 100):
+        hook.append_to_journal(path, f"u{i}", "")
+        # positions don't depend on the compactions
+        assert journal.position().split(":")[:2] == [old_position.split(":")[0], f"{i + 1}"]
+
+    assert path.stat().st_size <= 300
+    assert path.read_text().startswith("# journal ")
+
+    # the entries after the old positions were dropped, the recent ones are still there
+    assert journal.changed_uuids(old_position) is None
+    position = journal.position()
+    hook.append_to_journal(path, "u100", "")
+    assert journal.changed_uuids(position) == {"u100"}
+
+    # positions without the offset of their entry
+    assert journal.changed_uuids(position.rsplit(":", 1)[0]) == {"u100"}
+
+
+def test_install_hooks(tmp_path):
+    paths = install_hooks(tmp_path / "hooks")
+    assert [path.name for path in paths] == list(HOOK_FNAMES)
+    for path in paths:
+        assert path.name.startswith(("on-add", "on-modify"))
+        assert os.access(path, os.X_OK)
+        assert path.read_text() == HOOK_SCRIPT.read_text()
@@ -0,0 +1,126 @@
+import datetime
+import uuid
+
+from taskwarrior_syncall.taskwarrior_store import TaskStore
+
+
+def _task(i, status="pending", project="", tags=(), **kargs):
+    return {
+        "uuid": uuid.UUID(int=i),
+        "description": f"task {i}",
+        "status": status,
+        "project": project,
+        "tags": list(tags),
+        **kargs,
+    }
+
+
+def _descriptions(tasks):
+    return [task["description"] for task in tasks]
+
+
+def test_select():
+    store = TaskStore(
+        [
+            _task(0, project="work", tags=["a", "b"]),
+            _task(1, status="completed", project="work", tags=["a"]),
+            _task(2, status="deleted", project="work", tags=["a"]),
+            _task(3, status="waiting", project="home", tags=["b", "a"]),
+            _task(4, tags=[]),
+        ]
+    )
+    assert len(store) == 5
+    assert store.get(str(uuid.UUID(int=0)))["uuid"] == str(uuid.UUID(int=0))
+
+    statuses = ("pending", "waiting", "completed")
+    assert _descriptions(store.select(statuses)) == ["task 0", "task 1", "task 3", "task 4"]
+    assert _descriptions(store.select(statuses, tags={"a"}, project="work")) == [
+        "task 0",
+        "task 1",
+    ]
+    assert _descriptions(store.select(("pending",), tags={"a", "b"})) == ["task 0"]
+    assert store.select(statuses, tags={"c"}) == []
+    assert store.select(statuses, project="nope") == []
+
+
+def test_upsert_and_remove():
+    store = TaskStore([_task(i, tags=["a"]) for i in range(3)])
+
+    store.upsert(_task(1, status="completed", tags=["b"]))
+    store.remove(str(uuid.UUID(int=0)))
+    store.remove(str(uuid.UUID(int=100)))
+    assert _descriptions(store.select(("pending",), tags={"a"})) == ["task 2"]
+    assert _descriptions(store.select(("completed",), tags={"b"})) == ["task 1"]
+
+    # the row of the removed task is reused
+    store.upsert(_task(3, tags=["a"]))
+    assert _descriptions(store.select(("pending",), tags={"a"})) == ["task 3", "task 2"]
+    assert str(uuid.UUID(int=0)) not in store and len(store) == 3
+
+
+def test_select_ordered_by_date():
+    day = datetime.datetime(2022, 1, 1)
+    store = TaskStore(
+        [
+            _task(0, modified=day + datetime.timedelta(days=2)),
+            _task(1),
+            _task(2, modified=day),
+        ]
+    )
+    assert _descriptions(store.select(("pending",), order_by="modified")) == [
+        "task 1",
+        "task 2",
+        "task 0",
+    ]
+    assert _descriptions(store.select(("pending",), order_by="description", reverse=True)) == [
+        "task 2",
+        "task 1",
+        "task 0",
+    ]
+
+    store.upsert(_task(1, modified=day + datetime.timedelta(days=1)))
+    assert _descriptions(store.select(("pending",), order_by="modified")) == [
+        "task 2",
+        "task 1",
+        "task 0",
+    ]
+
+
+def test_select_matches_list_comprehensions():
+    tasks = [
+        _task(
+            i,
+            status=("pending", "completed", "deleted")[i % 3],
+            project=("work", "home")[i % 2],
+            tags=["a", f"t{i % 10}"],
+        )
+        for i in range(10_000)
+    ]
+    store = TaskStore(tasks)
+
+    def with_list_comprehensions():
+        selected = [t for t in tasks if t["status"] in ("pending", "waiting", "completed")]
+        selected = [t for t in selected if {"a", "t4"}.issubset(t.get("tags", []))]
+        return [t for t in selected if t.get("project", "") == "work"]
+
+    def with_store():
+        return store.select(
+            ("pending", "waiting", "completed"), tags={"a", "t4"}, project="work"
+        )
+
+    assert with_store() == with_list_comprehensions()
+
+
+def test_select_ended_after():
+    day = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    store = TaskStore(
+        [
+            _task(0, status="completed", end=day - datetime.timedelta(days=1)),
+            _task(1, status="completed", end=day + datetime.timedelta(days=1)),
+            _task(2, end=day - datetime.timedelta(days=1)),
+            _task(3, status="completed", end=day - datetime.timedelta(days=2)),
+        ]
+    )
+    statuses = ("pending", "completed")
+    assert _descriptions(store.select(statuses, ended_after=day)) == ["task 1", "task 2"]
+    assert len(store.select(statuses)) == 4